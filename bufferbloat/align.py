@@ -0,0 +1,198 @@
+'''
+Aligns the series of one experiment on a common timeline.
+
+Every artifact carries epoch timestamps: q.txt/q.bin (monitor.py),
+ping.csv/ping.bin (prober.py), sojourn.txt/sojourn.bin (sojourn.py),
+iperf.txt (interval offsets plus the '# start' line bufferbloat.py
+writes) and any other 'time,value' file or tsfile series.  Each one is resampled onto a shared grid, with an
+as-of join (the last sample at or before each grid point) or with
+linear interpolation, and the result is written as one frame: a CSV
+(or .npz) with a 't' column and one column per series.
+
+With --bw-net the frame also gets the queuing delay predicted from the
+bottleneck backlog, backlog * MTU * 8 / bw-net, the RTT it predicts
+(base RTT + queuing delay) and the error against the measured RTT:
+
+    python3 align.py --dir bb-q100 --bw-net 1.5 --delay 10 --step 0.1
+'''
+
+from helper import *
+
+MTU = 1500
+
+# Default resampling per kind: the queue length and iperf rates hold
+# until the next sample, RTT probes are points on a continuous curve
+KINDS = {
+    'qlen': (('q.bin', 'q.txt'), 'asof'),
+    'rtt': (('ping.bin', 'ping.csv'), 'linear'),
+    'mbps': (('iperf.txt',), 'asof'),
+    'sojourn': (('sojourn.bin', 'sojourn.txt'), 'asof'),
+}
+
+
+def load_kind(kind, fname):
+    if kind == 'rtt':
+        return load_rtt(fname)
+    if kind == 'mbps':
+        return load_iperf(fname)
+    return load_series(fname)
+
+
+def load_column(fname, column=None):
+    """A tsfile series, a 'time,value' file, or one column of a CSV
+    file with a header line whose first column is the time."""
+    if column is None or tsfile.is_series_file(fname):
+        return load_series(fname, column)
+    data = np.atleast_1d(np.genfromtxt(fname, delimiter=',', names=True))
+    return data[data.dtype.names[0]], data[column]
+
+
+def _sorted(t, v):
+    t = np.asarray(t, dtype=float)
+    v = np.asarray(v, dtype=float)
+    if len(t) > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind='stable')
+        t, v = t[order], v[order]
+    return t, v
+
+
+def asof(t, v, grid, tolerance=None):
+    """Last value at or before each grid point (nan before the first
+    sample, or when the last one is older than tolerance)."""
+    t, v = _sorted(t, v)
+    idx = np.searchsorted(t, grid, side='right') - 1
+    ok = idx >= 0
+    if tolerance is not None:
+        ok &= grid - t[np.maximum(idx, 0)] <= tolerance
+    out = np.full(len(grid), np.nan)
+    out[ok] = v[idx[ok]]
+    return out
+
+
+def linear(t, v, grid):
+    """Linear interpolation between samples (nan outside them)."""
+    t, v = _sorted(t, v)
+    good = ~np.isnan(v)
+    t, v = t[good], v[good]
+    if len(t) == 0:
+        return np.full(len(grid), np.nan)
+    return np.interp(grid, t, v, left=np.nan, right=np.nan)
+
+
+def timeline(series, step=None):
+    """Grid over the time span covered by every series.  The default
+    step is the smallest median sampling period among them."""
+    start = max(t.min() for t, v in series.values())
+    end = min(t.max() for t, v in series.values())
+    if step is None:
+        step = min(np.median(np.diff(np.sort(t))) for t, v in series.values() if len(t) > 1)
+    return start + np.arange(int(np.floor((end - start) / step)) + 1) * step
+
+
+def align(series, methods, grid, tolerance=None):
+    """Returns an ordered list of (column, array) with 't' first."""
+    frame = [('t', grid)]
+    for name, (t, v) in series.items():
+        if methods[name] == 'linear':
+            frame.append((name, linear(t, v, grid)))
+        else:
+            frame.append((name, asof(t, v, grid, tolerance)))
+    return frame
+
+
+def add_queue_delay(frame, bw_net, delay=None, mtu=MTU):
+    """Adds the queuing delay predicted by the backlog, the RTT model and
+    its error.  The base RTT is 4 * delay (two links, both ways) or, if
+    no delay is given, the smallest RTT measured."""
+    cols = dict(frame)
+    if 'qlen' not in cols:
+        return frame
+    qdelay = cols['qlen'] * mtu * 8 / (bw_net * 1e6) * 1000
+    frame.append(('qdelay_ms', qdelay))
+    if 'rtt' in cols:
+        base = 4 * delay if delay is not None else np.nanmin(cols['rtt'])
+        model = base + qdelay
+        frame.append(('rtt_model_ms', model))
+        frame.append(('rtt_error_ms', cols['rtt'] - model))
+    return frame
+
+
+def write_frame(fname, frame):
+    if fname.endswith('.npz'):
+        np.savez(fname, **dict(frame))
+    else:
+        np.savetxt(fname, np.column_stack([values for _, values in frame]),
+                   delimiter=',', fmt='%.6f', comments='',
+                   header=','.join(name for name, _ in frame))
+
+
+def discover(outdir):
+    """Finds the known artifacts of an experiment directory."""
+    found = {}
+    for kind, (names, method) in KINDS.items():
+        for name in names:
+            fname = os.path.join(outdir, name)
+            if os.path.exists(fname):
+                found[kind] = (fname, method)
+                break
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Align the series of an experiment")
+    parser.add_argument('--dir', '-d', help="Experiment directory (q.txt, ping.csv, iperf.txt)")
+    parser.add_argument('--series', nargs='*', default=[], metavar='NAME=FILE[:COLUMN]',
+                        help="Other 'time,value' files or tsfile series to include")
+    parser.add_argument('--method', choices=['asof', 'linear'], default=None,
+                        help="Resampling for every series (default: per kind)")
+    parser.add_argument('--step', type=float, default=None,
+                        help="Grid step in seconds (default: finest median sampling period)")
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help="Max age (sec) of an as-of sample")
+    parser.add_argument('--bw-net', type=float, default=None,
+                        help="Bottleneck bandwidth (Mb/s), to derive the queuing delay")
+    parser.add_argument('--delay', type=float, default=None,
+                        help="Link delay (ms); the base RTT is 4 * delay")
+    parser.add_argument('--mtu', type=int, default=MTU)
+    parser.add_argument('--out', '-o', default=None,
+                        help="Output .csv or .npz (default: DIR/aligned.csv)")
+    args = parser.parse_args(argv)
+
+    series, methods = {}, {}
+    if args.dir:
+        for kind, (fname, method) in discover(args.dir).items():
+            series[kind] = load_kind(kind, fname)
+            methods[kind] = method
+    for spec in args.series:
+        name, fname = spec.split('=', 1)
+        column = None
+        if ':' in fname and not os.path.exists(fname):
+            fname, column = fname.rsplit(':', 1)
+        series[name] = load_column(fname, column)
+        methods[name] = 'linear'
+    series = dict((name, s) for name, s in series.items() if len(s[0]))
+    if not series:
+        parser.error('no series to align')
+    if args.method:
+        methods = dict((name, args.method) for name in series)
+
+    grid = timeline(series, args.step)
+    frame = align(series, methods, grid, args.tolerance)
+    if args.bw_net:
+        frame = add_queue_delay(frame, args.bw_net, args.delay, args.mtu)
+    out = args.out or os.path.join(args.dir or '.', 'aligned.csv')
+    write_frame(out, frame)
+    print('%d rows x %d series -> %s' % (len(grid), len(series), out))
+
+    cols = dict(frame)
+    if 'rtt_error_ms' in cols:
+        err = cols['rtt_error_ms']
+        ok = ~np.isnan(err)
+        print('RTT model vs measured over %d samples: median error %.2f ms, '
+              'p95 |error| %.2f ms, correlation %.3f' % (
+                  ok.sum(), np.median(err[ok]), np.percentile(np.abs(err[ok]), 95),
+                  np.corrcoef(cols['rtt'][ok], cols['rtt_model_ms'][ok])[0, 1]))
+
+
+if __name__ == '__main__':
+    main()
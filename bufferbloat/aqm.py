@@ -0,0 +1,68 @@
+'''
+Active queue management (AQM) on the bottleneck link.
+
+TCLink shapes a link with an htb root (5:) and puts a netem qdisc (10:)
+below it for the delay and the buffer.  install() hangs an AQM below
+netem, as handle 20: on parent 10:1.  netem passes every packet on to it
+as soon as the packet's delay has elapsed, so the standing queue builds
+up in the AQM, which decides what to drop or ECN-mark, while htb still
+sets the rate:
+
+    sudo python3 bufferbloat.py -b 1.5 --delay 10 -d bb-fq --qdisc fq_codel
+    sudo python3 bufferbloat.py -b 1.5 --delay 10 -d bb-red --qdisc red \\
+        --qdisc-params "limit 150000 min 3000 max 9000 avpkt 1000 burst 5 bandwidth 1.5mbit"
+
+Without --qdisc-params every AQM gets its kernel defaults, except that
+its limit is the --maxq buffer, so runs with different AQMs have the
+same buffer as the plain FIFO (netem) run.
+'''
+
+QDISCS = ('fifo', 'fq_codel', 'codel', 'cake', 'pie', 'red')
+
+NETEM_PARENT = '10:1'
+AQM_HANDLE = '20:'
+MTU = 1500
+
+
+def red_params(bw_mbit, maxq, target_ms=5.0, avpkt=1000):
+    """RED thresholds for a bw_mbit link, following tc-red(8): min at
+    target_ms of queueing delay, max at three times min, limit at maxq
+    full-size packets."""
+    rate = bw_mbit * 1e6 / 8
+    qmin = max(int(rate * target_ms / 1000.0), 2 * MTU)
+    qmax = 3 * qmin
+    limit = max(maxq * MTU, 2 * qmax)
+    burst = (2 * qmin + qmax) // (3 * avpkt) + 1
+    return ('limit %d min %d max %d avpkt %d burst %d bandwidth %gmbit probability 0.1'
+            % (limit, qmin, qmax, avpkt, burst, bw_mbit))
+
+
+def default_params(kind, bw_mbit, maxq):
+    if kind in ('fq_codel', 'codel', 'pie'):
+        return 'limit %d' % maxq
+    if kind == 'red':
+        return red_params(bw_mbit, maxq)
+    if kind == 'cake':
+        # A single tin, unshaped (htb above sets the rate)
+        return 'besteffort unlimited'
+    return ''
+
+
+def tc_command(dev, kind, params=None, bw_mbit=None, maxq=100, parent=NETEM_PARENT):
+    if kind not in QDISCS or kind == 'fifo':
+        raise ValueError('unknown AQM %r' % kind)
+    if params is None:
+        params = default_params(kind, bw_mbit, maxq)
+    return ('tc qdisc add dev %s parent %s handle %s %s %s'
+            % (dev, parent, AQM_HANDLE, kind, params)).strip()
+
+
+def install(node, dev, kind, params=None, bw_mbit=None, maxq=100):
+    """Adds the AQM below the netem qdisc of dev, running tc in node
+    (the switch, for the s0 interfaces)."""
+    cmd = tc_command(dev, kind, params, bw_mbit, maxq)
+    out = node.cmd(cmd)
+    if out.strip():
+        # tc is silent on success
+        raise RuntimeError('%s: %s' % (cmd, out.strip()))
+    return cmd
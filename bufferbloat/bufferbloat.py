@@ -1,17 +1,30 @@
-from mininet.topo import Topo
-from mininet.node import CPULimitedHost
-from mininet.link import TCLink
-from mininet.net import Mininet
-from mininet.log import lg, info
-from mininet.util import dumpNodeConnections
-from mininet.cli import CLI
-
-from subprocess import Popen, PIPE
+try:
+    from mininet.topo import Topo
+    from mininet.node import CPULimitedHost, OVSBridge
+    from mininet.link import TCLink
+    from mininet.net import Mininet
+    from mininet.log import lg, info
+    from mininet.util import dumpNodeConnections
+    from mininet.cli import CLI
+except ImportError:
+    # Sem Mininet só o backend de simulação (--backend sim) funciona
+    Topo = object
+
+from subprocess import Popen, TimeoutExpired
 from time import sleep, time
 from multiprocessing import Process
 from argparse import ArgumentParser
 
-from monitor import monitor_qlen
+from monitor import monitor_qlen, AQM_COLUMNS
+from sojourn import monitor_sojourn
+from tcpprobe import monitor_tcpprobe
+from webserver import read_service_times
+from fetcher import read_fetches, percentile
+from sketch import QuantileSketch, SKETCH_FILES, format_summary
+from readiness import wait_listening
+import simulator
+import aqm
+import tsfile
 
 import sys
 import os
@@ -51,18 +64,94 @@ parser.add_argument('--cong',
                     help="Congestion control algorithm to use",
                     default="reno")
 
+parser.add_argument('--binary',
+                    help="Write queue samples as a binary series (q.bin) instead of q.txt",
+                    action='store_true',
+                    default=False)
+
+parser.add_argument('--prefix',
+                    help="Prefix for node (and interface) names, so that several "
+                         "experiments can run at the same time (see sweep.py)",
+                    default='')
+
+parser.add_argument('--backend',
+                    help="'mininet' runs the real experiment (needs root); 'sim' runs "
+                         "the discrete-event simulator in simulator.py",
+                    choices=['mininet', 'sim'],
+                    default='mininet')
+
+# Parte da banda do gargalo usada por padrão pelas buscas da página
+FETCH_LOAD = 0.2
+
+parser.add_argument('--fetch-rate',
+                    type=float,
+                    help="Mean rate of web page fetches (fetches/sec).  Each fetch holds the "
+                         "bottleneck for size of index.html / --bw-net (about 1 s at 1.5 Mb/s), "
+                         "so the default is the rate that takes %d%%%% of --bw-net (0.2/s, about "
+                         "18 fetches in 90 s, at 1.5 Mb/s); higher rates crowd out the iperf "
+                         "flow.  For hundreds of samples use a longer --time, or repeat the "
+                         "run (sweep.py --repeat merges the fetch sketches)" % (FETCH_LOAD * 100),
+                    default=None)
+
+parser.add_argument('--fetch-arrival',
+                    help="Arrival process of the web page fetches",
+                    choices=['poisson', 'fixed'],
+                    default='poisson')
+
+parser.add_argument('--fetch-conns',
+                    type=int,
+                    help="Maximum concurrent web page fetches",
+                    default=4)
+
+parser.add_argument('--seed',
+                    type=int,
+                    help="Seed of the fetch arrivals",
+                    default=None)
+
+parser.add_argument('--tcpinfo-interval',
+                    type=float,
+                    help="Period (sec) of the per-flow tcp_info samples in h1 (0 disables)",
+                    default=0.02)
+
+parser.add_argument('--qdisc',
+                    help="AQM on the bottleneck queue (s0-eth2); 'fifo' keeps netem's tail drop",
+                    choices=aqm.QDISCS,
+                    default='fifo')
+
+parser.add_argument('--qdisc-params',
+                    help="tc parameters of the AQM, e.g. 'target 5ms interval 100ms' "
+                         "(default: kernel defaults with limit --maxq, see aqm.py)",
+                    default=None)
+
+parser.add_argument('--sojourn',
+                    action='store_true',
+                    help="Also timestamp every packet at s0-eth1 and s0-eth2 and record "
+                         "its sojourn time across the switch (sojourn.txt, see sojourn.py)",
+                    default=False)
+
+parser.add_argument('--tcpprobe',
+                    action='store_true',
+                    help="Also record every cwnd/ssthresh/srtt update, retransmission and "
+                         "congestion state change from the kernel TCP tracepoints (see tcpprobe.py); "
+                         "host-wide, so not with --prefix",
+                    default=False)
+
 args = parser.parse_args()
 
+if args.fetch_rate is None:
+    page = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+    args.fetch_rate = FETCH_LOAD * args.bw_net * 1e6 / 8 / os.path.getsize(page)
+
 class BBTopo(Topo):
     "Simple topology for bufferbloat experiment."
 
     def build(self, n=2):
         # Cria um switch para o roteador
-        switch = self.addSwitch('s0')
+        switch = self.addSwitch(args.prefix + 's0')
         
         # Cria os dois hosts
-        h1 = self.addHost('h1')
-        h2 = self.addHost('h2')
+        h1 = self.addHost(args.prefix + 'h1')
+        h2 = self.addHost(args.prefix + 'h2')
 
         # Adiciona os links com as características apropriadas
         # Link do Host h1 para o roteador (conexão rápida)
@@ -71,118 +160,291 @@ class BBTopo(Topo):
         self.addLink(h2, switch, bw=args.bw_net, delay='%fms' % args.delay, max_queue_size=args.maxq)
 
 def start_iperf(net):
-    h1 = net.get('h1')
-    h2 = net.get('h2')
+    h1 = net.get(args.prefix + 'h1')
+    h2 = net.get(args.prefix + 'h2')
     print("Starting iperf server...")
     # O parâmetro -w 16m garante que a janela TCP do receptor não seja o fator limitante
     server = h2.popen("iperf -s -w 16m")
+    # O cliente só parte quando o servidor já aceita conexões
+    wait_listening(h2, 5001, proc=server)
 
     # Inicia o cliente iperf em h1 para criar um fluxo TCP de longa duração para h2
     print("Starting iperf client...")
-    client_cmd = "iperf -c %s -t %d" % (h2.IP(), args.time + 5)
-    h1.popen(client_cmd)
+    # Relatório a cada segundo em iperf.txt; a primeira linha guarda o
+    # instante de início, para alinhar os intervalos com q.txt (align.py)
+    outfile = "%s/iperf.txt" % args.dir
+    with open(outfile, 'w') as f:
+        f.write("# start %f\n" % time())
+    client_cmd = "exec iperf -c %s -t %d -i 1 >> %s" % (h2.IP(), args.time + 5, outfile)
+    client = h1.popen(client_cmd, shell=True)
+    return [server, client]
 
-def start_qmon(iface, interval_sec=0.1, outfile="q.txt"):
+def start_qmon(iface, interval_sec=0.1, outfile="q.txt", sketch_file=None, aqm_file=None):
     monitor = Process(target=monitor_qlen,
-                      args=(iface, interval_sec, outfile))
+                      args=(iface, interval_sec, outfile, None, sketch_file, aqm_file))
+    monitor.start()
+    return monitor
+
+def start_sojourn():
+    # Tempo de permanência de cada pacote entre a entrada do switch (s0-eth1,
+    # vindo de h1) e a saída pelo gargalo (s0-eth2), com o atraso do netem
+    fname = 'sojourn.bin' if args.binary else 'sojourn.txt'
+    monitor = Process(target=monitor_sojourn,
+                      args=('%ss0-eth1' % args.prefix, '%ss0-eth2' % args.prefix,
+                            '%s/%s' % (args.dir, fname),
+                            '%s/%s' % (args.dir, SKETCH_FILES['sojourn']), args.delay))
     monitor.start()
     return monitor
 
 def start_ping(net):
-    h1 = net.get('h1')
-    h2 = net.get('h2')
-    outfile = "%s/ping.txt" % args.dir
-    # Inicia um trem de pings de h1 para h2, com 10 amostras por segundo (-i 0.1)
+    h1 = net.get(args.prefix + 'h1')
+    h2 = net.get(args.prefix + 'h2')
+    outfile = "%s/%s" % (args.dir, 'ping.bin' if args.binary else 'ping.csv')
+    # Inicia um trem de pings de h1 para h2, com 10 amostras por segundo; os
+    # tempos vêm do kernel (SO_TIMESTAMPING), no mesmo relógio de q.txt
     print("Starting ping...")
-    ping_cmd = "ping -i 0.1 %s > %s" % (h2.IP(), outfile)
-    h1.popen(ping_cmd, shell=True)
+    ping_cmd = "exec python3 prober.py %s --interval 0.1 --out %s --sketch %s/%s" % (
+        h2.IP(), outfile, args.dir, SKETCH_FILES['rtt'])
+    return h1.popen(ping_cmd, shell=True)
+
+def start_tcpinfo(net):
+    h1 = net.get(args.prefix + 'h1')
+    # Estado TCP do kernel (cwnd, srtt, taxas, estimativas do BBR) de cada
+    # fluxo de h1: o iperf e as respostas do servidor web
+    print("Starting tcp_info sampler...")
+    cmd = "exec python3 tcpinfo.py --dir %s/tcpinfo --interval %f --port 5001 --port 80" % (
+        args.dir, args.tcpinfo_interval)
+    return h1.popen(cmd, shell=True)
+
+def start_tcpprobe():
+    # Eventos dos tracepoints TCP (cada atualização da cwnd, retransmissão e
+    # mudança de estado), do iperf e do servidor web.  Os tracepoints valem
+    # para todos os namespaces, por isso --tcpprobe recusa --prefix
+    print("Starting tcp tracepoint collector...")
+    monitor = Process(target=monitor_tcpprobe,
+                      args=('%s/tcpprobe' % args.dir, (5001, 80)))
+    monitor.start()
+    return monitor
 
 def start_webserver(net):
-    h1 = net.get('h1')
-    # Inicia um servidor web simples em h1
+    h1 = net.get(args.prefix + 'h1')
+    # Inicia o servidor web em h1; cada requisição vai para webserver.txt
+    # com o tempo de serviço, que depois é descontado dos tempos de busca
     print("Starting web server...")
-    proc = h1.popen("python webserver.py", shell=True)
-    sleep(1)
+    proc = h1.popen("exec python3 webserver.py --log %s/webserver.txt" % args.dir, shell=True)
+    wait_listening(h1, 80, proc=proc)
     return [proc]
 
+def write_times(fname, times):
+    avg = sum(times) / len(times)
+    std_dev = math.sqrt(sum([(t - avg) ** 2 for t in times]) / len(times))
+    with open(fname, 'w') as f:
+        f.write("Average: %.4f\n" % avg)
+        f.write("Std Dev: %.4f\n" % std_dev)
+        for t in times:
+            f.write("%.4f\n" % t)
+    return avg, std_dev
+
+def start_fetcher(net):
+    h1 = net.get(args.prefix + 'h1')
+    h2 = net.get(args.prefix + 'h2')
+    # Gerador de buscas em h2: chegadas de Poisson (ou taxa fixa), várias
+    # conexões simultâneas, um registro por busca em fetches.txt
+    print("Starting web fetches...")
+    cmd = ("exec python3 fetcher.py --url http://%s/index.html --rate %f --arrival %s "
+           "--conns %d --duration %d --out %s/fetches.txt" % (
+               h1.IP(), args.fetch_rate, args.fetch_arrival, args.fetch_conns,
+               args.time, args.dir))
+    if args.seed is not None:
+        cmd += " --seed %d" % args.seed
+    return h2.popen(cmd, shell=True)
+
+def report_fetch_times(fetch_times, service_times=None):
+    # Calcula a média e o desvio padrão dos tempos de busca
+    if fetch_times:
+        # Salva os resultados em um arquivo
+        avg_fetch, std_dev = write_times('%s/fetch_times.txt' % args.dir, fetch_times)
+
+        print("\n--- Web Fetch Results ---")
+        print("Average fetch time: %.4f s" % avg_fetch)
+        print("Std dev fetch time: %.4f s" % std_dev)
+        print("p50/p95/p99 fetch time: %.4f/%.4f/%.4f s (%d fetches)" % (
+            percentile(fetch_times, 50), percentile(fetch_times, 95),
+            percentile(fetch_times, 99), len(fetch_times)))
+        # Sketch dos tempos de busca, para juntar com os de outras rodadas
+        QuantileSketch().update(fetch_times).save(
+            '%s/%s' % (args.dir, SKETCH_FILES['fetch']))
+        if service_times:
+            # Tempo de serviço no servidor e o tempo de busca sem ele (só a rede)
+            avg_service, _ = write_times('%s/service_times.txt' % args.dir, service_times)
+            avg_net, _ = write_times('%s/fetch_times_net.txt' % args.dir,
+                                     [f - s for f, s in zip(fetch_times, service_times)])
+            print("Average service time: %.4f s" % avg_service)
+            print("Average network fetch time: %.4f s" % avg_net)
+        print("-------------------------\n")
+
+def report_sketches():
+    # Quantis (até p99.9) dos sketches gravados pelo monitor e pelo prober
+    print("--- Quantiles (sketches) ---")
+    for kind in ('rtt', 'qlen', 'sojourn', 'fetch'):
+        fname = '%s/%s' % (args.dir, SKETCH_FILES[kind])
+        if os.path.exists(fname):
+            print("%-7s %s" % (kind, format_summary(QuantileSketch.load(fname).summary())))
+    print("----------------------------\n")
+
+def report_aqm(fname):
+    # Contadores do AQM na última amostra (drops e marcas ECN são cumulativos)
+    if not os.path.exists(fname):
+        return
+    if fname.endswith(tsfile.SUFFIX):
+        last = tsfile.read_last(fname)
+        values = last[1:] if last else None
+    else:
+        # time,kind,<AQM_COLUMNS>
+        lines = [l for l in open(fname) if not l.startswith('#')]
+        values = [float(v) for v in lines[-1].split(',')[2:]] if lines else None
+    if values:
+        stats = dict(zip(AQM_COLUMNS, values))
+        print("--- AQM (%s) ---" % args.qdisc)
+        print("drops: %d  ECN marks: %d  delay: %.2f ms  target: %.2f ms\n" % (
+            stats['drops'], stats['ecn_marks'], stats['delay_ms'], stats['target_ms']))
+
+def bufferbloat_sim():
+    # Mesmo experimento, simulado: não precisa de root, Mininet nem BBR no kernel
+    print("--- Simulating experiment for %d seconds ---" % args.time)
+    start_time = time()
+    fetch_times = simulator.run_experiment(
+        args.dir, args.bw_net, args.delay, maxq=args.maxq, cong=args.cong,
+        duration=args.time, bw_host=args.bw_host,
+        qfile='q.bin' if args.binary else 'q.txt', fetch_rate=args.fetch_rate,
+        fetch_arrival=args.fetch_arrival, fetch_conns=args.fetch_conns, seed=args.seed,
+        pingfile='ping.bin' if args.binary else 'ping.csv', sketches=True)
+    print("--- Simulated in %.2f s ---" % (time() - start_time))
+    report_fetch_times(fetch_times)
+    report_sketches()
+
 def bufferbloat():
     if not os.path.exists(args.dir):
         os.makedirs(args.dir)
+    if args.backend == 'sim':
+        if args.sojourn:
+            sys.exit("--sojourn needs the mininet backend (it captures on the switch ports)")
+        if args.tcpprobe:
+            sys.exit("--tcpprobe needs the mininet backend (it reads kernel tracepoints)")
+        if args.qdisc != 'fifo':
+            sys.exit("--qdisc %s needs the mininet backend (the simulator only has tail drop)"
+                     % args.qdisc)
+        return bufferbloat_sim()
+    if args.tcpprobe and args.prefix:
+        # Os tracepoints valem para o host todo e o filtro é só por porta:
+        # os experimentos simultâneos gravariam os eventos uns dos outros
+        sys.exit("--tcpprobe cannot be used with --prefix (the tracepoints see every "
+                 "concurrent experiment on the same ports)")
     os.system("sysctl -w net.ipv4.tcp_congestion_control=%s" % args.cong)
     topo = BBTopo()
-    net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
+    if args.prefix:
+        # Vários experimentos simultâneos: um bridge OVS em modo standalone
+        # por experimento, sem controlador (que disputaria a porta 6653)
+        net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink,
+                      switch=OVSBridge, controller=None)
+    else:
+        net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
     net.start()
     dumpNodeConnections(net.hosts)
+
+    # AQM abaixo do netem da interface de gargalo (ver aqm.py)
+    if args.qdisc != 'fifo':
+        print(aqm.install(net.get(args.prefix + 's0'), '%ss0-eth2' % args.prefix,
+                          args.qdisc, args.qdisc_params, args.bw_net, args.maxq))
+
+    # O controle de congestionamento é por namespace nos kernels atuais;
+    # configura nos próprios hosts para não depender do valor global
+    for host in net.hosts:
+        host.cmd("sysctl -w net.ipv4.tcp_congestion_control=%s" % args.cong)
     net.pingAll()
 
-    # Inicia o monitoramento do tamanho da fila na interface de gargalo s0-eth2
-    qmon = start_qmon(iface='s0-eth2',
-                      outfile='%s/q.txt' % (args.dir))
+    # Inicia o monitoramento do tamanho da fila na interface de gargalo s0-eth2,
+    # com os contadores do AQM (drops, marcas ECN, atraso) em aqm.txt
+    aqm_file = None
+    if args.qdisc != 'fifo':
+        aqm_file = '%s/%s' % (args.dir, 'aqm.bin' if args.binary else 'aqm.txt')
+    qmon = start_qmon(iface='%ss0-eth2' % args.prefix,
+                      outfile='%s/%s' % (args.dir, 'q.bin' if args.binary else 'q.txt'),
+                      sketch_file='%s/%s' % (args.dir, SKETCH_FILES['qlen']),
+                      aqm_file=aqm_file)
+    sojourn = start_sojourn() if args.sojourn else None
+    tcpprobe = start_tcpprobe() if args.tcpprobe else None
+
+    # Amostragem do tcp_info antes do primeiro fluxo começar
+    tcpinfo = start_tcpinfo(net) if args.tcpinfo_interval > 0 else None
 
     # Inicia os geradores de tráfego e servidores
-    start_iperf(net)
-    start_ping(net)
+    procs = start_iperf(net)
+    ping = start_ping(net)
     web_procs = start_webserver(net)
 
-    # Mede o tempo de download da página web
-    h1 = net.get('h1')
-    h2 = net.get('h2')
-    fetch_times = []
-    
+    # Buscas da página web durante todo o experimento, em h2
+    fetcher = start_fetcher(net)
+
     print("--- Starting experiment for %d seconds ---" % args.time)
     start_time = time()
-    
-    # Realiza 3 medições de download durante o experimento
-    fetch_schedule = [args.time * 0.3, args.time * 0.5, args.time * 0.7]
-
-    while True:
-        now = time()
-        delta = now - start_time
-        if delta >= args.time:
-            break
-
-        if fetch_schedule and delta >= fetch_schedule[0]:
-            fetch_schedule.pop(0)
-            print("\n--- Fetching webpage, t=%.1f s ---" % delta)
-            url = 'http://%s/index.html' % h1.IP()
-            curl_cmd = 'curl -o /dev/null -s -w %%{time_total} %s' % url
-            
-            result = h2.popen(curl_cmd, shell=True, stdout=PIPE)
-            # Lê o resultado, decodifica, remove espaços e troca vírgula por ponto
-            fetch_time_str = result.stdout.read().decode().strip().replace(',', '.')
-            if fetch_time_str:
-                fetch_time = float(fetch_time_str)
-                fetch_times.append(fetch_time)
-                print("--- Fetch time: %.4f s ---\n" % fetch_time)
-        
-        sleep(1)
+    sleep(args.time)
+    # As buscas em andamento têm alguns segundos para terminar
+    try:
+        fetcher.wait(timeout=30)
+    except TimeoutExpired:
+        fetcher.kill()
+    print("--- Experiment done in %.1f s ---" % (time() - start_time))
 
-    # Calcula a média e o desvio padrão dos tempos de busca
-    if fetch_times:
-        avg_fetch = sum(fetch_times) / len(fetch_times)
-        std_dev = math.sqrt(sum([(t - avg_fetch) ** 2 for t in fetch_times]) / len(fetch_times))
-        
-        print("\n--- Web Fetch Results ---")
-        print("Average fetch time: %.4f s" % avg_fetch)
-        print("Std dev fetch time: %.4f s" % std_dev)
-        print("-------------------------\n")
-        
-        # Salva os resultados em um arquivo
-        with open('%s/fetch_times.txt' % (args.dir), 'w') as f:
-            f.write("Average: %.4f\n" % avg_fetch)
-            f.write("Std Dev: %.4f\n" % std_dev)
-            for t in fetch_times:
-                f.write("%.4f\n" % t)
+    fetches = [f for f in read_fetches('%s/fetches.txt' % args.dir) if f['status'] == 200]
+    fetch_times = [f['total'] for f in fetches]
+    service_times = None
+    try:
+        logged = read_service_times('%s/webserver.txt' % args.dir)
+        targets = ['/index.html?fetch=%d' % f['id'] for f in fetches]
+        if all(t in logged for t in targets):
+            service_times = [logged[t] for t in targets]
+    except IOError:
+        pass
+    report_fetch_times(fetch_times, service_times)
+    if fetches:
+        ttfb = [f['ttfb'] for f in fetches]
+        print("p50/p95/p99 time to first byte: %.4f/%.4f/%.4f s\n" % (
+            percentile(ttfb, 50), percentile(ttfb, 95), percentile(ttfb, 99)))
     
     # CLI(net) # Descomente para depuração manual
 
     # Finaliza todos os processos
     qmon.terminate()
-    for proc in web_procs:
+    if sojourn:
+        sojourn.terminate()
+    if tcpprobe:
+        tcpprobe.terminate()
+    # SIGTERM para o prober gravar o que ainda está no buffer
+    ping.terminate()
+    ping.wait()
+    if tcpinfo:
+        tcpinfo.terminate()
+        tcpinfo.wait()
+    qmon.join()
+    if sojourn:
+        sojourn.join()
+    if tcpprobe:
+        tcpprobe.join()
+    report_sketches()
+    if aqm_file:
+        report_aqm(aqm_file)
+    for proc in web_procs + procs:
         proc.kill()
-    Popen("killall -9 iperf ping", shell=True).wait()
-    net.stop()
-    Popen("pgrep -f webserver.py | xargs kill -9", shell=True).wait()
+    if args.prefix:
+        # Só mata os processos deste experimento; os outros continuam rodando
+        for proc in web_procs + procs:
+            proc.wait()
+        net.stop()
+    else:
+        Popen("killall -9 iperf", shell=True).wait()
+        net.stop()
+        Popen("pgrep -f webserver.py | xargs kill -9", shell=True).wait()
 
 if __name__ == "__main__":
     bufferbloat()
\ No newline at end of file
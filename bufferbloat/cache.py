@@ -0,0 +1,243 @@
+'''
+Content-addressed cache of parsed series and rendered plots.
+
+Re-running the plot stage of a sweep re-parses every text series and
+re-renders every PNG even if nothing changed.  Here a result is stored
+under a key hashed from everything it depends on:
+
+    the contents of the input files (not their names or times),
+    the source of the code that parses and draws them (any edit of
+    helper.py or of the plot script invalidates its entries) and the
+    matplotlib version,
+    the plot parameters (legend, decimation, dpi, ...).
+
+Hashing a large input costs a read of the file, so the digest itself is
+cached under the file's (path, size, mtime, inode): unchanged files are
+not read again.  Entries are plain files in a two-level directory tree,
+written atomically (temporary file + rename), so several plot processes
+can share a cache.  Every hit refreshes the entry's mtime, and once the
+cache grows past max_bytes the least recently used entries are removed.
+
+    python3 plot_batch.py --sweep sweep-1            # renders everything
+    python3 plot_batch.py --sweep sweep-1            # only copies PNGs
+    python3 cache.py stats
+    python3 cache.py clear
+
+The default location is ~/.cache/bufferbloat-plots, or $BB_CACHE_DIR.
+This module only uses the standard library.  competicao/cache.py loads it
+for the chart scripts of the competition scenarios.
+'''
+
+from argparse import ArgumentParser
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+DEFAULT_DIR = os.environ.get('BB_CACHE_DIR',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'bufferbloat-plots'))
+DEFAULT_MAX_BYTES = 1 << 30
+CHUNK = 1 << 20
+
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode('utf-8')
+        # Length-prefixed, so ('ab', 'c') and ('a', 'bc') differ
+        h.update(b'%d:' % len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+
+    def __init__(self, root=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = None    # bytes in the cache, counted on the first store
+        self._sources = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def key(self, *parts):
+        """Key of a result from its inputs: file digests, source digests
+        and parameters (anything with a stable repr)."""
+        return _hash(*parts)
+
+    def file_digest(self, fname):
+        """Digest of the contents of fname, remembered for as long as the
+        file keeps its size, mtime and inode."""
+        st = os.stat(fname)
+        stat_key = _hash('stat', os.path.realpath(fname), st.st_size, st.st_mtime_ns, st.st_ino)
+        digest = self.get_bytes(stat_key)
+        if digest is not None:
+            return digest.decode('ascii')
+        h = hashlib.sha256()
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        self.put_bytes(stat_key, digest.encode('ascii'))
+        return digest
+
+    def source_digest(self, *fnames):
+        """Digest of code: the given source files, plus the matplotlib
+        version when it has been imported."""
+        parts = []
+        for fname in fnames:
+            if fname.endswith('.pyc'):
+                fname = fname[:-1]
+            if fname not in self._sources:
+                with open(fname, 'rb') as f:
+                    self._sources[fname] = hashlib.sha256(f.read()).hexdigest()
+            parts.append(self._sources[fname])
+        mpl = sys.modules.get('matplotlib')
+        return _hash(getattr(mpl, '__version__', None), *parts)
+
+    def get_bytes(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        self._touch(path)
+        return data
+
+    def put_bytes(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._grew(len(data))
+
+    def fetch_file(self, key, out):
+        """Copies the cached file to out; False on a miss."""
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, out)
+        except (IOError, OSError):
+            return False
+        self._touch(path)
+        return True
+
+    def store_file(self, key, fname):
+        with open(fname, 'rb') as f:
+            self.put_bytes(key, f.read())
+
+    def memo(self, key, compute):
+        """compute() once per key; the result is pickled."""
+        data = self.get_bytes(key)
+        if data is not None:
+            try:
+                return pickle.loads(data)
+            except Exception:
+                pass
+        value = compute()
+        self.put_bytes(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def load(self, loader, fname, *args):
+        """loader(fname, *args) (e.g. helper.load_series), cached on the
+        contents of fname and the source of the loader's module."""
+        module = sys.modules[loader.__module__]
+        key = self.key('load', loader.__qualname__, self.source_digest(module.__file__),
+                       self.file_digest(fname), args)
+        return self.memo(key, lambda: loader(fname, *args))
+
+    def render(self, out, draw, *args):
+        """draw(out, *args), which saves the plot to out, unless out is
+        cached for these arguments and the source of draw's module.
+        Returns whether out came from the cache."""
+        key = self.key('render', os.path.basename(out), draw.__qualname__,
+                       self.source_digest(inspect.getsourcefile(draw)),
+                       pickle.dumps(args, pickle.HIGHEST_PROTOCOL))
+        if self.fetch_file(key, out):
+            return True
+        draw(out, *args)
+        self.store_file(key, out)
+        return False
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _grew(self, nbytes):
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        else:
+            self.size += nbytes
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """(path, size, mtime) of every entry."""
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.startswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def evict(self, max_bytes=None):
+        """Removes the least recently used entries down to max_bytes
+        (3/4 of the limit by default, so that eviction is not rerun on
+        every store)."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes * 3 // 4
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+        return removed
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Cache of parsed series and rendered plots")
+    parser.add_argument('cmd', choices=['stats', 'clear', 'evict'])
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="Cache directory")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="Size limit for evict (MB)")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.dir, int(args.max_mb * 2**20))
+    if args.cmd == 'stats':
+        entries = list(cache.entries())
+        print('%s: %d entries, %.1f MB' % (args.dir, len(entries),
+                                           sum(size for _, size, _ in entries) / 2**20))
+    elif args.cmd == 'evict':
+        print('%d entries removed' % cache.evict(cache.max_bytes))
+    else:
+        print('%d entries removed' % cache.evict(0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+'''
+Builds a static HTML dashboard of the trials of a sweep (or of any
+bufferbloat.py --dir outputs), viewable offline from the file system.
+
+Each series found by align.discover (queue length, sojourn time, RTT,
+iperf rate) is cut into multi-resolution tiles: level L splits the trace
+into 2**L chunks of equal duration, each reduced with minmax_decimate to
+at most TILE_BUCKETS pixel buckets, down to the level where the chunks
+hold the raw samples.  The page first draws level 0 and, when zooming in, loads
+only the finer chunks that cover the view.  Tiles and the index are
+written as small JavaScript files loaded with <script> tags, because
+browsers refuse fetch() on file:// pages.
+
+    python3 dashboard.py --sweep sweep-1            # sweep-1/dashboard/index.html
+    python3 dashboard.py bb-q20 bb-q100 --out dash
+'''
+
+from helper import *
+from align import discover, load_kind
+from sketch import QuantileSketch, SKETCH_FILES
+
+import json
+import shutil
+
+TILE_BUCKETS = 1000
+
+UNITS = {'qlen': 'packets', 'rtt': 'ms', 'mbps': 'Mb/s', 'sojourn': 'ms'}
+
+
+def tile_levels(t, v, buckets=TILE_BUCKETS):
+    """Yields (level, [(x, y) per chunk]) from the coarsest level down to
+    the one whose chunks are no longer decimated."""
+    t0, t1 = t[0], t[-1]
+    level = 0
+    while True:
+        n = 2 ** level
+        edges = np.searchsorted(t, t0 + (t1 - t0) * np.arange(n + 1) / n)
+        edges[-1] = len(t)
+        yield level, [minmax_decimate(t[lo:hi], v[lo:hi], buckets)
+                      for lo, hi in zip(edges[:-1], edges[1:])]
+        if np.max(np.diff(edges)) <= 4 * buckets or t1 == t0:
+            break
+        level += 1
+
+
+def write_js(fname, call, *args):
+    with open(fname, 'w') as f:
+        f.write('%s(%s);\n' % (call, ', '.join(json.dumps(a, separators=(',', ':'))
+                                                 for a in args)))
+
+
+def write_series(datadir, key, t, v):
+    """Writes the tiles of one series; returns its entry in the index."""
+    levels = 0
+    for level, chunks in tile_levels(t, v):
+        levels = level + 1
+        os.makedirs(os.path.join(datadir, key, str(level)), exist_ok=True)
+        for k, (x, y) in enumerate(chunks):
+            if len(x):
+                write_js(os.path.join(datadir, key, str(level), '%d.js' % k),
+                         'dashboardTile', '%s/%d/%d' % (key, level, k),
+                         np.round(x, 4).tolist(), np.round(y, 3).tolist())
+    good = ~np.isnan(v)
+    return {'t0': float(t[0]), 't1': float(t[-1]), 'levels': levels, 'n': len(t),
+            'min': float(v[good].min()) if good.any() else 0.0,
+            'max': float(v[good].max()) if good.any() else 0.0}
+
+
+def sketch_summaries(outdir):
+    ret = {}
+    for kind, fname in SKETCH_FILES.items():
+        fname = os.path.join(outdir, fname)
+        if os.path.exists(fname):
+            ret[kind] = QuantileSketch.load(fname).summary()
+    return ret
+
+
+def sweep_trials(sweep_dir):
+    with open(os.path.join(sweep_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    return [(t['name'], t['dir'], t['params']) for t in manifest['trials']
+            if t['status'] == 'done']
+
+
+def build(trials, out):
+    """trials: [(name, directory, params)]; writes out/index.html."""
+    datadir = os.path.join(out, 'data')
+    if os.path.exists(datadir):
+        shutil.rmtree(datadir)
+    os.makedirs(datadir)
+    index = []
+    for i, (name, outdir, params) in enumerate(trials):
+        found = dict((kind, load_kind(kind, fname))
+                     for kind, (fname, _) in discover(outdir).items())
+        found = dict((kind, (t, v)) for kind, (t, v) in found.items() if len(t))
+        if not found:
+            print('%s: no series, skipped' % name)
+            continue
+        # Every series of a trial shares its time origin
+        start = min(t.min() for t, v in found.values())
+        series = {}
+        for kind, (t, v) in sorted(found.items()):
+            t = np.asarray(t, dtype=float)
+            v = np.asarray(v, dtype=float)
+            order = np.argsort(t, kind='stable')
+            series[kind] = write_series(datadir, 'trial%d/%s' % (i, kind),
+                                        t[order] - start, v[order])
+            series[kind]['units'] = UNITS[kind]
+        index.append({'id': 'trial%d' % i, 'name': name, 'params': params,
+                      'series': series, 'quantiles': sketch_summaries(outdir)})
+        print('%s: %s' % (name, ', '.join('%s %d pts/%d levels' % (
+            kind, s['n'], s['levels']) for kind, s in sorted(series.items()))))
+    write_js(os.path.join(datadir, 'index.js'), 'dashboardIndex', index)
+    with open(os.path.join(out, 'index.html'), 'w') as f:
+        f.write(PAGE)
+    return index
+
+
+PAGE = r'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Bufferbloat dashboard</title>
+<style>
+body { margin: 0; font: 13px sans-serif; display: flex; height: 100vh; }
+#trials { width: 300px; overflow-y: auto; border-right: 1px solid #ccc; }
+#trials div { padding: 6px 8px; border-bottom: 1px solid #eee; cursor: pointer; }
+#trials div.sel { background: #dde8f8; }
+#trials small { color: #666; }
+#main { flex: 1; display: flex; flex-direction: column; padding: 8px; }
+#main canvas { flex: 1; width: 100%; min-height: 0; }
+#status { color: #666; height: 18px; }
+</style>
+</head>
+<body>
+<div id="trials"></div>
+<div id="main"><div id="status">Wheel: zoom, drag: pan, double click: reset</div></div>
+<script>
+var KINDS = ['qlen', 'sojourn', 'rtt', 'mbps'];
+var LABELS = {qlen: 'Queue (packets)', sojourn: 'Sojourn (ms)', rtt: 'RTT (ms)', mbps: 'iperf (Mb/s)'};
+var trials = [], trial = null, view = null, tiles = {}, pending = {}, panels = {};
+
+function dashboardIndex(index) { trials = index; listTrials(); if (trials.length) select(0); }
+function dashboardTile(key, x, y) { tiles[key] = {x: x, y: y}; delete pending[key]; schedule(); }
+
+function load(key) {
+  if (tiles[key] || pending[key]) return;
+  pending[key] = true;
+  var s = document.createElement('script');
+  s.src = 'data/' + key + '.js';
+  s.onerror = function() { tiles[key] = {x: [], y: []}; delete pending[key]; };
+  document.head.appendChild(s);
+}
+
+function fmt(v) { return v == null ? '-' : Math.abs(v) >= 100 ? v.toFixed(0) : v.toPrecision(3); }
+
+function listTrials() {
+  var list = document.getElementById('trials');
+  trials.forEach(function(tr, i) {
+    var d = document.createElement('div'), q = tr.quantiles, txt = '';
+    KINDS.concat(['fetch']).forEach(function(k) {
+      if (q[k]) txt += '<br>' + k + ' p50 ' + fmt(q[k].p50) + ' p99 ' + fmt(q[k].p99) + ' p99.9 ' + fmt(q[k]['p99.9']);
+    });
+    d.innerHTML = '<b>' + tr.name + '</b><small>' + txt + '</small>';
+    d.onclick = function() { select(i); };
+    list.appendChild(d);
+  });
+}
+
+function select(i) {
+  trial = trials[i];
+  var divs = document.getElementById('trials').children;
+  for (var j = 0; j < divs.length; j++) divs[j].className = j == i ? 'sel' : '';
+  var main = document.getElementById('main');
+  for (var k in panels) main.removeChild(panels[k]);
+  panels = {};
+  var t0 = Infinity, t1 = -Infinity;
+  KINDS.forEach(function(k) {
+    var s = trial.series[k];
+    if (!s) return;
+    t0 = Math.min(t0, s.t0); t1 = Math.max(t1, s.t1);
+    var c = document.createElement('canvas');
+    main.appendChild(c);
+    panels[k] = c;
+    attach(c);
+  });
+  view = {x0: t0, x1: t1, full: [t0, t1]};
+  schedule();
+}
+
+// Chunks covering the view at the level matching its zoom
+function wanted(s) {
+  var level = Math.ceil(Math.log2((s.t1 - s.t0) / (view.x1 - view.x0)) + 1e-9);
+  level = Math.max(0, Math.min(s.levels - 1, level));
+  var n = Math.pow(2, level), w = (s.t1 - s.t0) / n || 1, ret = [];
+  var lo = Math.max(0, Math.floor((view.x0 - s.t0) / w));
+  var hi = Math.min(n - 1, Math.floor((view.x1 - s.t0) / w));
+  for (var k = lo; k <= hi; k++) ret.push([level, k]);
+  return ret;
+}
+
+// Best loaded tile for a chunk: itself, or its closest loaded parent
+function best(key, level, k) {
+  for (var l = level; l >= 0; l--, k >>= 1) {
+    var tile = tiles[key + '/' + l + '/' + k];
+    if (tile) return tile;
+  }
+  return null;
+}
+
+var scheduled = false;
+function schedule() {
+  if (!scheduled) { scheduled = true; requestAnimationFrame(function() { scheduled = false; draw(); }); }
+}
+
+function draw() {
+  var loading = 0;
+  for (var kind in panels) {
+    var s = trial.series[kind], key = trial.id + '/' + kind, seen = [];
+    var chunks = wanted(s);
+    load(key + '/0/0');
+    chunks.forEach(function(c) {
+      load(key + '/' + c[0] + '/' + c[1]);
+      if (!tiles[key + '/' + c[0] + '/' + c[1]]) loading++;
+      var tile = best(key, c[0], c[1]);
+      if (tile && seen.indexOf(tile) < 0) seen.push(tile);
+    });
+    plot(panels[kind], LABELS[kind], seen);
+  }
+  document.getElementById('status').textContent = trial.name + ': ' +
+      view.x0.toFixed(2) + ' - ' + view.x1.toFixed(2) + ' s' + (loading ? ' (loading ' + loading + ' tiles)' : '');
+}
+
+function plot(c, label, list) {
+  var dpr = window.devicePixelRatio || 1;
+  var w = c.width = c.clientWidth * dpr, h = c.height = c.clientHeight * dpr;
+  var g = c.getContext('2d'), L = 60 * dpr, B = 18 * dpr, T = 16 * dpr;
+  var ymin = 0, ymax = -Infinity;
+  list.forEach(function(t) {
+    for (var i = 0; i < t.x.length; i++)
+      if (t.x[i] >= view.x0 && t.x[i] <= view.x1) { ymax = Math.max(ymax, t.y[i]); ymin = Math.min(ymin, t.y[i]); }
+  });
+  if (!isFinite(ymax) || ymax == ymin) ymax = ymin + 1;
+  ymax *= 1.05;
+  var sx = (w - L) / (view.x1 - view.x0), sy = (h - B - T) / (ymax - ymin);
+  g.font = (11 * dpr) + 'px sans-serif';
+  g.fillStyle = '#000';
+  g.fillText(label, L, T - 4 * dpr);
+  g.strokeStyle = '#ccc';
+  g.lineWidth = 1;
+  for (var i = 0; i <= 4; i++) {
+    var y = T + (h - B - T) * i / 4, x = L + (w - L) * i / 4;
+    g.beginPath(); g.moveTo(L, y); g.lineTo(w, y); g.moveTo(x, T); g.lineTo(x, h - B); g.stroke();
+    g.fillText(fmt(ymax - (ymax - ymin) * i / 4), 4 * dpr, y + 4 * dpr);
+    g.fillText(fmt(view.x0 + (view.x1 - view.x0) * i / 4) + ' s', x - (i == 4 ? 40 * dpr : 0), h - 4 * dpr);
+  }
+  g.save();
+  g.beginPath(); g.rect(L, T, w - L, h - B - T); g.clip();
+  g.strokeStyle = '#c00';
+  g.lineWidth = 1.5 * dpr;
+  list.forEach(function(t) {
+    g.beginPath();
+    for (var i = 0; i < t.x.length; i++) {
+      var px = L + (t.x[i] - view.x0) * sx, py = h - B - (t.y[i] - ymin) * sy;
+      if (i) g.lineTo(px, py); else g.moveTo(px, py);
+    }
+    g.stroke();
+  });
+  g.restore();
+  c.plotLeft = L / dpr;
+}
+
+function attach(c) {
+  c.onwheel = function(e) {
+    e.preventDefault();
+    var r = c.getBoundingClientRect(), f = e.deltaY > 0 ? 1.25 : 0.8;
+    var frac = Math.max(0, (e.clientX - r.left - c.plotLeft) / (r.width - c.plotLeft));
+    var at = view.x0 + frac * (view.x1 - view.x0);
+    view.x0 = Math.max(view.full[0], at - (at - view.x0) * f);
+    view.x1 = Math.min(view.full[1], at + (view.x1 - at) * f);
+    schedule();
+  };
+  c.onmousedown = function(e) {
+    var startX = e.clientX, v0 = view.x0, v1 = view.x1, r = c.getBoundingClientRect();
+    window.onmousemove = function(e) {
+      var dt = (startX - e.clientX) / (r.width - c.plotLeft) * (v1 - v0);
+      dt = Math.max(view.full[0] - v0, Math.min(view.full[1] - v1, dt));
+      view.x0 = v0 + dt; view.x1 = v1 + dt;
+      schedule();
+    };
+    window.onmouseup = function() { window.onmousemove = null; };
+  };
+  c.ondblclick = function() { view.x0 = view.full[0]; view.x1 = view.full[1]; schedule(); };
+}
+window.onresize = schedule;
+</script>
+<script src="data/index.js"></script>
+</body>
+</html>
+'''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static HTML dashboard of experiment results")
+    parser.add_argument('dirs', nargs='*', help="Experiment directories (bufferbloat.py --dir)")
+    parser.add_argument('--sweep', help="Sweep directory (every finished trial)")
+    parser.add_argument('--out', '-o', default=None,
+                        help="Output directory (default: SWEEP/dashboard or ./dashboard)")
+    args = parser.parse_args(argv)
+
+    trials = [(os.path.basename(os.path.normpath(d)), d, {}) for d in args.dirs]
+    if args.sweep:
+        trials.extend(sweep_trials(args.sweep))
+    if not trials:
+        parser.error('no experiment directories (give DIRS or --sweep)')
+    out = args.out or os.path.join(args.sweep or '.', 'dashboard')
+    index = build(trials, out)
+    print('%d trials -> %s' % (len(index), os.path.join(out, 'index.html')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+'''
+Web fetch load generator for the bufferbloat experiment.
+
+Runs inside h2 for the whole experiment and downloads the page from h1
+with Poisson (or fixed rate) arrivals, up to --conns requests at a time.
+Arrivals keep their schedule no matter how slow the fetches are; an
+arrival that finds every connection busy waits for one, and the wait is
+recorded separately.
+
+Every request appends one line to --out as soon as it finishes:
+
+    <epoch> <id> <wait_sec> <ttfb_sec> <total_sec> <bytes> <status>
+
+ttfb and total are measured like curl's time_starttransfer and
+time_total: from the start of the request (including the TCP handshake
+on a new connection) to the first and to the last byte of the response.
+Failed requests have status 0.  The page is requested as <path>?fetch=<id>
+so that the line can be matched with the web server log.
+
+    python3 fetcher.py --url http://10.0.0.1/index.html --rate 2 \\
+        --duration 90 --out fetches.txt
+'''
+
+from argparse import ArgumentParser
+from time import time
+from urllib.parse import urlsplit
+import asyncio
+import math
+import random
+
+CONNECT_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 60.0
+
+
+def arrival_times(rate, kind, duration, rng=random):
+    """Offsets (sec) of the requests in [0, duration): 'poisson' draws
+    exponential gaps with mean 1/rate, 'fixed' spaces them evenly."""
+    t = 0.0
+    while rate > 0:
+        t += rng.expovariate(rate) if kind == 'poisson' else 1.0 / rate
+        if t >= duration:
+            break
+        yield t
+
+
+def percentile(values, p):
+    """p-th percentile (0-100) with linear interpolation."""
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    k = (len(values) - 1) * p / 100.0
+    lo = int(math.floor(k))
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def read_fetches(fname):
+    """Returns the lines of a fetcher output as a list of dicts."""
+    fetches = []
+    with open(fname) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 7:
+                continue
+            fetches.append({'epoch': float(fields[0]), 'id': int(fields[1]),
+                            'wait': float(fields[2]), 'ttfb': float(fields[3]),
+                            'total': float(fields[4]), 'bytes': int(fields[5]),
+                            'status': int(fields[6])})
+    return fetches
+
+
+class Fetcher(object):
+
+    def __init__(self, url, conns, keep_alive, out):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self.sep = '&' if parts.query else '?'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.keep_alive = keep_alive
+        self.conns = conns
+        self.slots = None       # created in run(), inside the event loop
+        self.idle = []          # (reader, writer) of kept-alive connections
+        self.out = out
+        self.done = 0
+        self.failed = 0
+
+    async def request(self, rid):
+        loop = asyncio.get_running_loop()
+        reused = bool(self.idle)
+        if reused:
+            reader, writer = self.idle.pop()
+        else:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+        try:
+            writer.write(('GET %s%sfetch=%d HTTP/1.1\r\nHost: %s\r\n'
+                          'User-Agent: bufferbloat-fetcher\r\nConnection: %s\r\n\r\n' % (
+                              self.path, self.sep, rid, self.host,
+                              'keep-alive' if self.keep_alive else 'close')).encode())
+            await writer.drain()
+            first = await reader.readexactly(1)
+            ttfb = loop.time()
+            head = (first + await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+            status = int(head.split(None, 2)[1])
+            length = None
+            close = not self.keep_alive
+            for line in head.split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                name = name.strip().lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'connection' and value.strip().lower() == 'close':
+                    close = True
+            if length is None:
+                body = await reader.read()
+                close = True
+            else:
+                body = await reader.readexactly(length)
+        except BaseException:
+            writer.close()
+            raise
+        if close:
+            writer.close()
+        else:
+            self.idle.append((reader, writer))
+        return status, ttfb, len(body)
+
+    async def fetch(self, rid, scheduled):
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            start = loop.time()
+            try:
+                status, ttfb, nbytes = await asyncio.wait_for(
+                    self.request(rid), REQUEST_TIMEOUT)
+                ttfb -= start
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError, ValueError, IndexError):
+                status, ttfb, nbytes = 0, float('nan'), 0
+            end = loop.time()
+        if status == 0:
+            self.failed += 1
+        else:
+            self.done += 1
+        self.out.write('%.6f %d %.6f %.6f %.6f %d %d\n' % (
+            time(), rid, start - scheduled, ttfb, end - start, nbytes, status))
+
+    async def run(self, arrivals, grace):
+        loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.conns)
+        t0 = loop.time()
+        tasks = []
+        for rid, offset in enumerate(arrivals):
+            delay = t0 + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self.fetch(rid, t0 + offset)))
+            tasks = [t for t in tasks if not t.done()]
+        # Requests still running at the end get `grace` seconds to finish
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=grace)
+            for task in pending:
+                task.cancel()
+        for reader, writer in self.idle:
+            writer.close()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Web fetch load generator")
+    parser.add_argument('--url', required=True, help="Page to download")
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help="Mean arrival rate (requests/sec)")
+    parser.add_argument('--arrival', choices=['poisson', 'fixed'], default='poisson',
+                        help="Arrival process")
+    parser.add_argument('--conns', type=int, default=4,
+                        help="Maximum concurrent requests")
+    parser.add_argument('--keep-alive', action='store_true', default=False,
+                        help="Reuse connections instead of one connection per fetch")
+    parser.add_argument('--duration', type=float, required=True,
+                        help="Generate arrivals for this long (sec)")
+    parser.add_argument('--grace', type=float, default=30.0,
+                        help="Time (sec) given to the last requests to finish")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', required=True, help="Output file (one line per request)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    arrivals = arrival_times(args.rate, args.arrival, args.duration, rng)
+    with open(args.out, 'w', buffering=1) as out:
+        fetcher = Fetcher(args.url, args.conns, args.keep_alive, out)
+        asyncio.run(fetcher.run(arrivals, args.grace))
+    print("%d fetches, %d failed" % (fetcher.done, fetcher.failed))
+
+
+if __name__ == '__main__':
+    main()
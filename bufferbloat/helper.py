@@ -10,6 +10,16 @@ m.use("Agg")
 import matplotlib.pyplot as plt
 import argparse
 import math
+import numpy as np
+import tsfile
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+# Largest growth of alpha**-k allowed inside one block of _ewma_blocks
+_EWMA_RANGE = 1e100
 
 def read_list(fname, delim=','):
     lines = open(fname)
@@ -20,16 +30,165 @@ def read_list(fname, delim=','):
         ret.append(ls)
     return ret
 
-def ewma(alpha, values):
-    if alpha == 0:
-        return values
+def parse_ping(fname):
+    """Parses `ping` output into [[n, rtt_ms], ...] where n counts replies."""
     ret = []
-    prev = 0
-    for v in values:
-        prev = alpha * prev + (1 - alpha) * v
-        ret.append(prev)
+    lines = open(fname).readlines()
+    num = 0
+    for line in lines:
+        if 'bytes from' not in line:
+            continue
+        try:
+            rtt = line.split(' ')[-2]
+            rtt = rtt.split('=')[1]
+            rtt = float(rtt)
+            ret.append([num, rtt])
+            num += 1
+        except:
+            break
     return ret
 
+def read_series(fname):
+    """Maps a tsfile series into memory.
+
+    Returns (header, records) where records is a read-only structured
+    array with a 't' field plus one field per header column, backed by
+    np.memmap so nothing is parsed or copied up front."""
+    header, offset = tsfile.read_header(fname)
+    dtype = np.dtype([('t', '<f8')] + [(c, '<f8') for c in header['columns']])
+    n = (os.path.getsize(fname) - offset) // dtype.itemsize
+    if n == 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=(n,))
+
+def load_series(fname, column=None):
+    """Returns (t, values) arrays from either a tsfile series or a text
+    'time,value' file such as q.txt."""
+    if tsfile.is_series_file(fname):
+        header, rec = read_series(fname)
+        return rec['t'], rec[column or header['columns'][0]]
+    data = np.loadtxt(fname, delimiter=',', ndmin=2)
+    if data.size == 0:
+        return np.zeros(0), np.zeros(0)
+    return data[:, 0], data[:, 1]
+
+def cached_load(cache, loader, fname, *args):
+    """loader(fname, *args) through a cache.ResultCache (None: no cache).
+    tsfile series are memory-mapped, which is cheaper than a cache hit."""
+    if cache is None or tsfile.is_series_file(fname):
+        return loader(fname, *args)
+    return cache.load(loader, fname, *args)
+
+def load_rtt(fname, freq=10):
+    """Returns (t, rtt_ms) arrays of the answered probes.
+
+    Reads prober.py output (ping.csv, or a tsfile series such as ping.bin)
+    with its absolute send times, or plain `ping` output, whose times are
+    reconstructed as n/freq."""
+    if tsfile.is_series_file(fname):
+        header, rec = read_series(fname)
+        if 'lost' not in header['columns']:
+            # Converted ping output (see convert_text)
+            return load_series(fname)
+        ok = rec['lost'] == 0
+        return rec['t'][ok], rec['rtt_ms'][ok]
+    with open(fname) as f:
+        first = f.readline()
+    if first.startswith('epoch,'):
+        data = np.atleast_1d(np.genfromtxt(fname, delimiter=',', names=True))
+        ok = data['lost'] == 0
+        return data['epoch'][ok], data['rtt_ms'][ok]
+    data = np.array(parse_ping(fname), dtype=float).reshape(-1, 2)
+    return data[:, 0] / freq, data[:, 1]
+
+IPERF_INTERVAL_RE = re.compile(r'\[\s*\d+\]\s+([\d.]+)\s*-\s*([\d.]+)\s+sec\s+[\d.]+\s+\w?Bytes'
+                               r'\s+([\d.]+)\s+([KMG]?)bits/sec')
+
+def load_iperf(fname, start=None):
+    """Returns (t, mbps) arrays from iperf/iperf3 text output, one point
+    per report interval at the interval's start.
+
+    Interval times are offsets; they become epoch seconds when the file
+    starts with a '# start <epoch>' line (as bufferbloat.py writes it) or
+    when start is given.  Summary lines (spanning the whole run) are
+    skipped."""
+    scale = {'': 1e-6, 'K': 1e-3, 'M': 1.0, 'G': 1e3}
+    rows = []
+    with open(fname) as f:
+        for line in f:
+            if line.startswith('# start ') and start is None:
+                start = float(line.split()[2])
+                continue
+            m = IPERF_INTERVAL_RE.search(line)
+            if m:
+                rows.append((float(m.group(1)), float(m.group(2)),
+                             float(m.group(3)) * scale[m.group(4)]))
+    data = np.array(rows, dtype=float).reshape(-1, 3)
+    if len(data):
+        length = data[:, 1] - data[:, 0]
+        data = data[length <= 1.5 * np.median(length)]
+    return data[:, 0] + (start or 0), data[:, 2]
+
+def convert_text(src, dst, metric, iface='', units='', freq=10):
+    """Converts an existing text artifact into a tsfile series.
+
+    'ping' expects `ping` or prober.py output (see load_rtt); any other
+    metric expects 'time,value' lines."""
+    if metric == 'ping':
+        t, v = load_rtt(src, freq)
+        units = units or 'ms'
+    else:
+        t, v = load_series(src)
+    if os.path.exists(dst):
+        os.remove(dst)
+    with tsfile.SeriesWriter(dst, metric, iface=iface, units=units) as w:
+        for ti, vi in zip(t.tolist(), v.tolist()):
+            w.append(ti, vi)
+
+def _ewma_blocks(alpha, x, prev):
+    # Closed form of y[k] = alpha*y[k-1] + (1-alpha)*x[k] over blocks short
+    # enough for alpha**-k not to overflow:
+    #   y[k] = alpha**(k+1) * prev + (1-alpha) * alpha**k * cumsum(x * alpha**-j)
+    block = max(1, int(math.log(_EWMA_RANGE) / -math.log(alpha)))
+    out = np.empty_like(x)
+    for i in range(0, len(x), block):
+        chunk = x[i:i + block]
+        k = np.arange(len(chunk))
+        up = alpha ** -k
+        out[i:i + block] = alpha * prev * alpha ** k + \
+            (1 - alpha) * alpha ** k * np.cumsum(chunk * up)
+        prev = out[i + len(chunk) - 1]
+    return out
+
+def ewma(alpha, values, prev=0.0):
+    """y[k] = alpha*y[k-1] + (1-alpha)*values[k], starting from prev.
+
+    Uses scipy.signal.lfilter when scipy is installed, otherwise a
+    blockwise closed form in NumPy.  Returns an array."""
+    x = np.asarray(values, dtype=float)
+    if alpha == 0 or len(x) == 0:
+        return x
+    if alpha == 1:
+        # Holds prev; the closed form would divide by log(alpha) == 0
+        return np.full_like(x, prev)
+    if lfilter is not None:
+        y, _ = lfilter([1 - alpha], [1, -alpha], x, zi=[alpha * prev])
+        return y
+    return _ewma_blocks(alpha, x, prev)
+
+class EwmaFilter(object):
+    """Streaming ewma: feed the trace in chunks, the state carries over."""
+
+    def __init__(self, alpha, prev=0.0):
+        self.alpha = alpha
+        self.prev = prev
+
+    def update(self, values):
+        y = ewma(self.alpha, values, self.prev)
+        if len(y):
+            self.prev = y[-1]
+        return y
+
 def col(n, obj = None, clean = lambda e: e):
     """A versatile column extractor.
 
@@ -59,12 +218,11 @@ def transpose(l):
     return zip(*l)
 
 def avg(lst):
-    return sum(map(float, lst)) / len(lst)
+    return float(np.mean(np.asarray(lst, dtype=float)))
 
 def stdev(lst):
-    mean = avg(lst)
-    var = avg(list(map(lambda e: (e - mean)**2, lst)))
-    return math.sqrt(var)
+    """Population standard deviation."""
+    return float(np.std(np.asarray(lst, dtype=float)))
 
 def xaxis(values, limit):
     l = len(values)
@@ -76,16 +234,10 @@ def grouper(n, iterable, fillvalue=None):
     return itertools.izip_longest(fillvalue=fillvalue, *args)
 
 def cdf(values):
-    values.sort()
-    prob = 0
-    l = len(values)
-    x, y = [], []
-
-    for v in values:
-        prob += 1.0 / l
-        x.append(v)
-        y.append(prob)
-
+    """Returns (sorted values, cumulative probability) arrays; the input
+    is left untouched."""
+    x = np.sort(np.asarray(values, dtype=float))
+    y = np.arange(1, len(x) + 1) / float(len(x))
     return (x, y)
 
 def parse_cpu_usage(fname, nprocessors=8):
@@ -111,14 +263,139 @@ def parse_cpu_usage(fname, nprocessors=8):
         ret.append(total[0:3] + total[4:])
     return ret
 
+def percentiles(lst, qs):
+    """Several percentiles (0-100) in one np.partition pass.  Picks the
+    element at index int(q/100 * len), like pc95/pc99 always did."""
+    a = np.asarray(lst, dtype=float)
+    k = np.minimum((np.asarray(qs, dtype=float) / 100.0 * len(a)).astype(int), len(a) - 1)
+    return np.partition(a, np.unique(k))[k]
+
 def pc95(lst):
-    l = len(lst)
-    return sorted(lst)[ int(0.95 * l) ]
+    return percentiles(lst, [95])[0]
 
 def pc99(lst):
-    l = len(lst)
-    return sorted(lst)[ int(0.99 * l) ]
+    return percentiles(lst, [99])[0]
 
 def coeff_variation(lst):
     return stdev(lst) / avg(lst)
 
+class RunningStats(object):
+    """Count, mean, stdev, min and max of a trace fed in chunks.
+
+    Each chunk is reduced with NumPy and merged with the running state
+    (Chan et al. parallel variant of Welford's update), so the whole
+    trace is never held in memory.  Two instances merge with merge()."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def _combine(self, n, mean, m2, lo, hi):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    def update(self, values):
+        a = np.asarray(values, dtype=float).ravel()
+        if len(a):
+            mean = a.mean()
+            self._combine(len(a), mean, float(((a - mean) ** 2).sum()), a.min(), a.max())
+        return self
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def stdev(self):
+        return math.sqrt(self.m2 / self.n) if self.n else float('nan')
+
+    def coeff_variation(self):
+        return self.stdev() / self.mean
+
+def iter_series(fname, column=None, chunk=1 << 20):
+    """Yields (t, values) chunks of a series; tsfile series are read
+    through np.memmap, so only one chunk is resident at a time."""
+    if tsfile.is_series_file(fname):
+        header, rec = read_series(fname)
+        column = column or header['columns'][0]
+        for i in range(0, len(rec), chunk):
+            part = rec[i:i + chunk]
+            yield np.array(part['t']), np.array(part[column])
+    else:
+        yield load_series(fname, column)
+
+
+def minmax_decimate(x, y, buckets):
+    """Keeps the first, last, lowest and highest point of each of
+    `buckets` equal-width x intervals (one per pixel column).  Drawn as
+    a line, the result covers the same pixels as the full series, so
+    spikes survive.  x must be sorted; nan values are dropped."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    good = ~np.isnan(y)
+    x, y = x[good], y[good]
+    if len(x) <= 4 * buckets or x[-1] == x[0]:
+        return x, y
+    b = ((x - x[0]) * (buckets / (x[-1] - x[0]))).astype(int)
+    np.minimum(b, buckets - 1, out=b)
+    change = np.r_[True, b[1:] != b[:-1]]
+    starts = np.flatnonzero(change)
+    ends = np.r_[starts[1:], len(b)] - 1
+    seg = np.cumsum(change) - 1
+    idx = [starts, ends]
+    for reduce_ in (np.minimum, np.maximum):
+        # First point of each bucket equal to the bucket's min (max)
+        hit = np.flatnonzero(y == reduce_.reduceat(y, starts)[seg])
+        idx.append(hit[np.r_[True, seg[hit][1:] != seg[hit][:-1]]])
+    idx = np.unique(np.concatenate(idx))
+    return x[idx], y[idx]
+
+def lttb(x, y, n):
+    """Largest-Triangle-Three-Buckets: n points that keep the shape of
+    the series (each bucket keeps the point spanning the largest
+    triangle with its neighbours).  x must be sorted; nan values are
+    dropped."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    good = ~np.isnan(y)
+    x, y = x[good], y[good]
+    if n >= len(x) or n < 3:
+        return x, y
+    edges = (np.arange(n - 1) * ((len(x) - 2) / float(n - 2))).astype(int) + 1
+    edges[-1] = len(x) - 1
+    idx = np.empty(n, dtype=int)
+    idx[0], idx[-1] = 0, len(x) - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = edges[i + 2] if i + 2 < n - 1 else len(x)
+        # Third vertex: mean of the next bucket (the last point at the end)
+        cx, cy = x[hi:nxt].mean(), y[hi:nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+def decimate(x, y, width, method='minmax'):
+    """Reduces a series to what a plot `width` pixels wide can show:
+    'minmax' (one bucket per pixel, keeps every spike), 'lttb' (2 points
+    per pixel) or 'none'."""
+    if method == 'minmax':
+        return minmax_decimate(x, y, max(int(width), 1))
+    if method == 'lttb':
+        return lttb(x, y, 2 * max(int(width), 1))
+    return np.asarray(x), np.asarray(y)
+
+def plot_width(ax, dpi=None):
+    """Width in pixels of the axes once saved with dpi."""
+    fig = ax.get_figure()
+    return ax.get_position().width * fig.get_figwidth() * (dpi or fig.dpi)
@@ -1,26 +1,417 @@
 from time import sleep, time
 from subprocess import *
+from collections import namedtuple
 import re
+import os
+import signal
+import socket
+import struct
+
+import tsfile
+from sketch import SketchFile
 
 default_dir = '.'
 
-def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir):
-    pat_queued = re.compile(rb'backlog\s[^\s]+\s([\d]+)p')
-    cmd = "tc -s qdisc show dev %s" % (iface)
-    ret = []
-    open(fname, 'w').write('')
-    while 1:
-        p = Popen(cmd, shell=True, stdout=PIPE)
-        output = p.stdout.read()
-        # Not quite right, but will do for now
-        matches = pat_queued.findall(output)
-        if matches and len(matches) > 1:
-            ret.append(matches[1])
-            t = "%f" % time()
-            open(fname, 'a').write('{},{}\n'.format(t, matches[1].decode('utf-8')))
-        sleep(interval_sec)
-    #open('qlen.txt', 'w').write('\n'.join(ret))
-    return
+# Counters exported by a qdisc.  backlog_pkts is what `tc` prints as "Np"
+# in the backlog line (the qdisc qlen); backlog_bytes is the "Nb" part.
+QdiscStats = namedtuple('QdiscStats',
+                        ['kind', 'handle', 'parent', 'backlog_pkts',
+                         'backlog_bytes', 'drops', 'overlimits', 'requeues',
+                         'sent_bytes', 'sent_pkts', 'options', 'xstats'])
+
+# Counters of an AQM qdisc beyond the generic ones: ECN marks, its current
+# queueing delay estimate (CoDel's last sojourn time, PIE's delay, CAKE's
+# average delay) and its target delay, both in ms and nan if not exported
+AqmStats = namedtuple('AqmStats', ['ecn_marks', 'delay_ms', 'target_ms'])
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/gen_stats.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWQDISC = 36
+RTM_GETQDISC = 38
+TCA_KIND = 1
+TCA_OPTIONS = 2
+TCA_STATS = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TCA_STATS_APP = 4
+TC_H_ROOT = 0xFFFFFFFF
+
+NLMSG_HDR = struct.Struct('=IHHII')
+TCMSG = struct.Struct('=BxxxiIII')
+RTATTR = struct.Struct('=HH')
+
+# AQM options and xstats (linux/pkt_sched.h).  TCA_{FQ_CODEL,CODEL,PIE}_TARGET
+# are all attribute 1, in microseconds.
+TCA_AQM_TARGET = 1
+TCA_CAKE_STATS_TIN_STATS = 10
+TCA_CAKE_TIN_STATS_ECN_MARKED_PACKETS = 8
+TCA_CAKE_TIN_STATS_TARGET_US = 13
+TCA_CAKE_TIN_STATS_AVG_DELAY_US = 19
+# tc_fq_codel_xstats: type, maxpacket, drop_overlimit, ecn_mark, ...
+FQ_CODEL_XSTATS = struct.Struct('=4I')
+# tc_codel_xstats: maxpacket, count, lastcount, ldelay, drop_next,
+# drop_overlimit, ecn_mark
+CODEL_XSTATS = struct.Struct('=4Ii2I')
+# tc_pie_xstats: prob, delay, avg_dq_rate, dq_rate_estimating, packets_in,
+# dropped, overlimit, maxq, ecn_mark; kernels before 5.7 had a 32 bit prob
+# and no dq_rate_estimating
+PIE_XSTATS = struct.Struct('=Q8I')
+PIE_XSTATS_OLD = struct.Struct('=8I')
+# tc_red_xstats: early, pdrop, other, marked
+RED_XSTATS = struct.Struct('=4I')
+
+
+def _align(n):
+    return (n + 3) & ~3
+
+
+def _attrs(buf, off, end):
+    """Yields (type, payload offset, payload length) for each rtattr."""
+    while off + RTATTR.size <= end:
+        alen, atype = RTATTR.unpack_from(buf, off)
+        if alen < RTATTR.size:
+            break
+        yield atype & 0x7fff, off + RTATTR.size, alen - RTATTR.size
+        off += _align(alen)
+
+
+def _format_handle(h):
+    if h == TC_H_ROOT:
+        return 'root'
+    return '%x:%x' % (h >> 16, h & 0xffff)
+
+
+def _parse_qdisc(buf, off, end):
+    family, ifindex, handle, parent, info = TCMSG.unpack_from(buf, off)
+    kind = ''
+    q = [0, 0, 0, 0, 0]      # qlen, backlog, drops, requeues, overlimits
+    basic = [0, 0]           # bytes, packets
+    options = xstats = b''
+    for atype, aoff, alen in _attrs(buf, off + TCMSG.size, end):
+        if atype == TCA_KIND:
+            kind = buf[aoff:aoff + alen].split(b'\0', 1)[0].decode()
+        elif atype == TCA_OPTIONS:
+            options = bytes(buf[aoff:aoff + alen])
+        elif atype == TCA_STATS2:
+            for stype, soff, slen in _attrs(buf, aoff, aoff + alen):
+                if stype == TCA_STATS_QUEUE and slen >= 20:
+                    q = list(struct.unpack_from('=5I', buf, soff))
+                elif stype == TCA_STATS_BASIC and slen >= 12:
+                    basic = list(struct.unpack_from('=QI', buf, soff))
+                elif stype == TCA_STATS_APP:
+                    xstats = bytes(buf[soff:soff + slen])
+        elif atype == TCA_STATS and alen >= 36 and not any(q):
+            # Old struct tc_stats, only used if TCA_STATS2 is missing
+            b, p, drops, over, _, _, qlen, backlog = \
+                struct.unpack_from('=QIIIIIII', buf, aoff)
+            q = [qlen, backlog, drops, 0, over]
+            basic = [b, p]
+    stats = QdiscStats(kind=kind, handle=_format_handle(handle),
+                       parent=_format_handle(parent),
+                       backlog_pkts=q[0], backlog_bytes=q[1], drops=q[2],
+                       overlimits=q[4], requeues=q[3],
+                       sent_bytes=basic[0], sent_pkts=basic[1],
+                       options=options, xstats=xstats)
+    return ifindex, stats
+
+
+def _u32_attrs(buf, off, end):
+    return dict((atype, struct.unpack_from('=I', buf, aoff)[0])
+                for atype, aoff, alen in _attrs(buf, off, end) if alen == 4)
+
+
+def _cake_stats(xstats):
+    # Nested attributes: TIN_STATS holds one nest per tin; marks add up
+    # over the tins, delay and target are those of the busiest one
+    marks = 0
+    delay = target = float('nan')
+    for atype, aoff, alen in _attrs(xstats, 0, len(xstats)):
+        if atype != TCA_CAKE_STATS_TIN_STATS:
+            continue
+        for _, toff, tlen in _attrs(xstats, aoff, aoff + alen):
+            tin = _u32_attrs(xstats, toff, toff + tlen)
+            marks += tin.get(TCA_CAKE_TIN_STATS_ECN_MARKED_PACKETS, 0)
+            tin_delay = tin.get(TCA_CAKE_TIN_STATS_AVG_DELAY_US, 0) / 1000.0
+            if not tin_delay <= delay:
+                delay = tin_delay
+                target = tin.get(TCA_CAKE_TIN_STATS_TARGET_US, 0) / 1000.0
+    return AqmStats(marks, delay, target)
+
+
+def aqm_stats(q):
+    """Decodes the AQM specific counters (TCA_STATS_APP) and target
+    (TCA_OPTIONS) of fq_codel, codel, pie, red and cake qdiscs; None for
+    other kinds or if the kernel sent no xstats."""
+    nan = float('nan')
+    raw = q.xstats
+    target = _u32_attrs(q.options, 0, len(q.options)).get(TCA_AQM_TARGET)
+    target = target / 1000.0 if target is not None else nan
+    if q.kind == 'fq_codel' and len(raw) >= FQ_CODEL_XSTATS.size:
+        xtype, _, _, ecn = FQ_CODEL_XSTATS.unpack_from(raw)
+        if xtype == 0:          # TCA_FQ_CODEL_XSTATS_QDISC
+            return AqmStats(ecn, nan, target)
+    elif q.kind == 'codel' and len(raw) >= CODEL_XSTATS.size:
+        _, _, _, ldelay, _, _, ecn = CODEL_XSTATS.unpack_from(raw)
+        return AqmStats(ecn, ldelay / 1000.0, target)
+    elif q.kind == 'pie' and len(raw) >= PIE_XSTATS.size:
+        fields = PIE_XSTATS.unpack_from(raw)
+        return AqmStats(fields[8], fields[1] / 1000.0, target)
+    elif q.kind == 'pie' and len(raw) >= PIE_XSTATS_OLD.size:
+        fields = PIE_XSTATS_OLD.unpack_from(raw)
+        return AqmStats(fields[7], fields[1] / 1000.0, target)
+    elif q.kind == 'red' and len(raw) >= RED_XSTATS.size:
+        return AqmStats(RED_XSTATS.unpack_from(raw)[3], nan, nan)
+    elif q.kind == 'cake' and raw:
+        return _cake_stats(raw)
+    return None
+
+
+class NetlinkQdiscSource(object):
+    """Reads qdisc statistics through a single rtnetlink socket.
+
+    Every call to sample() issues one RTM_GETQDISC dump and returns
+    {iface: [QdiscStats, ...]} in the same order `tc -s qdisc show` lists
+    them, so no process is forked per sample."""
+
+    def __init__(self, ifaces):
+        self.ifaces = list(ifaces)
+        self.index = dict((socket.if_nametoindex(i), i) for i in self.ifaces)
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                  socket.NETLINK_ROUTE)
+        self.sock.bind((0, 0))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.seq = 0
+        self.buf = bytearray(1 << 16)
+
+    def sample(self):
+        self.seq += 1
+        body = TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        hdr = NLMSG_HDR.pack(NLMSG_HDR.size + len(body), RTM_GETQDISC,
+                             NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0)
+        self.sock.send(hdr + body)
+        ret = dict((i, []) for i in self.ifaces)
+        view = memoryview(self.buf)
+        while True:
+            n = self.sock.recv_into(view)
+            off = 0
+            while off + NLMSG_HDR.size <= n:
+                mlen, mtype, flags, seq, pid = NLMSG_HDR.unpack_from(self.buf, off)
+                if mlen < NLMSG_HDR.size:
+                    break
+                if seq == self.seq:
+                    if mtype == NLMSG_DONE:
+                        return ret
+                    if mtype == NLMSG_ERROR:
+                        err = struct.unpack_from('=i', self.buf, off + NLMSG_HDR.size)[0]
+                        raise OSError(-err, os.strerror(-err))
+                    if mtype == RTM_NEWQDISC:
+                        ifindex, stats = _parse_qdisc(self.buf, off + NLMSG_HDR.size,
+                                                      off + mlen)
+                        if ifindex in self.index:
+                            ret[self.index[ifindex]].append(stats)
+                off += _align(mlen)
+
+    def close(self):
+        self.sock.close()
+
+
+_pat_qdisc = re.compile(r'^qdisc (\S+) (\S+)(?: dev (\S+))? (root|parent \S+)')
+_pat_sent = re.compile(r'Sent (\d+) bytes (\d+) pkt \(dropped (\d+), '
+                       r'overlimits (\d+) requeues (\d+)\)')
+_pat_backlog = re.compile(r'backlog (\d+)([KMG]?)b (\d+)p')
+# tc prints sizes in binary multiples (sprint_size in iproute2)
+_size_units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_tc_dump(text, dev=None):
+    """Parses `tc -s qdisc show` output into {iface: [QdiscStats, ...]}.
+
+    Dumps taken with `show dev X` do not name the device on each line;
+    pass dev='X' for those."""
+    ret = {}
+    cur = None
+    for line in text.splitlines():
+        m = _pat_qdisc.match(line)
+        if m:
+            kind, handle, iface, parent = m.groups()
+            iface = iface or dev
+            parent = parent.split()[-1]
+            cur = dict(kind=kind, handle=handle.rstrip(':') + ':0',
+                       parent=parent, backlog_pkts=0, backlog_bytes=0,
+                       drops=0, overlimits=0, requeues=0,
+                       sent_bytes=0, sent_pkts=0, options=b'', xstats=b'')
+            ret.setdefault(iface, []).append(cur)
+            continue
+        if cur is None:
+            continue
+        m = _pat_sent.search(line)
+        if m:
+            cur.update(sent_bytes=int(m.group(1)), sent_pkts=int(m.group(2)),
+                       drops=int(m.group(3)), overlimits=int(m.group(4)),
+                       requeues=int(m.group(5)))
+        m = _pat_backlog.search(line)
+        if m:
+            cur.update(backlog_bytes=int(m.group(1)) * _size_units[m.group(2)],
+                       backlog_pkts=int(m.group(3)))
+    return dict((i, [QdiscStats(**q) for q in qs]) for i, qs in ret.items())
+
+
+class TcDumpQdiscSource(object):
+    """Fallback source that parses a recorded `tc -s qdisc show` dump.
+
+    Useful to exercise the monitor without root or without the interfaces
+    existing; the file is re-read on every sample so it can be replaced
+    between ticks."""
+
+    def __init__(self, ifaces, dump_file):
+        self.ifaces = list(ifaces)
+        self.dump_file = dump_file
+
+    def sample(self):
+        text = open(self.dump_file).read()
+        dev = self.ifaces[0] if len(self.ifaces) == 1 else None
+        stats = parse_tc_dump(text, dev=dev)
+        return dict((i, stats.get(i, [])) for i in self.ifaces)
+
+    def close(self):
+        pass
+
+
+def open_qdisc_source(ifaces, dump_file=None):
+    if dump_file:
+        return TcDumpQdiscSource(ifaces, dump_file)
+    return NetlinkQdiscSource(ifaces)
+
+
+def bottleneck_qdisc(qdiscs):
+    """Picks the qdisc holding the queue, i.e. the second one `tc` lists
+    (netem/tbf below the htb root that TCLink installs)."""
+    if len(qdiscs) > 1:
+        return qdiscs[1]
+    return None
+
+
+def aqm_qdisc(qdiscs):
+    """The qdisc aqm.py hangs below the bottleneck one, or None."""
+    q = bottleneck_qdisc(qdiscs)
+    if q is None:
+        return None
+    major = q.handle.split(':')[0] + ':'
+    for child in qdiscs:
+        if child.parent.startswith(major) and child.parent != q.handle:
+            return child
+    return None
+
+
+def _exit_on_sigterm():
+    # Process.terminate() sends SIGTERM; turn it into SystemExit so that the
+    # buffered output is flushed by the finally blocks below
+    def handler(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def _ticks(interval_sec):
+    # Deadline based so that time spent sampling does not stretch the period
+    next_t = time()
+    while True:
+        yield next_t
+        next_t += interval_sec
+        delay = next_t - time()
+        if delay > 0:
+            sleep(delay)
+        else:
+            next_t = time()
+
+
+AQM_COLUMNS = ('backlog_pkts', 'drops', 'ecn_marks', 'delay_ms', 'target_ms')
+
+
+def _aqm_writer(fname, iface, kind):
+    if fname.endswith(tsfile.SUFFIX):
+        if os.path.exists(fname):
+            os.remove(fname)
+        f = tsfile.SeriesWriter(fname, 'aqm', iface=iface, units='packets',
+                                columns=AQM_COLUMNS, kind=kind)
+        return f, f.append
+    f = open(fname, 'w', buffering=1 << 16)
+    f.write('# time,kind,%s\n' % ','.join(AQM_COLUMNS))
+    return f, lambda t, *v: f.write('%f,%s,%d,%d,%d,%f,%f\n' % ((t, kind) + v))
+
+
+def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir,
+                 dump_file=None, sketch_file=None, aqm_file=None):
+    """Samples the bottleneck queue length (packets) of iface.
+
+    Writes 'time,qlen' lines, or a binary tsfile series if fname ends
+    with tsfile.SUFFIX.  With sketch_file, the samples also go into a
+    quantile sketch (see sketch.py) saved there.  With aqm_file, the
+    counters of the AQM below the bottleneck qdisc (aqm.py) are written
+    there too: backlog, drops, ECN marks, delay and target (AQM_COLUMNS)."""
+    _exit_on_sigterm()
+    source = open_qdisc_source([iface], dump_file)
+    if fname.endswith(tsfile.SUFFIX):
+        if os.path.exists(fname):
+            os.remove(fname)
+        f = tsfile.SeriesWriter(fname, 'qlen', iface=iface, units='packets')
+        write = f.append
+    else:
+        f = open(fname, 'w', buffering=1 << 16)
+        write = lambda t, qlen: f.write('%f,%d\n' % (t, qlen))
+    sketch = SketchFile(sketch_file) if sketch_file else None
+    aqm_f = None
+    try:
+        for _ in _ticks(interval_sec):
+            qdiscs = source.sample()[iface]
+            q = bottleneck_qdisc(qdiscs)
+            if q is None:
+                continue
+            t = time()
+            # netem stops counting a packet once it hands it to its child,
+            # so with an AQM the queue is the sum of both
+            aqm = aqm_qdisc(qdiscs)
+            qlen = q.backlog_pkts + (aqm.backlog_pkts if aqm else 0)
+            write(t, qlen)
+            if sketch:
+                sketch.add(qlen)
+            if aqm_file and aqm:
+                stats = aqm_stats(aqm) or AqmStats(0, float('nan'), float('nan'))
+                if aqm_f is None:
+                    aqm_f, write_aqm = _aqm_writer(aqm_file, iface, aqm.kind)
+                write_aqm(t, aqm.backlog_pkts, aqm.drops, *stats)
+    finally:
+        f.close()
+        if aqm_f:
+            aqm_f.close()
+        source.close()
+        if sketch:
+            sketch.close()
+
+def monitor_qdiscs(ifaces, interval_sec=0.01, fname='%s/qdisc.txt' % default_dir,
+                   dump_file=None):
+    """Samples every qdisc on several interfaces per tick.
+
+    Writes one line per (interface, qdisc):
+    time,iface,kind,handle,backlog_pkts,backlog_bytes,drops,overlimits,requeues"""
+    _exit_on_sigterm()
+    source = open_qdisc_source(ifaces, dump_file)
+    f = open(fname, 'w', buffering=1 << 16)
+    try:
+        for _ in _ticks(interval_sec):
+            sample = source.sample()
+            t = time()
+            for iface, qdiscs in sample.items():
+                for q in qdiscs:
+                    f.write('%f,%s,%s,%s,%d,%d,%d,%d,%d\n' % (
+                        t, iface, q.kind, q.handle, q.backlog_pkts,
+                        q.backlog_bytes, q.drops, q.overlimits, q.requeues))
+    finally:
+        f.close()
+        source.close()
 
 def monitor_devs_ng(fname="%s/txrate.txt" % default_dir, interval_sec=0.01):
     """Uses bwm-ng tool to collect iface tx rate stats.  Very reliable."""
@@ -0,0 +1,212 @@
+'''
+Renders many queue and RTT plots in one go.
+
+plot_queue.py and plot_ping.py pay the matplotlib import, the
+plot_defaults setup and a new figure for every PNG.  Here matplotlib is
+imported once, before the worker processes are forked, and each worker
+keeps one figure per chart type: a job only removes the previous lines,
+draws its own and saves.  Jobs are spread over a process pool.  A plot whose inputs, parameters
+and drawing code are unchanged since the last run is copied from the
+cache (cache.py) instead of being drawn, and text inputs are parsed
+once; --no-cache turns this off.
+
+Jobs come from a JSON manifest, a list of
+
+    {"type": "queue", "files": ["bb-q20/q.txt"], "out": "reno-buffer-q20.png"}
+
+(optional keys: "legend", "every", "freq", "dpi", "decimate"), from --job options,
+or from a sweep directory (sweep.py), which gets queue.png and rtt.png
+in every trial directory:
+
+    python3 plot_batch.py --job queue:bb-q20/q.txt:reno-buffer-q20.png \\
+                          --job rtt:bb-q20/ping.csv:reno-rtt-q20.png
+    python3 plot_batch.py --sweep sweep-1 --jobs 8
+'''
+
+from helper import *
+import plot_defaults
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+from multiprocessing import Pool
+from cache import ResultCache, DEFAULT_DIR
+import helper
+import json
+from time import time
+
+FIGSIZE = (16, 6)
+
+# Input files of each chart type in an experiment directory, by preference
+SOURCES = {'queue': ('q.bin', 'q.txt'), 'rtt': ('ping.bin', 'ping.csv', 'ping.txt')}
+OUTPUTS = {'queue': 'queue.png', 'rtt': 'rtt.png'}
+
+# One figure per chart type and process, reused by every job
+_figures = {}
+# Set by main() before the workers are forked
+_cache = None
+
+
+def queue_style(i):
+    # Same styles as plot_queue.py
+    if i == 0:
+        return {'color': 'red'}
+    else:
+        return {'color': 'black', 'ls': '-.'}
+
+
+def new_figure(kind):
+    fig = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.grid(True)
+    ax.xaxis.set_major_locator(MaxNLocator(4))
+    if kind == 'queue':
+        ax.set_ylabel("Packets")
+        ax.set_xlabel("Seconds")
+    else:
+        ax.set_ylabel("RTT (ms)")
+    return fig, ax
+
+
+def get_figure(kind):
+    if kind not in _figures:
+        _figures[kind] = new_figure(kind)
+    fig, ax = _figures[kind]
+    # Drop the artists of the previous job; labels, grid and locators stay
+    for line in list(ax.lines):
+        line.remove()
+    if ax.get_legend() is not None:
+        ax.get_legend().remove()
+    ax.set_prop_cycle(None)
+    return fig, ax
+
+
+def job_key(cache, job):
+    """Cache key of a job: its input contents, its parameters and the
+    code that parses and draws them."""
+    params = sorted((k, v) for k, v in job.items() if k not in ('files', 'out'))
+    return cache.key('plot_batch', [cache.file_digest(f) for f in job['files']], params,
+                     cache.source_digest(__file__, helper.__file__, plot_defaults.__file__))
+
+
+def render(job):
+    """Draws one job and returns (out, seconds, cached)."""
+    start = time()
+    kind = job['type']
+    if kind not in SOURCES:
+        raise ValueError('unknown chart type %r' % kind)
+    key = None
+    if _cache is not None:
+        key = job_key(_cache, job)
+        if _cache.fetch_file(key, job['out']):
+            return job['out'], time() - start, True
+    fig, ax = get_figure(kind)
+    every = job.get('every', 1)
+    legend = job.get('legend')
+    width = plot_width(ax, job.get('dpi'))
+    for i, f in enumerate(job['files']):
+        if kind == 'queue':
+            xaxis, values = cached_load(_cache, load_series, f)
+            style = queue_style(i)
+        else:
+            xaxis, values = cached_load(_cache, load_rtt, f, job.get('freq', 10))
+            style = {}
+        if len(xaxis):
+            xaxis = xaxis - xaxis[0]
+        xaxis, values = decimate(xaxis[::every], values[::every], width,
+                                 job.get('decimate', 'minmax'))
+        label = legend[i] if legend else f
+        ax.plot(xaxis, values, label=label, lw=2, **style)
+    if legend:
+        ax.legend()
+    ax.relim()
+    ax.autoscale_view()
+    fig.savefig(job['out'], dpi=job.get('dpi'))
+    if key is not None:
+        _cache.store_file(key, job['out'])
+    return job['out'], time() - start, False
+
+
+def parse_job(spec):
+    """TYPE:FILE[,FILE...]:OUT"""
+    kind, files, out = spec.split(':')
+    return {'type': kind, 'files': files.split(','), 'out': out}
+
+
+def find_source(outdir, kind):
+    for name in SOURCES[kind]:
+        fname = os.path.join(outdir, name)
+        if os.path.exists(fname):
+            return fname
+    return None
+
+
+def sweep_jobs(sweep_dir):
+    """Queue and RTT plots of every finished trial of a sweep."""
+    with open(os.path.join(sweep_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    jobs = []
+    for trial in manifest['trials']:
+        if trial['status'] != 'done':
+            continue
+        for kind in sorted(SOURCES):
+            fname = find_source(trial['dir'], kind)
+            if fname:
+                jobs.append({'type': kind, 'files': [fname],
+                             'out': os.path.join(trial['dir'], OUTPUTS[kind])})
+    return jobs
+
+
+def render_all(jobs, processes=None):
+    """Renders the jobs over a pool of processes (in this one if 1)."""
+    if processes == 1 or len(jobs) <= 1:
+        return [render(job) for job in jobs]
+    pool = Pool(processes)
+    try:
+        return pool.map(render, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render many queue/RTT plots at once")
+    parser.add_argument('--manifest', '-m', help="JSON list of jobs")
+    parser.add_argument('--job', action='append', default=[], metavar='TYPE:FILES:OUT',
+                        help="One plot: TYPE is queue or rtt, FILES comma separated")
+    parser.add_argument('--sweep', help="Sweep directory: plots every trial")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--cache-dir', default=DEFAULT_DIR,
+                        help="Cache of parsed inputs and rendered plots (see cache.py)")
+    parser.add_argument('--cache-mb', type=float, default=1024,
+                        help="Size limit of the cache (MB); least recently used entries go first")
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help="Parse and draw everything again")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    if args.manifest:
+        with open(args.manifest) as f:
+            jobs.extend(json.load(f))
+    jobs.extend(parse_job(spec) for spec in args.job)
+    if args.sweep:
+        jobs.extend(sweep_jobs(args.sweep))
+    if not jobs:
+        parser.error('no jobs (use --manifest, --job or --sweep)')
+
+    global _cache
+    if not args.no_cache:
+        _cache = ResultCache(args.cache_dir, int(args.cache_mb * 2**20))
+
+    start = time()
+    cached = 0
+    for out, secs, hit in render_all(jobs, args.jobs):
+        print('saved %s (%.2f s%s)' % (out, secs, ', cached' if hit else ''))
+        cached += hit
+    print('%d plots in %.2f s, %d from the cache' % (len(jobs), time() - start, cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,7 @@ parser.add_argument('--files', '-f',
                     nargs='+')
 
 parser.add_argument('--freq',
-                    help="Frequency of pings (per second)",
+                    help="Frequency of pings (per second), for plain ping output",
                     type=int,
                     default=10)
 
@@ -23,34 +23,21 @@ parser.add_argument('--out', '-o',
                     help="Output png file for the plot.",
                     default=None) # Will show the plot
 
-args = parser.parse_args()
+parser.add_argument('--decimate',
+                    help="Reduce each series to what the plot width can show: min/max per pixel (default, keeps spikes), LTTB or none.",
+                    choices=['minmax', 'lttb', 'none'],
+                    default='minmax')
 
-def parse_ping(fname):
-    ret = []
-    lines = open(fname).readlines()
-    num = 0
-    for line in lines:
-        if 'bytes from' not in line:
-            continue
-        try:
-            rtt = line.split(' ')[-2]
-            rtt = rtt.split('=')[1]
-            rtt = float(rtt)
-            ret.append([num, rtt])
-            num += 1
-        except:
-            break
-    return ret
+args = parser.parse_args()
 
 m.rc('figure', figsize=(16, 6))
 fig = figure()
 ax = fig.add_subplot(111)
 for i, f in enumerate(args.files):
-    data = parse_ping(f)
-    xaxis = list(map(float, list(col(0, data))))
-    start_time = xaxis[0]
-    xaxis = list(map(lambda x: (x - start_time) / args.freq, xaxis))
-    qlens = list(map(float, col(1, data)))
+    xaxis, qlens = load_rtt(f, args.freq)
+    if len(xaxis):
+        xaxis = xaxis - xaxis[0]
+    xaxis, qlens = decimate(xaxis, qlens, plot_width(ax), args.decimate)
 
     ax.plot(xaxis, qlens, lw=2)
     ax.xaxis.set_major_locator(MaxNLocator(4))
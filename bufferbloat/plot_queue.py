@@ -3,6 +3,9 @@ Plot queue occupancy over time
 '''
 from helper import *
 import plot_defaults
+from cache import ResultCache, DEFAULT_DIR
+import helper
+import sys
 
 from matplotlib.ticker import MaxNLocator
 from pylab import figure
@@ -10,7 +13,7 @@ from pylab import figure
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--files', '-f',
-                    help="Queue timeseries output to one plot",
+                    help="Queue timeseries output to one plot (q.txt or binary q.bin)",
                     required=True,
                     action="store",
                     nargs='+',
@@ -40,8 +43,34 @@ parser.add_argument('--every',
                     default=1,
                     type=int)
 
+parser.add_argument('--decimate',
+                    help="Reduce each series to what the plot width can show: min/max per pixel (default, keeps spikes), LTTB or none.",
+                    choices=['minmax', 'lttb', 'none'],
+                    default='minmax')
+
+parser.add_argument('--cache-dir',
+                    help="Cache of parsed inputs and rendered plots (see cache.py)",
+                    default=DEFAULT_DIR)
+
+parser.add_argument('--no-cache',
+                    help="Parse and draw again even if nothing changed.",
+                    action="store_true",
+                    default=False)
+
 args = parser.parse_args()
 
+# A PNG with the same inputs, parameters and code comes straight from the cache
+cache = None if args.no_cache else ResultCache(args.cache_dir)
+key = None
+if cache and args.out:
+    params = sorted((k, v) for k, v in vars(args).items()
+                    if k not in ('files', 'out', 'cache_dir', 'no_cache'))
+    key = cache.key('plot_queue', [cache.file_digest(f) for f in args.files], params,
+                    cache.source_digest(__file__, helper.__file__, plot_defaults.__file__))
+    if cache.fetch_file(key, args.out):
+        print('saving to', args.out, '(cached)')
+        sys.exit(0)
+
 if args.legend is None:
     args.legend = []
     for file in args.files:
@@ -58,14 +87,12 @@ m.rc('figure', figsize=(16, 6))
 fig = figure()
 ax = fig.add_subplot(111)
 for i, f in enumerate(args.files):
-    data = read_list(f)
-    xaxis = list(map(float, list(col(0, data))))
-    start_time = xaxis[0]
-    xaxis = list(map(lambda x: x - start_time, xaxis))
-    qlens = list(map(float, col(1, data)))
+    xaxis, qlens = cached_load(cache, load_series, f)
+    xaxis = xaxis - xaxis[0]
 
     xaxis = xaxis[::args.every]
     qlens = qlens[::args.every]
+    xaxis, qlens = decimate(xaxis, qlens, plot_width(ax), args.decimate)
     ax.plot(xaxis, qlens, label=args.legend[i], lw=2, **get_style(i))
     ax.xaxis.set_major_locator(MaxNLocator(4))
 
@@ -76,5 +103,7 @@ plt.xlabel("Seconds")
 if args.out:
     print('saving to', args.out)
     plt.savefig(args.out)
+    if key:
+        cache.store_file(key, args.out)
 else:
     plt.show()
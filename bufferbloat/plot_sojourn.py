@@ -0,0 +1,82 @@
+'''
+Plot per-packet queuing delay across the bottleneck (sojourn.py output):
+the time series on top and its CDF below, one curve per file, e.g. to
+compare a Reno run with a BBR run
+'''
+from helper import *
+import plot_defaults
+from sojourn import read_base_ms
+
+from matplotlib.ticker import MaxNLocator
+from pylab import figure
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--files', '-f',
+                    help="Sojourn time files to plot (sojourn.txt or binary sojourn.bin)",
+                    required=True,
+                    action="store",
+                    nargs='+',
+                    dest="files")
+
+parser.add_argument('--legend', '-l',
+                    help="Legend to use if there are multiple plots.  File names used as default.",
+                    action="store",
+                    nargs="+",
+                    default=None,
+                    dest="legend")
+
+parser.add_argument('--out', '-o',
+                    help="Output png file for the plot.",
+                    default=None, # Will show the plot
+                    dest="out")
+
+parser.add_argument('--base',
+                    help="Delay (ms) subtracted from every sojourn time; defaults to the netem delay stored in each file.",
+                    type=float,
+                    default=None)
+
+parser.add_argument('--decimate',
+                    help="Reduce each series to what the plot width can show: min/max per pixel (default, keeps spikes), LTTB or none.",
+                    choices=['minmax', 'lttb', 'none'],
+                    default='minmax')
+
+args = parser.parse_args()
+
+if args.legend is None:
+    args.legend = list(args.files)
+
+m.rc('figure', figsize=(16, 9))
+fig = figure()
+ax = fig.add_subplot(211)
+ax_cdf = fig.add_subplot(212)
+fig.subplots_adjust(hspace=0.35)
+for i, f in enumerate(args.files):
+    xaxis, sojourn = load_series(f)
+    if not len(xaxis):
+        continue
+    base = args.base if args.base is not None else read_base_ms(f)
+    qdelay = sojourn - base
+    xaxis = xaxis - xaxis[0]
+
+    x, y = decimate(xaxis, qdelay, plot_width(ax), args.decimate)
+    ax.plot(x, y, label=args.legend[i], lw=1)
+    ax.xaxis.set_major_locator(MaxNLocator(4))
+
+    x, y = cdf(qdelay)
+    x, y = decimate(x, y, plot_width(ax_cdf), args.decimate)
+    ax_cdf.plot(x, y, label=args.legend[i], lw=2)
+
+ax.set_ylabel("Queuing delay (ms)")
+ax.set_xlabel("Seconds")
+ax.grid(True)
+ax.legend(loc='upper right')
+ax_cdf.set_xlabel("Queuing delay (ms)")
+ax_cdf.set_ylabel("Fraction of packets")
+ax_cdf.grid(True)
+
+if args.out:
+    print('saving to', args.out)
+    plt.savefig(args.out)
+else:
+    plt.show()
@@ -0,0 +1,345 @@
+'''
+RTT prober with kernel timestamps, replacing `ping -i 0.1 > ping.txt`.
+
+Sends ICMP echo requests (or UDP probes to a `prober.py --echo` peer)
+from a single process and takes the send and receive times from the
+kernel with SO_TIMESTAMPING: the transmit timestamp comes back on the
+socket error queue, the receive timestamp with the reply.  Both are
+CLOCK_REALTIME, the clock monitor.py stamps q.txt with, so the two
+series can be joined on time.  There is no fork per probe, and the
+interval can go well below 10 ms.
+
+Output, one record per probe in send order:
+
+    epoch,seq,rtt_ms,lost
+
+epoch is the send time, rtt_ms is empty (nan in binary files) and lost
+is 1 for probes without a reply within --timeout.  With an --out
+ending in .bin the records go to a tsfile series (columns seq, rtt_ms,
+lost) instead.
+
+    python3 prober.py 10.0.0.2 --interval 0.01 --out ping.csv
+    python3 prober.py --echo 7000                   # on the peer
+    python3 prober.py 10.0.0.2 --udp 7000 --out ping.csv
+'''
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from time import time
+import errno
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+
+import tsfile
+from sketch import SketchFile
+
+# linux/net_tstamp.h, linux/errqueue.h, linux/in.h
+SO_TIMESTAMPING = getattr(socket, 'SO_TIMESTAMPING', 37)
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+SOF_TIMESTAMPING_TX_SOFTWARE = 1 << 1
+SOF_TIMESTAMPING_RX_SOFTWARE = 1 << 3
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_OPT_ID = 1 << 7
+SOF_TIMESTAMPING_OPT_TSONLY = 1 << 11
+TIMESTAMPING_FLAGS = (SOF_TIMESTAMPING_TX_SOFTWARE | SOF_TIMESTAMPING_RX_SOFTWARE |
+                      SOF_TIMESTAMPING_SOFTWARE | SOF_TIMESTAMPING_OPT_ID |
+                      SOF_TIMESTAMPING_OPT_TSONLY)
+IP_RECVERR = 11
+SO_EE_ORIGIN_TIMESTAMPING = 4
+MSG_ERRQUEUE = 0x2000
+
+SCM_TIMESTAMPING_DATA = struct.Struct('=6q')    # 3 x struct timespec
+SOCK_EXTENDED_ERR = struct.Struct('=IBBBBII')
+ICMP_HEADER = struct.Struct('!BBHHH')
+UDP_PROBE = struct.Struct('!IQ')
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+UDP_MAGIC = 0x50524f42                          # 'PROB'
+CMSG_SPACE = 256
+
+
+def checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    s = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    s = (s >> 16) + (s & 0xffff)
+    s += s >> 16
+    return ~s & 0xffff
+
+
+def _timespec(cmsg_data):
+    # Software timestamps are in the first of the three timespecs
+    sec, nsec = SCM_TIMESTAMPING_DATA.unpack_from(cmsg_data)[:2]
+    return sec + nsec * 1e-9
+
+
+class IcmpTransport(object):
+    """ICMP echo over a ping socket, or a raw socket if those are not
+    allowed (net.ipv4.ping_group_range)."""
+
+    def __init__(self, dst, size=56):
+        self.dst = dst
+        self.payload = b'\0' * max(size - 8, 0)
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.raw = False
+        except (PermissionError, OSError):
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        # Ping sockets get the identifier from the kernel (the local "port")
+        self.ident = os.getpid() & 0xffff
+
+    def send(self, n):
+        seq = n & 0xffff
+        header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        csum = checksum(header + self.payload)
+        packet = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, csum, self.ident, seq) + self.payload
+        self.sock.sendto(packet, (self.dst, 0))
+
+    def parse(self, data):
+        """Sequence number (16 bits) of a reply to us, or None."""
+        if self.raw:
+            data = data[(data[0] & 0x0f) * 4:]
+        if len(data) < ICMP_HEADER.size:
+            return None
+        kind, code, _, ident, seq = ICMP_HEADER.unpack_from(data)
+        if kind != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+            return None
+        return seq
+
+    seq_mask = 0xffff
+
+
+class UdpTransport(object):
+    """UDP probes to a `prober.py --echo` peer."""
+
+    def __init__(self, dst, port, size=56):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((dst, port))
+        self.padding = b'\0' * max(size - UDP_PROBE.size, 0)
+
+    def send(self, n):
+        self.sock.send(UDP_PROBE.pack(UDP_MAGIC, n) + self.padding)
+
+    def parse(self, data):
+        if len(data) < UDP_PROBE.size:
+            return None
+        magic, n = UDP_PROBE.unpack_from(data)
+        return n if magic == UDP_MAGIC else None
+
+    seq_mask = (1 << 64) - 1
+
+
+class Prober(object):
+    """Sends a probe every `interval` seconds and writes one record per
+    probe once it is answered or has timed out."""
+
+    def __init__(self, transport, write, interval=0.1, timeout=1.0):
+        self.transport = transport
+        self.sock = transport.sock
+        self.write = write
+        self.interval = interval
+        self.timeout = timeout
+        self.sent = 0
+        self.tskey = 0                  # next OPT_ID the kernel will assign
+        self.tskeys = {}                # OPT_ID counter -> probe number
+        self.outstanding = OrderedDict()  # probe number -> [send ts, recv ts]
+        self.by_seq = {}                # seq as on the wire -> probe number
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, TIMESTAMPING_FLAGS)
+            self.kernel_ts = True
+        except OSError:
+            print("prober: SO_TIMESTAMPING not available, using user space timestamps",
+                  file=sys.stderr)
+            self.kernel_ts = False
+        self.sock.setblocking(False)
+
+    def send(self):
+        n = self.sent
+        now = time()
+        try:
+            self.transport.send(n)
+        except OSError as e:
+            if e.errno not in (errno.ENOBUFS, errno.EAGAIN, errno.EHOSTUNREACH,
+                               errno.ENETUNREACH, errno.ECONNREFUSED):
+                raise
+            # Not sent: reported as lost once it times out
+            self.outstanding[n] = [now, None]
+            self.sent += 1
+            return
+        if self.kernel_ts:
+            self.tskeys[self.tskey] = n
+            self.tskey += 1
+        self.outstanding[n] = [now, None]
+        self.by_seq[n & self.transport.seq_mask] = n
+        self.sent += 1
+
+    def read_errqueue(self):
+        while True:
+            try:
+                _, ancdata, _, _ = self.sock.recvmsg(1, CMSG_SPACE, MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                return
+            ts, key = None, None
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPING:
+                    ts = _timespec(data)
+                elif level == socket.SOL_IP and kind == IP_RECVERR:
+                    err = SOCK_EXTENDED_ERR.unpack_from(data)
+                    if err[1] == SO_EE_ORIGIN_TIMESTAMPING:
+                        key = err[6]
+            n = self.tskeys.pop(key, None)
+            if ts and n in self.outstanding:
+                self.outstanding[n][0] = ts
+
+    def read_replies(self):
+        while True:
+            try:
+                data, ancdata, _, _ = self.sock.recvmsg(2048, CMSG_SPACE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionRefusedError:
+                continue
+            now = None
+            for level, kind, cdata in ancdata:
+                if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPING:
+                    now = _timespec(cdata)
+            seq = self.transport.parse(data)
+            n = self.by_seq.get(seq)
+            if n in self.outstanding and self.outstanding[n][1] is None:
+                self.outstanding[n][1] = now or time()
+
+    def flush(self, now, final=False):
+        # Records leave in send order, so a late probe holds back the ones
+        # behind it until it is answered or times out
+        while self.outstanding:
+            n, (sent, received) = next(iter(self.outstanding.items()))
+            if received is None and not final and now - sent < self.timeout:
+                return
+            del self.outstanding[n]
+            self.by_seq.pop(n & self.transport.seq_mask, None)
+            if received is None:
+                self.write(sent, n, None, 1)
+            else:
+                self.write(sent, n, (received - sent) * 1000, 0)
+
+    def run(self, duration=None):
+        poller = select.poll()
+        poller.register(self.sock, select.POLLIN | select.POLLERR)
+        start = time()
+        next_send = start
+        try:
+            while duration is None or time() - start < duration:
+                now = time()
+                if now >= next_send:
+                    self.send()
+                    next_send += self.interval
+                    if next_send < now:
+                        next_send = now + self.interval
+                wait = max(next_send - time(), 0)
+                for fd, events in poller.poll(wait * 1000):
+                    if events & select.POLLERR:
+                        self.read_errqueue()
+                    if events & select.POLLIN:
+                        self.read_replies()
+                self.flush(time())
+            # Last probes get their timeout to come back
+            end = time() + self.timeout
+            while self.outstanding and time() < end:
+                for fd, events in poller.poll(max(end - time(), 0) * 1000):
+                    if events & select.POLLERR:
+                        self.read_errqueue()
+                    if events & select.POLLIN:
+                        self.read_replies()
+                self.flush(time())
+        finally:
+            self.flush(time(), final=True)
+
+
+def echo_server(port):
+    """Reflects UDP probes back to their sender."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('', port))
+    while True:
+        data, addr = sock.recvfrom(2048)
+        sock.sendto(data, addr)
+
+
+def open_output(fname, dst=''):
+    """Returns (write, close) for a CSV file or a tsfile series (.bin)."""
+    if fname.endswith(tsfile.SUFFIX):
+        if os.path.exists(fname):
+            os.remove(fname)
+        w = tsfile.SeriesWriter(fname, 'rtt', iface=dst, units='ms',
+                                columns=('seq', 'rtt_ms', 'lost'))
+        write = lambda t, n, rtt, lost: w.append(
+            t, n, float('nan') if rtt is None else rtt, lost)
+        return write, w.close
+    f = open(fname, 'w', buffering=1 << 16)
+    f.write('epoch,seq,rtt_ms,lost\n')
+    write = lambda t, n, rtt, lost: f.write(
+        '%.6f,%d,%s,%d\n' % (t, n, '' if rtt is None else '%.3f' % rtt, lost))
+    return write, f.close
+
+
+def _exit_on_sigterm():
+    # Popen.kill()/terminate() from bufferbloat.py: flush what was measured
+    def handler(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="RTT prober with kernel timestamps")
+    parser.add_argument('dst', nargs='?', help="Address to probe")
+    parser.add_argument('--udp', type=int, metavar='PORT',
+                        help="Send UDP probes to a prober.py --echo peer on PORT "
+                             "instead of ICMP echo requests")
+    parser.add_argument('--echo', type=int, metavar='PORT',
+                        help="Run as the UDP echo peer on PORT")
+    parser.add_argument('--interval', '-i', type=float, default=0.1,
+                        help="Seconds between probes")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="Seconds before a probe counts as lost")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Stop after this many seconds (default: until killed)")
+    parser.add_argument('--size', type=int, default=56,
+                        help="Probe payload size (bytes)")
+    parser.add_argument('--out', '-o', default='ping.csv',
+                        help="Output file (.csv, or .bin for a tsfile series)")
+    parser.add_argument('--sketch', default=None,
+                        help="Also keep a quantile sketch of the RTTs in this file")
+    args = parser.parse_args(argv)
+
+    if args.echo:
+        return echo_server(args.echo)
+    if not args.dst:
+        parser.error('dst is required unless --echo is given')
+    if args.udp:
+        transport = UdpTransport(args.dst, args.udp, args.size)
+    else:
+        transport = IcmpTransport(args.dst, args.size)
+    _exit_on_sigterm()
+    write, close = open_output(args.out, args.dst)
+    sketch = SketchFile(args.sketch) if args.sketch else None
+    if sketch:
+        write_record = write
+
+        def write(t, n, rtt, lost):
+            write_record(t, n, rtt, lost)
+            if rtt is not None:
+                sketch.add(rtt)
+    try:
+        Prober(transport, write, args.interval, args.timeout).run(args.duration)
+    finally:
+        close()
+        if sketch:
+            sketch.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Readiness probes for the servers bufferbloat.py starts in the Mininet
+hosts, used instead of fixed sleeps.
+
+A server is ready once its socket is listening, which the kernel shows
+in /proc/net/tcp (and tcp6) as state 0A.  The files are read with
+host.cmd(), so they describe the host's own network namespace.  Polls
+back off exponentially, and give up with TimeoutError (or at once if the
+server process has already exited).
+
+competicao/readiness.py loads this module for tcp_simulation.py.
+'''
+
+from time import monotonic, sleep
+
+TCP_STATES = {'01': 'ESTABLISHED', '02': 'SYN_SENT', '03': 'SYN_RECV',
+              '04': 'FIN_WAIT1', '05': 'FIN_WAIT2', '06': 'TIME_WAIT',
+              '07': 'CLOSE', '08': 'CLOSE_WAIT', '09': 'LAST_ACK',
+              '0A': 'LISTEN', '0B': 'CLOSING'}
+PROC_NET_TCP = 'cat /proc/net/tcp /proc/net/tcp6 2>/dev/null'
+TIMEOUT_MESSAGE = '%(what)s not ready after %(timeout).1f s'
+
+
+def tcp_sockets(text):
+    """(local port, remote port, state) of every socket in /proc/net/tcp{,6}
+    contents."""
+    sockets = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 4 or fields[3] not in TCP_STATES or ':' not in fields[1]:
+            continue
+        local = int(fields[1].rsplit(':', 1)[1], 16)
+        remote = int(fields[2].rsplit(':', 1)[1], 16)
+        sockets.append((local, remote, TCP_STATES[fields[3]]))
+    return sockets
+
+
+def listening_ports(text):
+    """Local ports in LISTEN state in /proc/net/tcp{,6} contents."""
+    return set(local for local, _, state in tcp_sockets(text) if state == 'LISTEN')
+
+
+def wait_until(check, timeout=10.0, what='condition', first=0.005, max_delay=0.5):
+    """Polls check() with exponential backoff until it returns true."""
+    deadline = monotonic() + timeout
+    delay = first
+    while not check():
+        left = deadline - monotonic()
+        if left <= 0:
+            raise TimeoutError(TIMEOUT_MESSAGE % {'what': what, 'timeout': timeout})
+        sleep(min(delay, left))
+        delay = min(delay * 2, max_delay)
+
+
+def wait_listening(host, ports, timeout=10.0, proc=None, what=None):
+    """Waits until something listens on every TCP port in ports (or on
+    the single port ports) inside host, one read per poll."""
+    ports = set([ports] if isinstance(ports, int) else ports)
+    names = '%s %s' % ('port' if len(ports) == 1 else 'ports',
+                       ', '.join(map(str, sorted(ports))))
+
+    def ready():
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError('server for %s in %s exited with status %d' % (
+                names, host.name, proc.returncode))
+        return ports <= listening_ports(host.cmd(PROC_NET_TCP))
+    wait_until(ready, timeout, what or '%s in %s' % (names, host.name))
@@ -9,6 +9,7 @@ delay=10
 
 iperf_port=5001
 
+jobs=""
 for qsize in 20 100; do
     dir=bb-q$qsize
 
@@ -21,7 +22,10 @@ for qsize in 20 100; do
         --dir $dir \
         --cong reno
 
-    # Gera os gráficos a partir dos arquivos de saída
-    python3 plot_queue.py -f $dir/q.txt -o reno-buffer-q$qsize.png
-    python3 plot_ping.py -f $dir/ping.txt -o reno-rtt-q$qsize.png
-done
\ No newline at end of file
+    # Gráficos desta rodada, gerados todos juntos no final
+    jobs="$jobs --job queue:$dir/q.txt:reno-buffer-q$qsize.png"
+    jobs="$jobs --job rtt:$dir/ping.csv:reno-rtt-q$qsize.png"
+done
+
+# Gera todos os gráficos de uma vez a partir dos arquivos de saída
+python3 plot_batch.py $jobs
@@ -0,0 +1,783 @@
+'''
+Discrete-event simulation of the bufferbloat experiment.
+
+Models the BBTopo dumbbell without Mininet or root:
+
+    h1 --(bw_host, delay, maxq)-- s0 --(bw_net, delay, maxq)-- h2
+
+Every interface (h1-eth0, s0-eth2, h2-eth0, s0-eth1) behaves like the
+htb + netem pair TCLink installs: a packet is held for `delay`, then
+serialized at the link rate, and counts against the `maxq` drop-tail
+limit the whole time.  On top of that run the same workloads as
+bufferbloat.py: a long-lived TCP flow h1 -> h2 (iperf), pings every 0.1 s
+and the web page fetches of h2 (see fetcher.py), with pluggable Reno,
+CUBIC and BBR congestion control.
+
+Each link hop costs a single event, so a 90 s run at 1.5 Mb/s takes a
+fraction of a second.  Outputs are the usual q.txt (or q.bin), ping.csv
+and the fetch times, see run_experiment().
+'''
+
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+from time import time
+import math
+import os
+import random
+
+from fetcher import arrival_times
+from prober import open_output
+from sketch import QuantileSketch, SKETCH_FILES
+import tsfile
+
+MSS = 1448          # TCP payload per packet (bytes)
+DATA_SIZE = 1514    # bytes on the wire for a full sized segment
+ACK_SIZE = 66
+PING_SIZE = 98
+SYN_SIZE = 74
+REQUEST_SIZE = 200  # GET request
+HEADER_SIZE = 200   # HTTP response headers
+INIT_CWND = 10
+DUPTHRESH = 3
+MIN_RTO = 0.2
+INIT_RTO = 1.0
+
+
+class Packet(object):
+    __slots__ = ('size', 'path', 'hop', 'handler', 'seq', 'ack', 'sent_time',
+                 'delivered', 'delivered_time', 'first_sent', 'retrans',
+                 'retx_mark', 'lost', 'inflight')
+
+    def __init__(self, size, path, handler, seq=0, ack=0, sent_time=0.0):
+        self.size = size
+        self.path = path
+        self.hop = 0
+        self.handler = handler
+        self.seq = seq
+        self.ack = ack
+        self.sent_time = sent_time
+        self.retrans = False
+        self.lost = False
+        self.inflight = False
+
+
+class Simulator(object):
+    """Event loop over a binary heap of (time, tie breaker, fn, arg)."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.heap = []
+        self.counter = count()
+
+    def at(self, t, fn, arg=None):
+        heappush(self.heap, (t, next(self.counter), fn, arg))
+
+    def run(self, until):
+        heap = self.heap
+        while heap and heap[0][0] <= until:
+            t, _, fn, arg = heappop(heap)
+            self.now = t
+            fn(arg)
+        self.now = until
+
+
+class Link(object):
+    """One direction of a TCLink: netem delay followed by the htb rate,
+    with a drop-tail limit of `limit` packets over both."""
+
+    def __init__(self, sim, name, bw_mbps, delay_sec, limit):
+        self.sim = sim
+        self.name = name
+        self.sec_per_byte = 8.0 / (bw_mbps * 1e6)
+        self.delay = delay_sec
+        self.limit = limit
+        self.departures = deque()
+        self.last = 0.0
+        self.drops = 0
+
+    def qlen(self):
+        q = self.departures
+        now = self.sim.now
+        while q and q[0] <= now:
+            q.popleft()
+        return len(q)
+
+    def send(self, pkt):
+        if self.qlen() >= self.limit:
+            self.drops += 1
+            return
+        dep = self.sim.now + self.delay
+        if self.last > dep:
+            dep = self.last
+        dep += pkt.size * self.sec_per_byte
+        self.last = dep
+        self.departures.append(dep)
+        self.sim.at(dep, self.forward, pkt)
+
+    def forward(self, pkt):
+        pkt.hop += 1
+        if pkt.hop < len(pkt.path):
+            pkt.path[pkt.hop].send(pkt)
+        else:
+            pkt.handler(pkt)
+
+
+def transmit(pkt):
+    pkt.path[0].send(pkt)
+
+
+# Congestion control models.  Windows are in packets, rates in packets/s.
+
+class Reno(object):
+
+    pacing_rate = None
+
+    def __init__(self):
+        self.cwnd = float(INIT_CWND)
+        self.ssthresh = float('inf')
+
+    def on_ack(self, s, now, acked, rtt, rate, pkt):
+        if s.in_recovery:
+            return
+        for _ in range(acked):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1.0 / self.cwnd
+
+    def on_loss(self, s, now):
+        self.ssthresh = self.cwnd = max(self.cwnd / 2, 2.0)
+
+    def on_rto(self, s, now):
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = 1.0
+
+    def on_recovery_exit(self, s, now):
+        pass
+
+
+class Cubic(Reno):
+    """CUBIC (RFC 8312) with the TCP-friendly region and fast convergence."""
+
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self):
+        Reno.__init__(self)
+        self.w_max = 0.0
+        self.k = 0.0
+        self.epoch = None
+        self.origin = 0.0
+
+    def on_ack(self, s, now, acked, rtt, rate, pkt):
+        if s.in_recovery:
+            return
+        if self.cwnd < self.ssthresh:
+            self.cwnd += acked
+            return
+        if self.epoch is None:
+            self.epoch = now
+            if self.cwnd < self.w_max:
+                self.k = ((self.w_max - self.cwnd) / self.C) ** (1.0 / 3)
+                self.origin = self.w_max
+            else:
+                self.k = 0.0
+                self.origin = self.cwnd
+        srtt = s.srtt or 0.1
+        t = now - self.epoch + s.min_rtt
+        target = self.origin + self.C * (t - self.k) ** 3
+        friendly = (self.w_max * self.BETA +
+                    3 * (1 - self.BETA) / (1 + self.BETA) * t / srtt)
+        target = max(target, friendly)
+        if target > self.cwnd:
+            self.cwnd += acked * (target - self.cwnd) / self.cwnd
+        else:
+            self.cwnd += acked * 0.01 / self.cwnd
+
+    def _reduce(self):
+        self.epoch = None
+        if self.cwnd < self.w_max:
+            self.w_max = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = self.cwnd
+        self.ssthresh = max(self.cwnd * self.BETA, 2.0)
+
+    def on_loss(self, s, now):
+        self._reduce()
+        self.cwnd = self.ssthresh
+
+    def on_rto(self, s, now):
+        self._reduce()
+        self.cwnd = 1.0
+
+
+class Bbr(object):
+    """BBR v1: windowed max bandwidth and min RTT filters driving the
+    pacing rate and cwnd through STARTUP, DRAIN, PROBE_BW and PROBE_RTT."""
+
+    HIGH_GAIN = 2 / math.log(2)
+    CYCLE = [1.25, 0.75, 1, 1, 1, 1, 1, 1]
+    BW_ROUNDS = 10
+    RTPROP_SEC = 10.0
+    PROBE_RTT_SEC = 0.2
+    MIN_CWND = 4
+
+    def __init__(self):
+        self.cwnd = float(INIT_CWND)
+        self.mode = 'startup'
+        self.pacing_gain = self.cwnd_gain = self.HIGH_GAIN
+        self.bw_samples = deque()       # (round, bw) with decreasing bw
+        self.rt_prop = None
+        self.rt_stamp = 0.0
+        self.round = 0
+        self.next_round_delivered = 0
+        self.round_start = False
+        self.full_bw = 0.0
+        self.full_bw_count = 0
+        self.filled_pipe = False
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_done = None
+        self.prior_cwnd = 0.0
+        self.pacing_rate = None
+
+    def btl_bw(self):
+        return self.bw_samples[0][1] if self.bw_samples else 0.0
+
+    def bdp(self, gain):
+        if not self.bw_samples or self.rt_prop is None:
+            return float(INIT_CWND)
+        return gain * self.btl_bw() * self.rt_prop
+
+    def _update_bw(self, s, rate, pkt):
+        self.round_start = False
+        if pkt is not None and pkt.delivered >= self.next_round_delivered:
+            self.next_round_delivered = s.delivered
+            self.round += 1
+            self.round_start = True
+        if rate is None:
+            return
+        q = self.bw_samples
+        while q and q[-1][1] <= rate:
+            q.pop()
+        q.append((self.round, rate))
+        while q[0][0] <= self.round - self.BW_ROUNDS:
+            q.popleft()
+
+    def _check_full_pipe(self):
+        if self.filled_pipe or not self.round_start:
+            return
+        if self.btl_bw() >= self.full_bw * 1.25:
+            self.full_bw = self.btl_bw()
+            self.full_bw_count = 0
+            return
+        self.full_bw_count += 1
+        if self.full_bw_count >= 3:
+            self.filled_pipe = True
+
+    def _enter_probe_bw(self, now):
+        self.mode = 'probe_bw'
+        self.pacing_gain = 1.0
+        self.cwnd_gain = 2.0
+        self.cycle_index = 2
+        self.cycle_stamp = now
+
+    def _update_mode(self, s, now, filter_expired):
+        if self.mode == 'startup' and self.filled_pipe:
+            self.mode = 'drain'
+            self.pacing_gain = 1 / self.HIGH_GAIN
+            self.cwnd_gain = self.HIGH_GAIN
+        if self.mode == 'drain' and s.inflight <= self.bdp(1.0):
+            self._enter_probe_bw(now)
+        if self.mode == 'probe_bw':
+            gain = self.CYCLE[self.cycle_index]
+            elapsed = now - self.cycle_stamp > self.rt_prop
+            if ((gain > 1 and elapsed and s.inflight >= self.bdp(gain)) or
+                    (gain < 1 and (elapsed or s.inflight <= self.bdp(1.0))) or
+                    (gain == 1 and elapsed)):
+                self.cycle_index = (self.cycle_index + 1) % len(self.CYCLE)
+                self.cycle_stamp = now
+                self.pacing_gain = self.CYCLE[self.cycle_index]
+        if self.mode != 'probe_rtt' and filter_expired:
+            self.mode = 'probe_rtt'
+            self.pacing_gain = self.cwnd_gain = 1.0
+            self.prior_cwnd = max(self.prior_cwnd, self.cwnd)
+            self.probe_rtt_done = None
+        if self.mode == 'probe_rtt':
+            if self.probe_rtt_done is None and s.inflight <= self.MIN_CWND:
+                self.probe_rtt_done = now + self.PROBE_RTT_SEC
+            elif self.probe_rtt_done is not None and now >= self.probe_rtt_done:
+                self.rt_stamp = now
+                self.cwnd = max(self.cwnd, self.prior_cwnd)
+                if self.filled_pipe:
+                    self._enter_probe_bw(now)
+                else:
+                    self.mode = 'startup'
+                    self.pacing_gain = self.cwnd_gain = self.HIGH_GAIN
+
+    def on_ack(self, s, now, acked, rtt, rate, pkt):
+        self._update_bw(s, rate, pkt)
+        # Like bbr_update_min_rtt: an expired filter takes the current
+        # sample and also sends BBR to PROBE_RTT, so the expiry is decided
+        # before the sample refreshes rt_stamp
+        filter_expired = now - self.rt_stamp > self.RTPROP_SEC
+        if rtt is not None and (self.rt_prop is None or rtt < self.rt_prop or filter_expired):
+            self.rt_prop = rtt
+            self.rt_stamp = now
+        self._check_full_pipe()
+        self._update_mode(s, now, filter_expired)
+
+        if self.bw_samples:
+            self.pacing_rate = self.pacing_gain * self.btl_bw()
+        elif s.srtt:
+            self.pacing_rate = self.HIGH_GAIN * INIT_CWND / s.srtt
+        if self.mode == 'probe_rtt':
+            self.cwnd = min(self.cwnd, self.MIN_CWND)
+            return
+        target = self.bdp(self.cwnd_gain) + 3
+        if self.filled_pipe:
+            self.cwnd = min(self.cwnd + acked, target)
+        elif self.cwnd < target or s.delivered < INIT_CWND:
+            self.cwnd += acked
+        self.cwnd = max(self.cwnd, self.MIN_CWND)
+
+    def on_loss(self, s, now):
+        # Packet conservation for the first round of recovery
+        self.prior_cwnd = self.cwnd
+        self.cwnd = max(s.inflight + 1, self.MIN_CWND)
+
+    def on_rto(self, s, now):
+        self.prior_cwnd = self.cwnd
+        self.cwnd = 1.0
+
+    def on_recovery_exit(self, s, now):
+        self.cwnd = max(self.cwnd, self.prior_cwnd)
+
+
+CONG = {'reno': Reno, 'cubic': Cubic, 'bbr': Bbr}
+
+
+class Sender(object):
+    """TCP sender at packet granularity.
+
+    Losses are detected once DUPTHRESH later packets have been acked
+    (SACK/FACK style), with an RTO as the last resort.  total=None sends
+    forever (iperf)."""
+
+    def __init__(self, sim, cc, path, total=None, init_rtt=None):
+        self.sim = sim
+        self.cc = cc
+        self.path = path
+        self.total = total
+        self.receiver = None
+        self.next_seq = 0
+        self.una = 0
+        self.outstanding = {}           # seq -> Packet, in seq order
+        self.retx = deque()
+        self.inflight = 0
+        self.high_sacked = -1
+        self.in_recovery = False
+        self.recover = 0
+        self.delivered = 0
+        self.delivered_time = 0.0
+        self.first_sent = 0.0
+        self.srtt = init_rtt
+        self.rttvar = init_rtt / 2 if init_rtt else None
+        self.min_rtt = init_rtt or 0.0
+        self.rto = INIT_RTO
+        self.rto_at = None
+        self.timer_armed = False
+        self.next_send = 0.0
+        self.wake_pending = False
+
+    def start(self):
+        self.delivered_time = self.first_sent = self.sim.now
+        self.try_send()
+
+    def try_send(self, arg=None):
+        sim = self.sim
+        now = sim.now
+        cc = self.cc
+        while self.inflight < max(int(cc.cwnd), 1):
+            while self.retx:
+                p = self.outstanding.get(self.retx[0])
+                if p is not None and p.lost:
+                    break
+                self.retx.popleft()
+            if not self.retx and self.total is not None and self.next_seq >= self.total:
+                break
+            if cc.pacing_rate and now < self.next_send:
+                if not self.wake_pending:
+                    self.wake_pending = True
+                    sim.at(self.next_send, self._wake)
+                break
+            if self.retx:
+                seq = self.retx.popleft()
+                pkt = self.outstanding[seq]
+                pkt.retrans = True
+                pkt.retx_mark = self.next_seq
+                pkt.lost = False
+            else:
+                seq = self.next_seq
+                self.next_seq += 1
+                pkt = Packet(DATA_SIZE, self.path, self.receiver.on_data, seq)
+                self.outstanding[seq] = pkt
+            pkt.hop = 0
+            pkt.sent_time = now
+            pkt.delivered = self.delivered
+            pkt.delivered_time = self.delivered_time
+            pkt.first_sent = self.first_sent
+            pkt.inflight = True
+            self.inflight += 1
+            if cc.pacing_rate:
+                self.next_send = max(now, self.next_send) + 1.0 / cc.pacing_rate
+            transmit(pkt)
+        if self.outstanding and not self.timer_armed:
+            self.rto_at = now + self.rto
+            self.timer_armed = True
+            sim.at(self.rto_at, self._on_timer)
+
+    def _wake(self, arg):
+        self.wake_pending = False
+        self.try_send()
+
+    def _deliver(self, p, now):
+        if p.inflight:
+            p.inflight = False
+            self.inflight -= 1
+        rtt = rate = None
+        if not p.retrans:
+            rtt = now - p.sent_time
+            interval = max(now - p.delivered_time, p.sent_time - p.first_sent)
+            if interval > 0:
+                rate = (self.delivered + 1 - p.delivered) / interval
+        self.delivered += 1
+        self.delivered_time = now
+        self.first_sent = p.sent_time
+        return rtt, rate
+
+    def on_ack(self, ack):
+        now = self.sim.now
+        acked = 0
+        rtt = rate = None
+        trig = self.outstanding.pop(ack.seq, None)
+        if trig is not None:
+            rtt, rate = self._deliver(trig, now)
+            acked += 1
+        if ack.seq > self.high_sacked:
+            self.high_sacked = ack.seq
+        if self.una < ack.ack:
+            # Only forward progress restarts the retransmission timer
+            self.rto_at = now + self.rto
+        while self.una < ack.ack:
+            p = self.outstanding.pop(self.una, None)
+            if p is not None:
+                self._deliver(p, now)
+                acked += 1
+            self.una += 1
+        if rtt is not None:
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.min_rtt = min(self.min_rtt, rtt) if self.min_rtt else rtt
+            # Like Linux, the variance term never drops below MIN_RTO
+            self.rto = self.srtt + max(MIN_RTO, 4 * self.rttvar)
+
+        # Packets DUPTHRESH below the highest acked one are lost.  A
+        # retransmission is lost once DUPTHRESH packets sent after it
+        # were acked
+        newly_lost = False
+        limit = self.high_sacked - DUPTHRESH
+        for seq, p in self.outstanding.items():
+            if seq > limit:
+                break
+            if not p.lost and (not p.retrans or p.retx_mark <= limit):
+                p.lost = True
+                if p.inflight:
+                    p.inflight = False
+                    self.inflight -= 1
+                self.retx.append(seq)
+                newly_lost = True
+        if newly_lost and not self.in_recovery:
+            self.in_recovery = True
+            self.recover = self.next_seq
+            self.cc.on_loss(self, now)
+        elif self.in_recovery and self.una >= self.recover:
+            self.in_recovery = False
+            self.cc.on_recovery_exit(self, now)
+
+        if acked:
+            self.cc.on_ack(self, now, acked, rtt, rate, trig)
+        self.try_send()
+
+    def _on_timer(self, arg):
+        now = self.sim.now
+        if not self.outstanding:
+            self.timer_armed = False
+            return
+        if now < self.rto_at:
+            self.sim.at(self.rto_at, self._on_timer)
+            return
+        # Timeout: everything outstanding is lost
+        self.retx = deque()
+        for seq, p in self.outstanding.items():
+            p.lost = True
+            p.retrans = False
+            if p.inflight:
+                p.inflight = False
+                self.inflight -= 1
+            self.retx.append(seq)
+        # Slow start from cwnd 1 retransmits them; no fast recovery episode
+        self.in_recovery = False
+        self.cc.on_rto(self, now)
+        self.rto = min(self.rto * 2, 60.0)
+        self.timer_armed = False
+        self.try_send()
+
+
+class Receiver(object):
+    """Acks every data packet with (cumulative ack, seq that triggered it)."""
+
+    def __init__(self, sim, sender, path, total=None, on_complete=None):
+        self.sim = sim
+        self.sender = sender
+        self.path = path
+        self.total = total
+        self.on_complete = on_complete
+        self.expected = 0
+        self.ooo = set()
+        sender.receiver = self
+
+    def on_data(self, pkt):
+        seq = pkt.seq
+        if seq == self.expected:
+            self.expected += 1
+            while self.expected in self.ooo:
+                self.ooo.remove(self.expected)
+                self.expected += 1
+        elif seq > self.expected:
+            self.ooo.add(seq)
+        transmit(Packet(ACK_SIZE, self.path, self.sender.on_ack, seq,
+                        self.expected, self.sim.now))
+        if self.on_complete and self.expected == self.total:
+            self.on_complete(self.sim.now)
+            self.on_complete = None
+
+
+class Exchange(object):
+    """A small message retransmitted with exponential backoff until it
+    arrives (SYN, SYN-ACK and the HTTP request)."""
+
+    def __init__(self, sim, path, size, on_arrival, rto=INIT_RTO):
+        self.sim = sim
+        self.path = path
+        self.size = size
+        self.on_arrival = on_arrival
+        self.rto = rto
+        self.done = False
+        self.send()
+
+    def send(self, arg=None):
+        if self.done:
+            return
+        transmit(Packet(self.size, self.path, self._arrived, sent_time=self.sim.now))
+        self.sim.at(self.sim.now + self.rto, self.send)
+        self.rto *= 2
+
+    def _arrived(self, pkt):
+        if not self.done:
+            self.done = True
+            self.on_arrival(pkt)
+
+
+class Dumbbell(object):
+    """The BBTopo links plus the workloads of bufferbloat.py."""
+
+    def __init__(self, bw_host, bw_net, delay_ms, maxq, cong):
+        self.sim = sim = Simulator()
+        d = delay_ms / 1000.0
+        self.h1_eth0 = Link(sim, 'h1-eth0', bw_host, d, maxq)
+        self.s0_eth2 = Link(sim, 's0-eth2', bw_net, d, maxq)
+        self.h2_eth0 = Link(sim, 'h2-eth0', bw_net, d, maxq)
+        self.s0_eth1 = Link(sim, 's0-eth1', bw_host, d, maxq)
+        self.fwd = (self.h1_eth0, self.s0_eth2)     # h1 -> h2
+        self.rev = (self.h2_eth0, self.s0_eth1)     # h2 -> h1
+        self.base_rtt = 4 * d
+        self.cong = CONG[cong]
+        self.pings = []             # (seq, send time) in send order
+        self.replies = {}           # seq -> rtt_ms
+        self.fetch_times = []
+
+    def start_iperf(self):
+        sender = Sender(self.sim, self.cong(), self.fwd, init_rtt=self.base_rtt)
+        Receiver(self.sim, sender, self.rev)
+        sender.start()
+        return sender
+
+    def start_ping(self, interval, until):
+        sim = self.sim
+        seqs = count()
+
+        def reply(pkt):
+            self.replies[pkt.seq] = (sim.now - pkt.sent_time) * 1000
+
+        def echo(pkt):
+            transmit(Packet(PING_SIZE, self.rev, reply, pkt.seq, 0, pkt.sent_time))
+
+        def send(arg):
+            seq = next(seqs)
+            self.pings.append((seq, sim.now))
+            transmit(Packet(PING_SIZE, self.fwd, echo, seq, 0, sim.now))
+            if sim.now + interval < until:
+                sim.at(sim.now + interval, send)
+
+        sim.at(sim.now, send)
+
+    def fetch(self, size, at, on_done=None):
+        """Schedules a page download of `size` bytes from h1 by h2."""
+        sim = self.sim
+        total = int(math.ceil((size + HEADER_SIZE) / float(MSS)))
+        state = {}
+
+        def done(now):
+            self.fetch_times.append(now - state['start'])
+            if on_done:
+                on_done(now)
+
+        def request_arrived(pkt):
+            sender = Sender(sim, self.cong(), self.fwd, total, init_rtt=state['rtt'])
+            Receiver(sim, sender, self.rev, total, done)
+            sender.start()
+
+        def synack_arrived(pkt):
+            state['rtt'] = sim.now - state['start']
+            Exchange(sim, self.rev, REQUEST_SIZE, request_arrived,
+                     max(MIN_RTO, 2 * state['rtt']))
+
+        def syn_arrived(pkt):
+            Exchange(sim, self.fwd, SYN_SIZE, synack_arrived)
+
+        def start(arg):
+            state['start'] = sim.now
+            Exchange(sim, self.rev, SYN_SIZE, syn_arrived)
+
+        sim.at(at, start)
+
+    def monitor(self, link, interval, until, write):
+        sim = self.sim
+
+        def sample(arg):
+            write(sim.now, link.qlen())
+            if sim.now + interval <= until:
+                sim.at(sim.now + interval, sample)
+
+        sim.at(sim.now, sample)
+
+
+def run_experiment(outdir, bw_net, delay, maxq=100, cong='reno', duration=10,
+                   bw_host=1000, qfile='q.txt', page_size=None,
+                   ping_interval=0.1, qmon_interval=0.1, fetch_rate=0,
+                   fetch_arrival='poisson', fetch_conns=4, seed=None,
+                   pingfile='ping.csv', sketches=False):
+    """Simulates one bufferbloat.py run and writes outdir/qfile and
+    outdir/pingfile (prober.py format).  Returns the page fetch times (seconds).
+
+    With sketches, the queue length and RTT quantile sketches (sketch.py)
+    are saved in outdir as well, like the monitor and the prober do.
+
+    With fetch_rate > 0 the fetches arrive like those of fetcher.py
+    (Poisson or fixed rate, at most fetch_conns at a time); otherwise
+    three sequential fetches at 30%, 50% and 70% of the run."""
+    if page_size is None:
+        page = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+        page_size = os.path.getsize(page) if os.path.exists(page) else 177669
+    net = Dumbbell(bw_host, bw_net, delay, maxq, cong)
+    t0 = time()
+
+    qpath = os.path.join(outdir, qfile)
+    if qfile.endswith(tsfile.SUFFIX):
+        if os.path.exists(qpath):
+            os.remove(qpath)
+        qf = tsfile.SeriesWriter(qpath, 'qlen', iface='s0-eth2', units='packets')
+        write = lambda t, q: qf.append(t0 + t, q)
+    else:
+        qf = open(qpath, 'w', buffering=1 << 16)
+        write = lambda t, q: qf.write('%f,%d\n' % (t0 + t, q))
+    qsketch = QuantileSketch()
+    rttsketch = QuantileSketch()
+    if sketches:
+        write_qlen = write
+
+        def write(t, q):
+            write_qlen(t, q)
+            qsketch.add(q)
+
+    active = [0]
+    if fetch_rate > 0:
+        # Arrivals that find fetch_conns fetches running wait for one of them
+        waiting = [0]
+
+        def fetch_done(now):
+            active[0] -= 1
+            if waiting[0]:
+                waiting[0] -= 1
+                active[0] += 1
+                net.fetch(page_size, now, fetch_done)
+
+        def arrival(arg):
+            if active[0] < fetch_conns:
+                active[0] += 1
+                net.fetch(page_size, net.sim.now, fetch_done)
+            else:
+                waiting[0] += 1
+
+        rng = random.Random(seed)
+        for at in arrival_times(fetch_rate, fetch_arrival, duration, rng):
+            net.sim.at(at, arrival)
+        next_fetch = None
+    else:
+        # One page at a time, each waiting for the previous one like a
+        # blocking curl, so a slow fetch delays the next one
+        schedule = deque(duration * frac for frac in (0.3, 0.5, 0.7))
+
+        def next_fetch(now):
+            active[0] = 0
+            if schedule:
+                at = max(schedule.popleft(), now)
+                if at < duration:
+                    active[0] = 1
+                    net.fetch(page_size, at, next_fetch)
+
+    net.monitor(net.s0_eth2, qmon_interval, duration, write)
+    net.start_iperf()
+    net.start_ping(ping_interval, duration)
+    if next_fetch:
+        next_fetch(0.0)
+    try:
+        net.sim.run(duration)
+        # Fetches still running at the end are waited for
+        end = duration
+        while active[0] and end < duration + 60:
+            end += 1
+            net.sim.run(end)
+    finally:
+        qf.close()
+
+    write, close = open_output(os.path.join(outdir, pingfile), '10.0.0.2')
+    try:
+        for seq, sent in net.pings:
+            rtt = net.replies.get(seq)
+            if rtt is None and sent > net.sim.now - 1.0:
+                continue    # still in flight when the run ended
+            write(t0 + sent, seq, rtt, int(rtt is None))
+            if rtt is not None:
+                rttsketch.add(rtt)
+    finally:
+        close()
+    if sketches:
+        qsketch.save(os.path.join(outdir, SKETCH_FILES['qlen']))
+        rttsketch.save(os.path.join(outdir, SKETCH_FILES['rtt']))
+    return net.fetch_times
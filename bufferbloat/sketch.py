@@ -0,0 +1,233 @@
+'''
+Mergeable quantile sketches for long runs.
+
+A sketch is a histogram over logarithmic buckets: a value v > 0 falls in
+bucket ceil(log(v) / log(gamma)), with gamma = (1 + a) / (1 - a), so every
+sample is known within a relative error a (1% by default), whatever the
+distribution.  Quantiles interpolate between samples like
+fetcher.percentile, so they are within a of the exact ones too.  Values at or below min_value
+(an empty queue, say) are counted in a separate zero bucket.  Memory is
+bounded by max_bins; past it the lowest buckets are collapsed, which only
+costs accuracy in the lower tail.
+
+Sketches with the same accuracy merge exactly by adding bucket counts,
+so the sketches of several trials (or of every repetition in a sweep
+cell) can be combined without the samples.  They are saved as small
+JSON files.
+
+This module only uses the standard library so that the monitors and the
+prober can keep sketches without numpy.
+
+    python3 sketch.py summary bb-q100/rtt_sketch.json
+    python3 sketch.py merge sweep-1/*/rtt_sketch.json -o rtt_all.json
+'''
+
+from argparse import ArgumentParser
+from time import time
+import json
+import math
+import os
+
+SKETCH_FILES = {'rtt': 'rtt_sketch.json', 'qlen': 'q_sketch.json',
+                'fetch': 'fetch_sketch.json', 'sojourn': 'sojourn_sketch.json'}
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class QuantileSketch(object):
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be in (0, 1)')
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}          # bucket index -> count
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, value, count=1):
+        if value != value:      # nan: a lost probe, say
+            return
+        if value < 0:
+            raise ValueError('sketches only hold non-negative values')
+        if value <= self.min_value:
+            self.zero += count
+        else:
+            key = int(math.ceil(math.log(value) / self.log_gamma))
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update(self, values):
+        for v in values:
+            self.add(float(v))
+        return self
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        extra = keys[:len(keys) - self.max_bins + 1]
+        self.bins[extra[-1]] += sum(self.bins.pop(k) for k in extra[:-1])
+
+    def merge(self, other):
+        if abs(other.relative_accuracy - self.relative_accuracy) > 1e-12:
+            raise ValueError('cannot merge sketches with different accuracy')
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _value(self, key):
+        # Midpoint (in relative terms) of the bucket (gamma**(key-1), gamma**key]
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        """Values at the quantiles qs (each in [0, 1]), in one pass.
+
+        Same convention as fetcher.percentile and numpy.percentile: linear
+        interpolation at rank q * (count - 1) between the samples around
+        it.  Those are known within relative_accuracy (the smallest and the
+        largest exactly), so the result is within relative_accuracy of the
+        exact quantile of the samples."""
+        if self.count == 0:
+            return [float('nan')] * len(qs)
+        last = self.count - 1
+        values = {}             # rank -> value of the sample at that rank
+        for q in qs:
+            lo = int(q * last)
+            values[lo] = values[min(lo + 1, last)] = None
+        keys = iter(sorted(self.bins))
+        seen = self.zero
+        value = 0.0
+        for rank in sorted(values):
+            while seen <= rank:
+                key = next(keys)
+                seen += self.bins[key]
+                value = self._value(key)
+            values[rank] = min(max(value, self.min), self.max)
+        values[0], values[last] = self.min, self.max
+        ret = []
+        for q in qs:
+            k = q * last
+            lo = int(k)
+            hi = min(lo + 1, last)
+            ret.append(values[lo] + (values[hi] - values[lo]) * (k - lo))
+        return ret
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def mean(self):
+        return self.sum / self.count if self.count else float('nan')
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy,
+                'min_value': self.min_value, 'max_bins': self.max_bins,
+                'zero': self.zero, 'count': self.count, 'sum': self.sum,
+                'min': self.min if self.count else None,
+                'max': self.max if self.count else None,
+                'bins': dict((str(k), n) for k, n in sorted(self.bins.items()))}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d['relative_accuracy'], d['min_value'], d.get('max_bins', 2048))
+        s.bins = dict((int(k), n) for k, n in d['bins'].items())
+        s.zero = d['zero']
+        s.count = d['count']
+        s.sum = d['sum']
+        if s.count:
+            s.min, s.max = d['min'], d['max']
+        return s
+
+    def save(self, fname):
+        # Write then rename so a reader never sees a half written sketch
+        tmp = fname + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.rename(tmp, fname)
+
+    @classmethod
+    def load(cls, fname):
+        with open(fname) as f:
+            return cls.from_dict(json.load(f))
+
+    def summary(self, qs=DEFAULT_QUANTILES):
+        ret = {'count': self.count, 'mean': self.mean(),
+               'min': self.min if self.count else None,
+               'max': self.max if self.count else None}
+        for q, v in zip(qs, self.quantiles(qs)):
+            ret['p%g' % (q * 100)] = v
+        return ret
+
+
+class SketchFile(object):
+    """A sketch that is saved to fname every `every` seconds and on
+    close(), so a killed monitor still leaves a recent summary."""
+
+    def __init__(self, fname, every=10.0, **kwargs):
+        self.fname = fname
+        self.every = every
+        self.sketch = QuantileSketch(**kwargs)
+        self.next_save = time() + every
+
+    def add(self, value):
+        self.sketch.add(value)
+        now = time()
+        if now >= self.next_save:
+            self.sketch.save(self.fname)
+            self.next_save = now + self.every
+
+    def close(self):
+        self.sketch.save(self.fname)
+
+
+def merge_files(fnames):
+    """Merges the sketches saved in fnames (None if there are none)."""
+    merged = None
+    for fname in fnames:
+        s = QuantileSketch.load(fname)
+        merged = s if merged is None else merged.merge(s)
+    return merged
+
+
+def format_summary(summary):
+    return 'n=%d mean=%.4g ' % (summary['count'], summary['mean']) + ' '.join(
+        '%s=%.4g' % (k, v) for k, v in summary.items()
+        if k.startswith('p') and v is not None)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Quantile sketches")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('summary', help="Print the quantiles of each sketch")
+    p.add_argument('files', nargs='+')
+    p = sub.add_parser('merge', help="Merge several sketches into one")
+    p.add_argument('files', nargs='+')
+    p.add_argument('--out', '-o', required=True)
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'summary':
+        for fname in args.files:
+            print('%s: %s' % (fname, format_summary(QuantileSketch.load(fname).summary())))
+    else:
+        merged = merge_files(args.files)
+        merged.save(args.out)
+        print('%s: %s' % (args.out, format_summary(merged.summary())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+'''
+Per-packet sojourn time across the s0 switch: from the moment a packet
+arrives on the ingress port (s0-eth1, from h1) until it leaves the
+bottleneck port (s0-eth2, towards h2).
+
+q.txt counts packets in the queue, which only turns into a delay through
+the drain rate.  Here every packet is timestamped twice by the kernel,
+through two AF_PACKET sockets with SO_TIMESTAMPNS: on receive at the
+ingress port, and on transmit at the egress port, where packet sockets
+see a packet once the qdiscs have released it to the device.  Packets
+are matched on the IP header (addresses, protocol, IP id) plus the TCP
+sequence number or the ICMP id and sequence, so no packet is modified.
+
+The sojourn time includes the netem delay of s0-eth2 (--delay) on top
+of the queueing; the delay is stored with the series as base_ms and
+plot_sojourn.py subtracts it.
+
+Output, one record per matched packet in egress order:
+
+    time,sojourn_ms,bytes,proto
+
+(a tsfile series with the same columns if --out ends in .bin), and with
+--sketch a quantile sketch of sojourn_ms (sketch.py).  Must run in the
+namespace of the switch ports, i.e. the root one:
+
+    python3 sojourn.py --ingress s0-eth1 --egress s0-eth2 --out sojourn.txt --base-ms 10
+'''
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+import os
+import select
+import socket
+import struct
+import sys
+
+import tsfile
+from monitor import _exit_on_sigterm
+from sketch import SketchFile
+
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+PACKET_OUTGOING = 4
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+TIMESPEC = struct.Struct('=qq')
+CMSG_SPACE = 64
+
+# Ethernet + IPv4 (with options) + the transport header bytes in the key
+SNAPLEN = 14 + 60 + 8
+ETH_HLEN = 14
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+
+COLUMNS = ('sojourn_ms', 'bytes', 'proto')
+
+# Ingress packets still waiting for their egress copy: dropped by the
+# queue, or going out of another port
+MAX_PENDING = 1 << 16
+MAX_AGE = 5.0
+
+
+def packet_key(data):
+    """Identifies an IPv4 packet across the switch; None for others.
+
+    Addresses, IP id and protocol, plus the TCP sequence number (several
+    segments of a flow can share an IP id) or the ICMP id and sequence."""
+    if len(data) < ETH_HLEN + 20 or struct.unpack_from('!H', data, 12)[0] != ETH_P_IP:
+        return None
+    ihl = (data[ETH_HLEN] & 0x0f) * 4
+    proto = data[ETH_HLEN + 9]
+    key = data[ETH_HLEN + 4:ETH_HLEN + 6] + data[ETH_HLEN + 9:ETH_HLEN + 10] + \
+        data[ETH_HLEN + 12:ETH_HLEN + 20]
+    l4 = ETH_HLEN + ihl
+    if proto in (IPPROTO_TCP, IPPROTO_ICMP):
+        # TCP sequence number; ICMP echo id and sequence
+        key += data[l4 + 4:l4 + 8]
+    return key
+
+
+def _open(iface):
+    # ETH_P_ALL: the switch (bridge or OVS) takes the packets of its ports
+    # before protocol-specific sockets see them, and sent packets are only
+    # passed to ETH_P_ALL sockets
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    sock.bind((iface, 0))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    sock.setblocking(False)
+    return sock
+
+
+def _read(sock):
+    """Yields (kernel timestamp, pkttype, bytes on the wire, header bytes)
+    for every packet queued on the socket."""
+    while True:
+        try:
+            data, ancdata, flags, addr = sock.recvmsg(SNAPLEN, CMSG_SPACE, socket.MSG_TRUNC)
+        except (BlockingIOError, InterruptedError):
+            return
+        ts = None
+        for level, kind, cdata in ancdata:
+            if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPNS:
+                sec, nsec = TIMESPEC.unpack_from(cdata)
+                ts = sec + nsec * 1e-9
+        # With MSG_TRUNC, recvmsg returns the data truncated to SNAPLEN;
+        # the IP total length gives the size on the wire
+        size = struct.unpack_from('!H', data, ETH_HLEN + 2)[0] if len(data) >= ETH_HLEN + 4 else len(data)
+        yield ts, addr[2], size, data
+
+
+class SojournMatcher(object):
+    """Pairs ingress and egress sightings of the same packet."""
+
+    def __init__(self, write, max_pending=MAX_PENDING, max_age=MAX_AGE):
+        self.write = write
+        self.pending = OrderedDict()    # key -> ingress timestamp
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.matched = self.unmatched = self.expired = 0
+
+    def ingress(self, ts, data):
+        key = packet_key(data)
+        if key is None:
+            return
+        self.pending[key] = ts
+        self.pending.move_to_end(key)
+        # Oldest first: drop what the queue dropped (or sent elsewhere)
+        while self.pending and (len(self.pending) > self.max_pending or
+                                ts - next(iter(self.pending.values())) > self.max_age):
+            self.pending.popitem(last=False)
+            self.expired += 1
+
+    def egress(self, ts, size, data, last_try=True):
+        """Writes the packet's sojourn time; False if its ingress sighting
+        is not known (yet, unless last_try)."""
+        key = packet_key(data)
+        if key is None:
+            return True
+        t_in = self.pending.pop(key, None)
+        if t_in is None:
+            if last_try:
+                self.unmatched += 1
+            return False
+        self.matched += 1
+        self.write(ts, (ts - t_in) * 1000, size, data[ETH_HLEN + 9])
+        return True
+
+
+def read_base_ms(fname):
+    """The netem delay stored with a sojourn series (0 if unknown)."""
+    if tsfile.is_series_file(fname):
+        header, _ = tsfile.read_header(fname)
+        return float(header.get('base_ms', 0.0))
+    with open(fname) as f:
+        first = f.readline()
+    for field in first.lstrip('#').split():
+        if field.startswith('base_ms='):
+            return float(field[len('base_ms='):])
+    return 0.0
+
+
+def monitor_sojourn(ingress, egress, fname, sketch_file=None, base_ms=0.0):
+    _exit_on_sigterm()
+    if fname.endswith(tsfile.SUFFIX):
+        if os.path.exists(fname):
+            os.remove(fname)
+        f = tsfile.SeriesWriter(fname, 'sojourn', iface=egress, units='ms',
+                                columns=COLUMNS, ingress=ingress, base_ms=base_ms)
+        append = f.append
+    else:
+        f = open(fname, 'w', buffering=1 << 16)
+        f.write('# ingress=%s egress=%s base_ms=%g\n' % (ingress, egress, base_ms))
+        append = lambda t, ms, size, proto: f.write('%f,%.4f,%d,%d\n' % (t, ms, size, proto))
+    sketch = SketchFile(sketch_file) if sketch_file else None
+
+    def write(t, ms, size, proto):
+        append(t, ms, size, proto)
+        if sketch:
+            sketch.add(ms)
+
+    matcher = SojournMatcher(write)
+    sock_in, sock_out = _open(ingress), _open(egress)
+
+    def drain_ingress():
+        for ts, pkttype, size, data in _read(sock_in):
+            if pkttype != PACKET_OUTGOING:
+                matcher.ingress(ts, data)
+
+    poller = select.poll()
+    poller.register(sock_in, select.POLLIN)
+    poller.register(sock_out, select.POLLIN)
+    try:
+        while True:
+            poller.poll(1000)
+            # Ingress first, since a packet's two copies can arrive in the
+            # same batch; an egress copy read before its ingress copy (the
+            # packet crossed the switch while the ingress socket was being
+            # drained) is retried after one more ingress pass
+            drain_ingress()
+            late = [(ts, size, data) for ts, pkttype, size, data in _read(sock_out)
+                    if pkttype == PACKET_OUTGOING and not matcher.egress(ts, size, data, False)]
+            if late:
+                drain_ingress()
+                for ts, size, data in late:
+                    matcher.egress(ts, size, data)
+    finally:
+        f.close()
+        sock_in.close()
+        sock_out.close()
+        if sketch:
+            sketch.close()
+        print('sojourn: %d packets matched, %d egress without ingress, %d never left' % (
+            matcher.matched, matcher.unmatched, matcher.expired), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Per-packet sojourn time across the switch")
+    parser.add_argument('--ingress', default='s0-eth1', help="Port the packets come in")
+    parser.add_argument('--egress', default='s0-eth2', help="Bottleneck port they leave by")
+    parser.add_argument('--out', '-o', required=True,
+                        help="Output file (tsfile series if it ends in .bin)")
+    parser.add_argument('--sketch', default=None, help="Quantile sketch of the sojourn times")
+    parser.add_argument('--base-ms', type=float, default=0.0,
+                        help="netem delay of the egress port (ms), stored for the plots")
+    args = parser.parse_args(argv)
+    try:
+        monitor_sojourn(args.ingress, args.egress, args.out, args.sketch, args.base_ms)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''
+Runs bufferbloat.py over a parameter grid, several trials at a time.
+
+Every trial gets its own Mininet instance with a unique node prefix
+(t0h1, t0s0-eth2, ...), so trials do not share interfaces, and is pinned
+to its own set of CPUs so that concurrent trials do not skew each other's
+timings.  Outputs go to one directory per trial and a manifest.json in
+the sweep directory lists every trial with its parameters and status.
+Once every trial is done, the quantile sketches of the repetitions of
+each grid cell are merged into summary.json (p50 up to p99.9 of the RTT,
+queue length and fetch times, over all repetitions).
+
+Example (must run as root, like bufferbloat.py, unless --backend sim):
+
+    sudo python3 sweep.py --cong reno,bbr --maxq 20,100 \\
+        --bw-net 1.5 --delay 10 --time 90 --dir sweep-1
+
+--qdisc fifo,fq_codel,pie,cake adds the AQM of the bottleneck to the grid
+(aqm.py), so summary.json compares their tail RTT and fetch times.
+'''
+
+from argparse import ArgumentParser
+from subprocess import Popen, STDOUT
+from time import sleep, time
+import itertools
+import json
+import os
+import sys
+
+from sketch import SKETCH_FILES, merge_files
+
+# Parameters of bufferbloat.py that can be swept
+GRID_PARAMS = ['cong', 'maxq', 'bw_net', 'delay', 'time', 'qdisc']
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_list(type_):
+    return lambda text: [type_(v) for v in text.split(',') if v]
+
+
+def expand_grid(params, repeat=1):
+    """Yields one dict per point of the grid (cartesian product)."""
+    for values in itertools.product(*[params[name] for name in GRID_PARAMS]):
+        for rep in range(repeat):
+            point = dict(zip(GRID_PARAMS, values))
+            point['rep'] = rep
+            yield point
+
+
+def trial_name(point, repeat=1):
+    name = '%(cong)s-q%(maxq)d-bw%(bw_net)g-d%(delay)g-t%(time)d' % point
+    if point.get('qdisc', 'fifo') != 'fifo':
+        name += '-%s' % point['qdisc']
+    if repeat > 1:
+        name += '-r%d' % point['rep']
+    return name
+
+
+def trial_command(point, outdir, prefix, binary=False, backend='mininet',
+                  python=sys.executable):
+    cmd = [python, os.path.join(SCRIPT_DIR, 'bufferbloat.py'),
+           '--cong', point['cong'], '--maxq', str(point['maxq']),
+           '--bw-net', str(point['bw_net']), '--delay', str(point['delay']),
+           '--time', str(point['time']), '--dir', outdir, '--prefix', prefix,
+           '--backend', backend]
+    if point.get('qdisc', 'fifo') != 'fifo':
+        cmd += ['--qdisc', point['qdisc']]
+    if binary:
+        cmd.append('--binary')
+    return cmd
+
+
+def cpu_slots(cores, per_trial):
+    """Splits the allowed CPUs into disjoint sets of per_trial CPUs."""
+    allowed = sorted(os.sched_getaffinity(0))
+    if cores:
+        allowed = allowed[:cores]
+    return [set(allowed[i:i + per_trial])
+            for i in range(0, len(allowed) - per_trial + 1, per_trial)]
+
+
+def write_manifest(fname, manifest):
+    # Write then rename so a reader never sees a half written manifest
+    tmp = fname + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.rename(tmp, fname)
+
+
+def run_sweep(points, sweep_dir, slots, repeat=1, binary=False,
+              backend='mininet', poll_sec=1.0):
+    """Runs the trials, at most len(slots) at a time, and returns the
+    manifest (also kept up to date in sweep_dir/manifest.json)."""
+    if not slots:
+        raise ValueError('not enough CPUs for a single trial')
+    # Trials run from SCRIPT_DIR (webserver.py serves index.html from
+    # there), so their output directories must be absolute
+    sweep_dir = os.path.abspath(sweep_dir)
+    os.makedirs(sweep_dir, exist_ok=True)
+    manifest_file = os.path.join(sweep_dir, 'manifest.json')
+    manifest = {'created': time(), 'trials': []}
+    for i, point in enumerate(points):
+        name = trial_name(point, repeat)
+        manifest['trials'].append({
+            'id': i, 'name': name, 'prefix': 't%d' % i, 'params': point,
+            'dir': os.path.join(sweep_dir, name), 'status': 'pending',
+            'cpus': None, 'returncode': None, 'start': None, 'end': None})
+    write_manifest(manifest_file, manifest)
+
+    pending = list(manifest['trials'])
+    running = {}                # trial id -> (Popen, log file, cpus)
+    free = list(slots)
+    try:
+        while pending or running:
+            while pending and free:
+                trial = pending.pop(0)
+                cpus = free.pop(0)
+                os.makedirs(trial['dir'], exist_ok=True)
+                log = open(os.path.join(trial['dir'], 'log.txt'), 'w')
+                cmd = trial_command(trial['params'], trial['dir'],
+                                    trial['prefix'], binary, backend)
+                # Affinity is set before exec, so every process of the
+                # trial (Mininet hosts, iperf, ping, monitor) inherits it
+                proc = Popen(cmd, cwd=SCRIPT_DIR, stdout=log, stderr=STDOUT,
+                             preexec_fn=lambda c=cpus: os.sched_setaffinity(0, c))
+                trial.update(status='running', cpus=sorted(cpus), start=time(),
+                             command=cmd)
+                running[trial['id']] = (proc, log, cpus)
+                print('Started %s on CPUs %s' % (trial['name'], sorted(cpus)))
+            write_manifest(manifest_file, manifest)
+
+            sleep(poll_sec)
+            for tid, (proc, log, cpus) in list(running.items()):
+                if proc.poll() is None:
+                    continue
+                log.close()
+                trial = manifest['trials'][tid]
+                trial.update(returncode=proc.returncode, end=time(),
+                             status='done' if proc.returncode == 0 else 'failed')
+                print('Finished %s (%s) in %.0f s' % (
+                    trial['name'], trial['status'], trial['end'] - trial['start']))
+                del running[tid]
+                free.append(cpus)
+            write_manifest(manifest_file, manifest)
+    finally:
+        for proc, log, cpus in running.values():
+            proc.terminate()
+            proc.wait()
+            log.close()
+        for trial in manifest['trials']:
+            if trial['status'] == 'running':
+                trial['status'] = 'killed'
+        write_manifest(manifest_file, manifest)
+    return manifest
+
+
+def summarize_cells(manifest, sweep_dir):
+    """Merges the sketches of the repetitions of each grid cell and
+    writes their quantiles to sweep_dir/summary.json."""
+    cells = {}
+    for trial in manifest['trials']:
+        if trial['status'] == 'done':
+            cells.setdefault(trial_name(trial['params']), []).append(trial)
+    summary = {}
+    for name, trials in sorted(cells.items()):
+        cell = {'params': dict((k, trials[0]['params'][k]) for k in GRID_PARAMS),
+                'trials': len(trials)}
+        for kind, fname in sorted(SKETCH_FILES.items()):
+            files = [os.path.join(t['dir'], fname) for t in trials]
+            files = [f for f in files if os.path.exists(f)]
+            if files:
+                cell[kind] = merge_files(files).summary()
+        summary[name] = cell
+    write_manifest(os.path.join(sweep_dir, 'summary.json'), summary)
+    return summary
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Parallel bufferbloat sweeps")
+    parser.add_argument('--cong', type=parse_list(str), default=['reno'],
+                        help="Comma separated congestion control algorithms")
+    parser.add_argument('--maxq', type=parse_list(int), default=[100],
+                        help="Comma separated buffer sizes (packets)")
+    parser.add_argument('--bw-net', '-b', type=parse_list(float), required=True,
+                        help="Comma separated bottleneck bandwidths (Mb/s)")
+    parser.add_argument('--delay', type=parse_list(float), required=True,
+                        help="Comma separated link delays (ms)")
+    parser.add_argument('--time', '-t', type=parse_list(int), default=[10],
+                        help="Comma separated durations (sec)")
+    parser.add_argument('--qdisc', type=parse_list(str), default=['fifo'],
+                        help="Comma separated AQMs of the bottleneck (fifo, fq_codel, "
+                             "codel, cake, pie, red)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Trials per point of the grid")
+    parser.add_argument('--dir', '-d', required=True,
+                        help="Directory for the manifest and per-trial outputs")
+    parser.add_argument('--cores', type=int, default=0,
+                        help="CPUs available to the sweep (default: all)")
+    parser.add_argument('--cores-per-trial', type=int, default=2,
+                        help="CPUs pinned to each trial")
+    parser.add_argument('--binary', action='store_true', default=False,
+                        help="Pass --binary to bufferbloat.py (q.bin)")
+    parser.add_argument('--backend', choices=['mininet', 'sim'], default='mininet',
+                        help="Backend of bufferbloat.py ('sim' needs no root)")
+    args = parser.parse_args(argv)
+
+    params = {'cong': args.cong, 'maxq': args.maxq, 'bw_net': args.bw_net,
+              'delay': args.delay, 'time': args.time, 'qdisc': args.qdisc}
+    points = list(expand_grid(params, args.repeat))
+    slots = cpu_slots(args.cores, args.cores_per_trial)
+    print('%d trials, %d at a time' % (len(points), len(slots)))
+    manifest = run_sweep(points, args.dir, slots, args.repeat, args.binary,
+                         args.backend)
+    summary = summarize_cells(manifest, args.dir)
+    for name, cell in summary.items():
+        print('%s (%d trials): %s' % (name, cell['trials'], '  '.join(
+            '%s p99=%.4g p99.9=%.4g' % (kind, cell[kind]['p99'], cell[kind]['p99.9'])
+            for kind in sorted(SKETCH_FILES) if kind in cell)))
+    failed = [t['name'] for t in manifest['trials'] if t['status'] != 'done']
+    if failed:
+        print('Failed trials: %s' % ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+'''
+Samples the kernel TCP state (struct tcp_info) of every flow in the
+network namespace it runs in.
+
+Each sample is one sock_diag (inet_diag) netlink dump, the interface
+`ss -tin` uses, so every flow is read with a single syscall round trip
+and no process is forked.  Run it inside a Mininet host to see that
+host's flows:
+
+    h1.popen("exec python3 tcpinfo.py --dir bb-q100/tcpinfo --interval 0.02")
+
+Every flow gets its own tsfile series (tsfile.py), named after its
+endpoints (10.0.0.1_39812-10.0.0.2_5001.bin), with the columns
+
+    cwnd           congestion window (segments)
+    ssthresh       slow start threshold (segments, 0 if unset)
+    srtt_ms        smoothed RTT
+    rttvar_ms      RTT variation
+    retrans        total retransmitted segments
+    delivery_mbps  delivery rate estimate
+    pacing_mbps    pacing rate (0 if unpaced)
+    bbr_bw_mbps    BBR bottleneck bandwidth estimate (0 if not BBR)
+    bbr_min_rtt_ms BBR min RTT estimate (0 if not BBR)
+
+and the congestion control name and endpoints in the header.  Read them
+with helper.load_series(fname, 'cwnd').
+'''
+
+from argparse import ArgumentParser
+from time import time
+import glob
+import os
+import socket
+import struct
+
+import tsfile
+from monitor import (NLMSG_HDR, NLMSG_DONE, NLMSG_ERROR, NLM_F_REQUEST, NLM_F_DUMP,
+                     _align, _attrs, _exit_on_sigterm, _ticks)
+
+# sock_diag constants (linux/sock_diag.h, linux/inet_diag.h)
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+INET_DIAG_INFO = 2
+INET_DIAG_VEGASINFO = 3
+INET_DIAG_CONG = 4
+INET_DIAG_BBRINFO = 16
+TCP_ESTABLISHED = 1
+
+# inet_diag_req_v2 (family, protocol, ext, states) + inet_diag_sockid
+DIAG_REQ = struct.Struct('=BBBxI48x')
+# inet_diag_msg: family, state, timer, retrans, sockid, expires, rqueue,
+# wqueue, uid, inode
+DIAG_MSG = struct.Struct('=BBBB2H16s16sI8s5I')
+# struct tcp_info up to tcpi_delivery_rate; older kernels send less and
+# the missing fields read as 0
+TCP_INFO = struct.Struct('=8B24I4Q6IQ')
+BBR_INFO = struct.Struct('=5I')
+
+COLUMNS = ('cwnd', 'ssthresh', 'srtt_ms', 'rttvar_ms', 'retrans',
+           'delivery_mbps', 'pacing_mbps', 'bbr_bw_mbps', 'bbr_min_rtt_ms')
+
+# Kernel "infinite" ssthresh and pacing rate
+TCP_INFINITE_SSTHRESH = 0x7fffffff
+UNLIMITED_RATE = (1 << 64) - 1
+
+
+def _endpoint(family, addr, port):
+    if family == socket.AF_INET:
+        addr = addr[:4]
+    return socket.inet_ntop(family, addr), port
+
+
+def _parse_sock(buf, off, end):
+    """Returns (flow, cc, values) for one inet_diag_msg."""
+    (family, state, _, _, sport, dport, src, dst, _, _,
+     _, _, _, _, _) = DIAG_MSG.unpack_from(buf, off)
+    flow = (_endpoint(family, src, socket.ntohs(sport)),
+            _endpoint(family, dst, socket.ntohs(dport)))
+    info = None
+    cc = ''
+    bbr = None
+    for atype, aoff, alen in _attrs(buf, off + DIAG_MSG.size, end):
+        if atype == INET_DIAG_INFO:
+            raw = bytes(buf[aoff:aoff + min(alen, TCP_INFO.size)])
+            info = TCP_INFO.unpack(raw + b'\0' * (TCP_INFO.size - len(raw)))
+        elif atype == INET_DIAG_CONG:
+            cc = bytes(buf[aoff:aoff + alen]).split(b'\0', 1)[0].decode()
+        elif atype == INET_DIAG_BBRINFO and alen >= BBR_INFO.size:
+            bbr = BBR_INFO.unpack_from(buf, aoff)
+    if info is None:
+        return flow, cc, None
+    u32 = info[8:32]
+    rtt, rttvar, ssthresh, cwnd = u32[15], u32[16], u32[17], u32[18]
+    total_retrans = u32[23]
+    pacing_rate = info[32]
+    delivery_rate = info[42]
+    values = (cwnd,
+              0 if ssthresh >= TCP_INFINITE_SSTHRESH else ssthresh,
+              rtt / 1000.0, rttvar / 1000.0, total_retrans,
+              delivery_rate * 8 / 1e6,
+              0 if pacing_rate == UNLIMITED_RATE else pacing_rate * 8 / 1e6,
+              ((bbr[1] << 32 | bbr[0]) * 8 / 1e6) if bbr else 0,
+              bbr[2] / 1000.0 if bbr else 0)
+    return flow, cc, values
+
+
+class TcpInfoSource(object):
+    """Dumps tcp_info of the established TCP sockets through one
+    NETLINK_SOCK_DIAG socket; one dump per address family and sample."""
+
+    def __init__(self, families=(socket.AF_INET,)):
+        self.families = families
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+        self.sock.bind((0, 0))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.seq = 0
+        self.buf = bytearray(1 << 16)
+        ext = (1 << (INET_DIAG_INFO - 1) | 1 << (INET_DIAG_VEGASINFO - 1) |
+               1 << (INET_DIAG_CONG - 1))
+        self.requests = [DIAG_REQ.pack(family, socket.IPPROTO_TCP, ext, 1 << TCP_ESTABLISHED)
+                         for family in families]
+
+    def sample(self):
+        """Returns [(flow, cc, values)] with flow = ((src, sport), (dst, dport))."""
+        ret = []
+        for body in self.requests:
+            self.seq += 1
+            hdr = NLMSG_HDR.pack(NLMSG_HDR.size + len(body), SOCK_DIAG_BY_FAMILY,
+                                 NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0)
+            self.sock.send(hdr + body)
+            self._receive(ret)
+        return ret
+
+    def _receive(self, ret):
+        view = memoryview(self.buf)
+        while True:
+            n = self.sock.recv_into(view)
+            off = 0
+            while off + NLMSG_HDR.size <= n:
+                mlen, mtype, flags, seq, pid = NLMSG_HDR.unpack_from(self.buf, off)
+                if mlen < NLMSG_HDR.size:
+                    break
+                if seq == self.seq:
+                    if mtype == NLMSG_DONE:
+                        return
+                    if mtype == NLMSG_ERROR:
+                        err = struct.unpack_from('=i', self.buf, off + NLMSG_HDR.size)[0]
+                        raise OSError(-err, os.strerror(-err))
+                    if mtype == SOCK_DIAG_BY_FAMILY:
+                        flow, cc, values = _parse_sock(self.buf, off + NLMSG_HDR.size,
+                                                       off + mlen)
+                        if values is not None:
+                            ret.append((flow, cc, values))
+                off += _align(mlen)
+
+    def close(self):
+        self.sock.close()
+
+
+def flow_name(flow):
+    (src, sport), (dst, dport) = flow
+    return '%s_%d-%s_%d' % (src, sport, dst, dport)
+
+
+def monitor_tcpinfo(outdir, interval_sec=0.02, ports=None, families=(socket.AF_INET,)):
+    """Samples every established flow (only those with a local or remote
+    port in ports, if given) to outdir/<flow>.bin.  The series already
+    in outdir, from a previous run, are removed first."""
+    _exit_on_sigterm()
+    os.makedirs(outdir, exist_ok=True)
+    for fname in glob.glob(os.path.join(outdir, '*' + tsfile.SUFFIX)):
+        os.remove(fname)
+    source = TcpInfoSource(families)
+    writers = {}
+    try:
+        for _ in _ticks(interval_sec):
+            t = time()
+            for flow, cc, values in source.sample():
+                if ports and flow[0][1] not in ports and flow[1][1] not in ports:
+                    continue
+                w = writers.get(flow)
+                if w is None:
+                    w = writers[flow] = tsfile.SeriesWriter(
+                        os.path.join(outdir, flow_name(flow) + tsfile.SUFFIX),
+                        'tcp_info', columns=COLUMNS, cc=cc,
+                        src='%s:%d' % flow[0], dst='%s:%d' % flow[1])
+                w.append(t, *values)
+    finally:
+        for w in writers.values():
+            w.close()
+        source.close()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Per-flow TCP state sampler (tcp_info via inet_diag)")
+    parser.add_argument('--dir', '-d', required=True, help="Output directory (one file per flow)")
+    parser.add_argument('--interval', type=float, default=0.02,
+                        help="Sampling period in seconds")
+    parser.add_argument('--port', type=int, action='append', default=None,
+                        help="Only flows with this local or remote port (repeatable)")
+    parser.add_argument('--ipv6', action='store_true', default=False,
+                        help="Also sample IPv6 flows")
+    args = parser.parse_args(argv)
+
+    families = (socket.AF_INET, socket.AF_INET6) if args.ipv6 else (socket.AF_INET,)
+    try:
+        monitor_tcpinfo(args.dir, args.interval, set(args.port or ()), families)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
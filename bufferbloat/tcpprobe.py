@@ -0,0 +1,350 @@
+'''
+Records TCP congestion control events as they happen, from the kernel
+tracepoints
+
+    tcp_probe            every segment a flow receives: cwnd, ssthresh,
+                         srtt, send window, snd_nxt/snd_una
+    tcp_retransmit_skb   every retransmitted segment
+    tcp_cong_state_set   every change of congestion state (0 Open,
+                         1 Disorder, 2 CWR, 3 Recovery, 4 Loss)
+
+tcpinfo.py samples the flows at a fixed period, so a Reno halving or a
+BBR ProbeRTT dip that starts and ends between two samples is lost.
+Here each tracepoint is opened with perf_event_open on every CPU and the
+events are written by the kernel into one mmap'd perf ring buffer per
+CPU, with a filter by port evaluated in the kernel, so only the
+experiment's flows are copied out.  The collector sleeps in poll() until
+a quarter of a ring has filled up, then decodes the whole batch and
+writes it with one call per tracepoint.
+
+Each tracepoint gets its own tsfile series (tsfile.py) in --dir,
+tcp_probe.bin and so on.  The columns are sport, dport and the fields
+listed in TRACEPOINTS, named and ordered as in the kernel record (srtt
+in us, snd_cwnd and ssthresh in segments, ssthresh 2147483647 while
+unset).  perf stamps the events with CLOCK_MONOTONIC (it refuses
+CLOCK_REALTIME, which is not NMI-safe); they are shifted to epoch time,
+the clock of q.txt and ping.csv, so the two can be joined directly.
+
+    sudo python3 tcpprobe.py --dir bb-q100/tcpprobe --port 5001
+
+A file holds every matching flow, seen from both ends: the iperf sender
+is the side with dport 5001, e.g. rec[rec['dport'] == 5001] with
+rec = helper.read_series('bb-q100/tcpprobe/tcp_probe.bin')[1].
+
+Tracepoints see every network namespace, so this runs in the root one.
+It needs root and tracefs (/sys/kernel/tracing); a tracepoint the kernel
+does not have (tcp_cong_state_set is from 5.15) is skipped.
+'''
+
+from argparse import ArgumentParser
+import ctypes
+import fcntl
+import mmap
+import os
+import platform
+import select
+import struct
+import sys
+import time
+
+import tsfile
+from monitor import _exit_on_sigterm
+
+TRACEFS = ('/sys/kernel/tracing', '/sys/kernel/debug/tracing')
+TRACEPOINTS = {
+    'tcp_probe': ('snd_cwnd', 'ssthresh', 'srtt', 'snd_wnd', 'snd_nxt', 'snd_una',
+                  'data_len'),
+    'tcp_retransmit_skb': ('state',),
+    'tcp_cong_state_set': ('cong_state',),
+}
+
+# perf_event_open(2) constants (linux/perf_event.h)
+SYS_PERF_EVENT_OPEN = {'x86_64': 298, 'i386': 336, 'i686': 336, 'aarch64': 241,
+                       'armv7l': 364, 'ppc64le': 319, 's390x': 331, 'riscv64': 241}
+PERF_TYPE_TRACEPOINT = 2
+PERF_SAMPLE_TIME = 1 << 2
+PERF_SAMPLE_CPU = 1 << 7
+PERF_SAMPLE_RAW = 1 << 10
+PERF_ATTR_DISABLED = 1 << 0
+PERF_ATTR_WATERMARK = 1 << 14
+PERF_ATTR_USE_CLOCKID = 1 << 25
+PERF_FLAG_FD_CLOEXEC = 1 << 3
+PERF_EVENT_IOC_ENABLE = 0x2400
+PERF_EVENT_IOC_DISABLE = 0x2401
+PERF_EVENT_IOC_SET_OUTPUT = 0x2405
+PERF_EVENT_IOC_SET_FILTER = 0x40082406
+PERF_RECORD_LOST = 2
+PERF_RECORD_SAMPLE = 9
+CLOCK_MONOTONIC = 1
+
+# perf_event_attr up to sample_max_stack (PERF_ATTR_SIZE_VER5)
+PERF_ATTR = struct.Struct('=IIQQQQQIIQQQQIiQIHH')
+# Record header: type, misc, size
+RECORD_HDR = struct.Struct('=I2xH')
+# A sample record with PERF_SAMPLE_TIME | PERF_SAMPLE_CPU | PERF_SAMPLE_RAW:
+# header, time, cpu, reserved, raw size, then the raw tracepoint record,
+# which starts with its id (common_type)
+SAMPLE = struct.Struct('=8xQ12xH')
+RAW_OFFSET = 28
+# PERF_RECORD_LOST: header, id, lost
+LOST = struct.Struct('=16xQ')
+# data_head and data_tail of struct perf_event_mmap_page
+DATA_HEAD = 1024
+DATA_TAIL = 1032
+U64 = struct.Struct('=Q')
+
+FIELD_TYPES = {(1, 0): 'B', (1, 1): 'b', (2, 0): 'H', (2, 1): 'h',
+               (4, 0): 'I', (4, 1): 'i', (8, 0): 'Q', (8, 1): 'q'}
+
+
+def tracefs():
+    for path in TRACEFS:
+        if os.path.isdir(os.path.join(path, 'events')):
+            return path
+    raise OSError('tracefs not mounted (mount -t tracefs nodev /sys/kernel/tracing)')
+
+
+def online_cpus():
+    """CPU numbers from /sys/devices/system/cpu/online (e.g. '0-3,6')."""
+    try:
+        with open('/sys/devices/system/cpu/online') as f:
+            text = f.read().strip()
+    except IOError:
+        return list(range(os.cpu_count()))
+    cpus = []
+    for part in text.split(','):
+        lo, _, hi = part.partition('-')
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def read_format(path):
+    """Returns (id, {field: (offset, size, signed)}) of a tracepoint
+    from its tracefs format file."""
+    fields = {}
+    with open(os.path.join(path, 'id')) as f:
+        tp_id = int(f.read())
+    with open(os.path.join(path, 'format')) as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('field:'):
+                continue
+            parts = dict(p.strip().split(':', 1) for p in line.split(';') if ':' in p)
+            name = parts['field'].split()[-1].split('[')[0]
+            fields[name] = (int(parts['offset']), int(parts['size']), int(parts['signed']))
+    return tp_id, fields
+
+
+def field_struct(fields, names, base=0):
+    """A Struct that unpacks the named fields, in order, from a raw
+    tracepoint record starting base bytes in; names must be ordered by
+    offset."""
+    fmt, pos = '=%dx' % base, 0
+    for name in names:
+        offset, size, signed = fields[name]
+        if offset < pos:
+            raise ValueError('field %s out of order' % name)
+        fmt += '%dx%s' % (offset - pos, FIELD_TYPES[size, signed])
+        pos = offset + size
+    return struct.Struct(fmt)
+
+
+def port_filter(ports):
+    return ' || '.join('sport == %d || dport == %d' % (p, p) for p in sorted(ports))
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def perf_event_open(tp_id, cpu, watermark):
+    attr = PERF_ATTR.pack(PERF_TYPE_TRACEPOINT, PERF_ATTR.size, tp_id, 1,
+                          PERF_SAMPLE_TIME | PERF_SAMPLE_CPU | PERF_SAMPLE_RAW, 0,
+                          PERF_ATTR_DISABLED | PERF_ATTR_WATERMARK | PERF_ATTR_USE_CLOCKID,
+                          watermark, 0, 0, 0, 0, 0, 0, CLOCK_MONOTONIC, 0, 0, 0, 0)
+    nr = SYS_PERF_EVENT_OPEN[platform.machine()]
+    fd = _libc.syscall(nr, ctypes.c_char_p(attr), -1, cpu, -1, PERF_FLAG_FD_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, 'perf_event_open: %s' % os.strerror(err))
+    return fd
+
+
+class PerfRing(object):
+    """The ring buffer of one CPU, shared by all tracepoints on it."""
+
+    def __init__(self, fd, pages):
+        self.fd = fd
+        self.page = mmap.PAGESIZE
+        self.size = pages * self.page
+        self.mm = mmap.mmap(fd, self.page + self.size, mmap.MAP_SHARED,
+                            mmap.PROT_READ | mmap.PROT_WRITE)
+
+    def read(self):
+        """Returns the bytes written since the last read and frees them."""
+        head = U64.unpack_from(self.mm, DATA_HEAD)[0]
+        tail = U64.unpack_from(self.mm, DATA_TAIL)[0]
+        if head == tail:
+            return b''
+        start = self.page + tail % self.size
+        n = head - tail
+        end = self.page + self.size
+        if start + n <= end:
+            data = self.mm[start:start + n]
+        else:
+            data = self.mm[start:end] + self.mm[self.page:self.page + n - (end - start)]
+        U64.pack_into(self.mm, DATA_TAIL, head)
+        return data
+
+    def close(self):
+        self.mm.close()
+
+
+class TcpProbe(object):
+    """Opens the tracepoints on every CPU, filtered by port in the
+    kernel, and decodes their events in batches."""
+
+    def __init__(self, ports=(), names=tuple(TRACEPOINTS), pages=256):
+        root = tracefs()
+        self.fds = []
+        self.rings = []
+        self.decoders = {}
+        self.columns = {}
+        self.skipped = []
+        self.lost = 0
+        # Epoch time minus CLOCK_MONOTONIC, to convert the event times
+        self.epoch = time.time() - time.clock_gettime(time.CLOCK_MONOTONIC)
+        tracepoints = []
+        for name in names:
+            path = os.path.join(root, 'events', 'tcp', name)
+            if not os.path.isdir(path):
+                self.skipped.append(name)
+                continue
+            tp_id, fields = read_format(path)
+            # In the kernel's field order, so a record unpacks in one call
+            columns = sorted(('sport', 'dport') + TRACEPOINTS[name], key=lambda c: fields[c][0])
+            self.columns[name] = tuple(columns)
+            self.decoders[tp_id] = (name, field_struct(fields, columns, RAW_OFFSET))
+            tracepoints.append(tp_id)
+        if not tracepoints:
+            raise OSError('no TCP tracepoints in %s' % root)
+        try:
+            for cpu in online_cpus():
+                leader = None
+                for tp_id in tracepoints:
+                    fd = perf_event_open(tp_id, cpu, pages * mmap.PAGESIZE // 4)
+                    self.fds.append(fd)
+                    if ports:
+                        fcntl.ioctl(fd, PERF_EVENT_IOC_SET_FILTER,
+                                    port_filter(ports).encode() + b'\0')
+                    if leader is None:
+                        leader = fd
+                        self.rings.append(PerfRing(fd, pages))
+                    else:
+                        fcntl.ioctl(fd, PERF_EVENT_IOC_SET_OUTPUT, leader)
+            for fd in self.fds:
+                fcntl.ioctl(fd, PERF_EVENT_IOC_ENABLE, 0)
+        except BaseException:
+            self.close()
+            raise
+
+    def wait(self, timeout_ms=1000):
+        poller = select.poll()
+        for ring in self.rings:
+            poller.register(ring.fd, select.POLLIN)
+        poller.poll(timeout_ms)
+
+    def read(self):
+        """Decodes everything in the rings into {name: list}, the records
+        (time, *columns) of each tracepoint laid end to end."""
+        epoch = self.epoch
+        batch = dict((name, []) for name in self.columns)
+        decoders = dict((tp_id, (fields.unpack_from, batch[name]))
+                        for tp_id, (name, fields) in self.decoders.items())
+        for ring in self.rings:
+            data = ring.read()
+            off, n = 0, len(data)
+            while off < n:
+                rtype, size = RECORD_HDR.unpack_from(data, off)
+                if rtype == PERF_RECORD_SAMPLE:
+                    t, tp_id = SAMPLE.unpack_from(data, off)
+                    # The raw record starts with common_type, the tracepoint id
+                    decoder = decoders.get(tp_id)
+                    if decoder:
+                        unpack, records = decoder
+                        records.append(epoch + t * 1e-9)
+                        records.extend(unpack(data, off))
+                elif rtype == PERF_RECORD_LOST:
+                    self.lost += LOST.unpack_from(data, off)[0]
+                off += size
+        return batch
+
+    def close(self):
+        for fd in self.fds:
+            try:
+                fcntl.ioctl(fd, PERF_EVENT_IOC_DISABLE, 0)
+            except OSError:
+                pass
+        for ring in self.rings:
+            ring.close()
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+        self.rings = []
+
+
+def monitor_tcpprobe(outdir, ports=(), pages=256):
+    """Writes the events of the flows with a local or remote port in
+    ports (every flow if empty) to outdir/<tracepoint>.bin."""
+    _exit_on_sigterm()
+    os.makedirs(outdir, exist_ok=True)
+    # SeriesWriter appends: drop the events of a previous run in outdir,
+    # also those of a tracepoint this kernel does not have
+    for name in TRACEPOINTS:
+        fname = os.path.join(outdir, name + tsfile.SUFFIX)
+        if os.path.exists(fname):
+            os.remove(fname)
+    probe = TcpProbe(ports, pages=pages)
+    if probe.skipped:
+        print('tcpprobe: no tracepoint %s' % ', '.join(probe.skipped), file=sys.stderr)
+    writers = dict((name, tsfile.SeriesWriter(
+        os.path.join(outdir, name + tsfile.SUFFIX), name,
+        columns=columns, ports=sorted(ports)))
+        for name, columns in probe.columns.items())
+    counts = dict.fromkeys(writers, 0)
+
+    def write(batch):
+        for name, records in batch.items():
+            writers[name].extend(records)
+            counts[name] += len(records) // (1 + len(probe.columns[name]))
+
+    try:
+        while True:
+            probe.wait()
+            write(probe.read())
+    finally:
+        # Events still in the rings when the monitor is stopped
+        write(probe.read())
+        probe.close()
+        for w in writers.values():
+            w.close()
+        print('tcpprobe: %s, %d lost' % (', '.join(
+            '%d %s' % (counts[name], name) for name in sorted(counts)), probe.lost),
+            file=sys.stderr)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="TCP tracepoint collector (perf ring buffers)")
+    parser.add_argument('--dir', '-d', required=True, help="Output directory (one file per tracepoint)")
+    parser.add_argument('--port', type=int, action='append', default=None,
+                        help="Only flows with this local or remote port (repeatable)")
+    parser.add_argument('--pages', type=int, default=256,
+                        help="Ring buffer pages per CPU (a power of two)")
+    args = parser.parse_args(argv)
+    try:
+        monitor_tcpprobe(args.dir, set(args.port or ()), args.pages)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+'''
+Tests of the discrete-event simulator (simulator.py).
+
+    python3 -m pytest test_simulator.py
+'''
+
+import unittest
+
+import simulator
+
+
+class BbrModesTest(unittest.TestCase):
+
+    def modes(self, duration):
+        """Modes the iperf sender's BBR goes through, in order."""
+        net = simulator.Dumbbell(1000, 1.5, 10, 100, 'bbr')
+        sender = net.start_iperf()
+        seen = []
+
+        def sample(arg):
+            if not seen or seen[-1] != sender.cc.mode:
+                seen.append(sender.cc.mode)
+            net.sim.at(net.sim.now + 0.01, sample)
+
+        sample(None)
+        net.sim.run(duration)
+        return seen
+
+    def test_probe_rtt(self):
+        # The min RTT filter expires after RTPROP_SEC, which must send BBR
+        # to PROBE_RTT and back to PROBE_BW
+        seen = self.modes(simulator.Bbr.RTPROP_SEC + 5)
+        self.assertEqual(seen[:3], ['startup', 'drain', 'probe_bw'])
+        self.assertIn('probe_rtt', seen)
+        self.assertEqual(seen[-1], 'probe_bw')
+
+
+if __name__ == '__main__':
+    unittest.main()
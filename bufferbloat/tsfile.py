@@ -0,0 +1,118 @@
+'''
+Append-only binary time series files.
+
+Layout: a small header followed by fixed-width little-endian records.
+
+    magic    4 bytes   b'TSF1'
+    hlen     uint32    length of the JSON header that follows
+    header   hlen      {"metric", "iface", "units", "columns", ...} as UTF-8 JSON
+    padding            zeros up to a multiple of 8 bytes
+    records            float64 timestamp + one float64 per column
+
+Records have a fixed size, so readers can map the file straight into
+arrays (see helper.read_series) without parsing anything.  A trailing
+partial record left by an interrupted writer is ignored.
+
+This module only uses the standard library so that the monitors can
+write series without pulling in numpy.
+'''
+
+from array import array
+import json
+import os
+import struct
+import sys
+
+MAGIC = b'TSF1'
+SUFFIX = '.bin'
+_PREFIX = struct.Struct('<4sI')
+
+
+def _header_bytes(header):
+    body = json.dumps(header, sort_keys=True).encode('utf-8')
+    raw = _PREFIX.pack(MAGIC, len(body)) + body
+    return raw + b'\0' * (-len(raw) % 8)
+
+
+def read_header(fname):
+    """Returns (header dict, offset of the first record)."""
+    with open(fname, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError('%s: not a time series file' % fname)
+        magic, hlen = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError('%s: not a time series file' % fname)
+        header = json.loads(f.read(hlen).decode('utf-8'))
+    offset = _PREFIX.size + hlen
+    return header, offset + (-offset % 8)
+
+
+def read_last(fname):
+    """Returns the last whole record as a (timestamp, value, ...) tuple,
+    or None if the file has no records yet."""
+    header, offset = read_header(fname)
+    record = struct.Struct('<%dd' % (1 + len(header['columns'])))
+    count = (os.path.getsize(fname) - offset) // record.size
+    if count <= 0:
+        return None
+    with open(fname, 'rb') as f:
+        f.seek(offset + (count - 1) * record.size)
+        return record.unpack(f.read(record.size))
+
+
+def is_series_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class SeriesWriter(object):
+    """Appends (timestamp, value, ...) records to a series file.
+
+    Reopening an existing file appends to it after checking that the
+    columns match.  Extra keyword arguments are stored in the header as
+    they are (e.g. the flow a series belongs to)."""
+
+    def __init__(self, fname, metric, iface='', units='', columns=('value',),
+                 buffering=1 << 16, **extra):
+        self.header = {'metric': metric, 'iface': iface, 'units': units,
+                       'columns': list(columns)}
+        self.header.update(extra)
+        self.record = struct.Struct('<%dd' % (1 + len(columns)))
+        exists = os.path.exists(fname) and os.path.getsize(fname) > 0
+        if exists:
+            old, offset = read_header(fname)
+            if old['columns'] != self.header['columns']:
+                raise ValueError('%s: columns %s do not match %s' %
+                                 (fname, old['columns'], list(columns)))
+            # Drop a partial record left by an interrupted writer
+            size = os.path.getsize(fname)
+            whole = offset + (size - offset) // self.record.size * self.record.size
+            if whole != size:
+                os.truncate(fname, whole)
+        self.f = open(fname, 'ab', buffering=buffering)
+        if not exists:
+            self.f.write(_header_bytes(self.header))
+
+    def append(self, t, *values):
+        self.f.write(self.record.pack(t, *values))
+
+    def extend(self, records):
+        """Appends whole records from a flat sequence t, values..., t,
+        values... (for writers that decode in batches)."""
+        records = array('d', records)
+        if sys.byteorder != 'little':
+            records.byteswap()
+        self.f.write(records.tobytes())
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
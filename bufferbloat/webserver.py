@@ -1,14 +1,212 @@
-import SimpleHTTPServer
-import SocketServer
+'''
+Static web server for the page fetches of the bufferbloat experiment.
+
+Serves the files next to this script (index.html) with asyncio, so
+overlapping fetches are handled concurrently instead of queuing behind a
+single blocking handler.  Connections are kept alive (HTTP/1.1, or
+HTTP/1.0 with "Connection: keep-alive").  Small files are kept in memory;
+larger ones go out with loop.sendfile(), which uses os.sendfile() and
+never copies the data through Python.
+
+With --log, every response appends one line
+
+    <epoch> <client> <target> <status> <bytes> <service_sec>
+
+where service_sec is the time from the end of the request headers until
+the response starts going out: the headers and the first chunk of the
+body (as much as the socket buffer takes) are in the kernel.  The rest of
+the transfer is paced by the network (cwnd, bottleneck), so it is left
+out.  bufferbloat.py subtracts service_sec from the fetch times measured
+by curl, leaving only the network part.
+
+    python3 webserver.py [--port 80] [--root DIR] [--log FILE]
+'''
+
+from argparse import ArgumentParser
+from email.utils import formatdate
+from time import perf_counter, time
+from urllib.parse import unquote, urlsplit
+import asyncio
+import mimetypes
+import os
 
 PORT = 80
+CACHE_MAX_SIZE = 64 * 1024    # files up to this size are served from memory
+MAX_HEADER_SIZE = 16 * 1024
+IDLE_TIMEOUT = 30.0
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 431: 'Request Header Fields Too Large'}
+
+
+class StaticServer(object):
+
+    def __init__(self, root, log=None):
+        self.root = os.path.realpath(root)
+        self.log = log
+        self.cache = {}         # path -> (mtime, size, data)
+
+    def resolve(self, target):
+        """Maps a request target to a file under root (None if missing)."""
+        path = unquote(urlsplit(target).path)
+        if path.endswith('/'):
+            path += 'index.html'
+        full = os.path.realpath(os.path.join(self.root, path.lstrip('/')))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            return None
+        if not os.path.isfile(full):
+            return None
+        return full
+
+    def cached(self, path, st):
+        entry = self.cache.get(path)
+        if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+            with open(path, 'rb') as f:
+                entry = (st.st_mtime_ns, st.st_size, f.read())
+            self.cache[path] = entry
+        return entry[2]
+
+    async def handle(self, reader, writer):
+        client = writer.get_extra_info('peername')
+        client = client[0] if client else '-'
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, client, '-', 431, perf_counter(), False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                start = perf_counter()
+                if not await self.serve(writer, client, head, start):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, writer, client, head, start):
+        """Answers one request; returns whether the connection stays open."""
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split()
+        except ValueError:
+            await self.respond(writer, client, '-', 400, start, False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = connection != 'close'
+        else:
+            keep_alive = connection == 'keep-alive'
+
+        if method not in ('GET', 'HEAD'):
+            await self.respond(writer, client, target, 405, start, keep_alive)
+            return keep_alive
+        path = self.resolve(target)
+        if path is None:
+            await self.respond(writer, client, target, 404, start, keep_alive)
+            return keep_alive
+
+        st = os.stat(path)
+        ctype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        # write() sends what the socket takes right away and buffers the
+        # rest; the service time ends there, the rest is network time
+        writer.write(self.header(200, st.st_size, keep_alive, ctype, st.st_mtime))
+        if method == 'HEAD':
+            service = perf_counter() - start
+        elif st.st_size <= CACHE_MAX_SIZE:
+            writer.write(self.cached(path, st))
+            service = perf_counter() - start
+        else:
+            with open(path, 'rb') as f:
+                sent = self.send_first(writer, f, st.st_size)
+                service = perf_counter() - start
+                if sent < st.st_size:
+                    await asyncio.get_running_loop().sendfile(writer.transport, f, sent)
+        await writer.drain()
+        self.log_request(client, target, 200, st.st_size if method == 'GET' else 0, service)
+        return keep_alive
+
+    def send_first(self, writer, f, size):
+        """Hands the first chunk of f to the kernel, as much as the socket
+        buffer takes without blocking; returns the bytes sent."""
+        sock = writer.get_extra_info('socket')
+        if sock is None or writer.transport.get_write_buffer_size():
+            return 0
+        try:
+            return os.sendfile(sock.fileno(), f.fileno(), 0, size)
+        except (BlockingIOError, InterruptedError):
+            return 0
+
+    async def respond(self, writer, client, target, status, start, keep_alive):
+        body = ('%d %s\n' % (status, REASONS[status])).encode()
+        writer.write(self.header(status, len(body), keep_alive, 'text/plain') + body)
+        service = perf_counter() - start
+        await writer.drain()
+        self.log_request(client, target, status, len(body), service)
+
+    def header(self, status, length, keep_alive, ctype, mtime=None):
+        lines = ['HTTP/1.1 %d %s' % (status, REASONS[status]),
+                 'Date: %s' % formatdate(usegmt=True),
+                 'Server: bufferbloat-webserver',
+                 'Content-Type: %s' % ctype,
+                 'Content-Length: %d' % length,
+                 'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+        if mtime is not None:
+            lines.append('Last-Modified: %s' % formatdate(mtime, usegmt=True))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    def log_request(self, client, target, status, nbytes, service):
+        if self.log is not None:
+            self.log.write('%.6f %s %s %d %d %.6f\n' % (
+                time(), client, target, status, nbytes, service))
+
+
+def read_service_times(fname):
+    """Returns {target: service_sec} from a --log file (last entry wins)."""
+    times = {}
+    with open(fname) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 6:
+                times[fields[2]] = float(fields[5])
+    return times
+
+
+async def serve_forever(host, port, root, log):
+    server = StaticServer(root, log)
+    httpd = await asyncio.start_server(server.handle, host, port,
+                                       limit=MAX_HEADER_SIZE, reuse_address=True)
+    print("Server1: httpd serving at port", port, flush=True)
+    async with httpd:
+        await httpd.serve_forever()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Static web server for the page fetches")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--bind', default='', help="Address to listen on (default: all)")
+    parser.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Directory to serve (default: the script's directory)")
+    parser.add_argument('--log', help="Append one line per request with its service time")
+    args = parser.parse_args(argv)
+
+    log = open(args.log, 'a', buffering=1) if args.log else None
+    try:
+        asyncio.run(serve_forever(args.bind or None, args.port, args.root, log))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log is not None:
+            log.close()
 
-class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
-    # Disable logging DNS lookups
-    def address_string(self):
-        return str(self.client_address[0])
 
-Handler = Handler
-httpd = SocketServer.TCPServer(("", PORT), Handler)
-print("Server1: httpd serving at port", PORT)
-httpd.serve_forever()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Cache endereçado por conteúdo para gerar_graficos_cen*.py.
+
+O relatório já lido fica guardado sob o hash do seu conteúdo e do código
+do report_parser.py, e cada gráfico sob o hash dos dados que recebe, do
+código do script que o desenha e da versão do matplotlib.  Assim, rodar
+de novo um script de gráficos só redesenha o que mudou.
+
+A implementação (ResultCache) é a de bufferbloat/cache.py, carregada
+daqui; este módulo só define o diretório padrão deste lado e as funções
+usadas pelos scripts.
+
+    python3 gerar_graficos_cen3.py c3_resultados.txt              # desenha tudo
+    python3 gerar_graficos_cen3.py c3_resultados.txt              # só copia os PNGs
+    python3 gerar_graficos_cen3.py c3_resultados.txt --no-cache
+    python3 cache.py stats
+    python3 cache.py clear
+
+O diretório padrão é ~/.cache/competicao-graficos, ou $CACHE_GRAFICOS.
+"""
+
+import importlib.util
+import os
+import sys
+
+# Pelo caminho do arquivo, e não com sys.path: um "import cache" daqui
+# encontraria este mesmo módulo
+_spec = importlib.util.spec_from_file_location(
+    'bufferbloat_cache',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bufferbloat', 'cache.py'))
+_impl = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_impl)
+
+DEFAULT_DIR = os.environ.get('CACHE_GRAFICOS',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'competicao-graficos'))
+DEFAULT_MAX_BYTES = 512 << 20
+
+
+class ResultCache(_impl.ResultCache):
+
+    def __init__(self, root=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(root, max_bytes)
+
+
+def cached_load(cache, loader, fname, *args):
+    """loader(fname, *args) pelo cache, ou direto se cache for None"""
+    if cache is None:
+        return loader(fname, *args)
+    return cache.load(loader, fname, *args)
+
+
+def cached_render(cache, out, draw, *args):
+    """draw(out, *args) pelo cache (ver ResultCache.render), ou direto se cache for None"""
+    if cache is None:
+        draw(out, *args)
+    elif cache.render(out, draw, *args):
+        print(f"Gráfico '{out}' copiado do cache.")
+
+
+if __name__ == '__main__':
+    _impl.main(['--dir', DEFAULT_DIR, '--max-mb', str(DEFAULT_MAX_BYTES / 2**20)] + sys.argv[1:])
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Simulação fluida (sem Mininet) da competição entre fluxos TCP.
+
+Todos os emissores do cenário transmitem ao mesmo tempo por um único
+gargalo (o link do servidor).  O estado de cada fluxo (cwnd, ssthresh,
+taxa de pacing, min_rtt, filtro de banda do BBR, ...) fica em vetores
+NumPy, e a cada tick (por padrão, um RTT base) todos os fluxos avançam
+juntos com operações vetorizadas.  Assim dá para simular centenas ou
+milhares de fluxos Reno/CUBIC/BBR em segundos.
+
+Modelo por tick:
+    - cada fluxo oferece min(cwnd/RTT, pacing) pacotes/s;
+    - a fila do link de acesso de cada emissor e a fila compartilhada do
+      gargalo são fluidas, com descarte no fim da fila (limite em pacotes);
+    - o gargalo atende os fluxos na proporção do que cada um colocou na
+      fila (aproximação de FIFO);
+    - a perda aleatória dos links (parâmetro "loss") é sorteada por pacote.
+
+A saída tem o mesmo formato das seções IPERF3 de tcp_simulation.py (um
+relatório de intervalos de 1 s por emissor, com o nome "{rótulo}_Throughput"),
+então os scripts gerar_graficos_cen*.py e report_parser leem o resultado
+sem mudanças.  Com --jsonl, grava também os registros de results_sink.
+
+Uso: python3 fluid_simulation.py cenarios/cen_escala.json [--time 30]
+"""
+
+import math
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from scenario import DEFAULT_SCENARIO, DEFAULT_SERVER_LINK, load_scenario, expand_senders
+from results_sink import JsonlSink
+
+MSS = 1448              # bytes de dados por pacote (o que o iperf3 conta)
+INIT_CWND = 10.0
+DEFAULT_QUEUE = 1000    # limite padrão da netem quando o link não define max_queue_size
+
+RENO, CUBIC, BBR = 0, 1, 2
+CC_CODES = {'reno': RENO, 'cubic': CUBIC, 'bbr': BBR}
+
+# Constantes do CUBIC (RFC 8312) e do BBR v1
+CUBIC_C = 0.4
+CUBIC_BETA = 0.7
+BBR_HIGH_GAIN = 2 / math.log(2)
+BBR_CYCLE = np.array([1.25, 0.75, 1, 1, 1, 1, 1, 1])
+BBR_BW_ROUNDS = 10
+BBR_RTPROP_SEC = 10.0
+BBR_PROBE_RTT_SEC = 0.2
+BBR_MIN_CWND = 4.0
+STARTUP, DRAIN, PROBE_BW, PROBE_RTT = 0, 1, 2, 3
+
+
+def parse_delay(value):
+    """'5ms' / '0.005s' / 5 (ms) -> segundos"""
+    if isinstance(value, (int, float)):
+        return value / 1000.0
+    value = value.strip()
+    if value.endswith('ms'):
+        return float(value[:-2]) / 1000.0
+    if value.endswith('us'):
+        return float(value[:-2]) / 1e6
+    if value.endswith('s'):
+        return float(value[:-1])
+    return float(value) / 1000.0
+
+
+def link_rate(link):
+    """Taxa do link em pacotes/s"""
+    return link['bw'] * 1e6 / 8 / MSS
+
+
+class FluidSim(object):
+    """Estado vetorizado de N fluxos competindo por um gargalo."""
+
+    def __init__(self, senders, server_link, tick=None, seed=None):
+        n = len(senders)
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.cc = np.array([CC_CODES[s['cc'].lower()] for s in senders])
+        self.is_reno = self.cc == RENO
+        self.is_cubic = self.cc == CUBIC
+        self.is_bbr = self.cc == BBR
+
+        # Links: TCLink aplica o atraso nos dois sentidos de cada link
+        srv_delay = parse_delay(server_link.get('delay', 0))
+        acc_delay = np.array([parse_delay(s['link'].get('delay', 0)) for s in senders])
+        self.base_rtt = 2 * (acc_delay + srv_delay)
+        self.acc_rate = np.array([link_rate(s['link']) for s in senders])
+        self.acc_limit = np.array([float(s['link'].get('max_queue_size') or DEFAULT_QUEUE)
+                                   for s in senders])
+        self.srv_rate = link_rate(server_link)
+        self.srv_limit = float(server_link.get('max_queue_size') or DEFAULT_QUEUE)
+        acc_loss = np.array([s['link'].get('loss', 0) / 100.0 for s in senders])
+        self.loss_p = 1 - (1 - acc_loss) * (1 - server_link.get('loss', 0) / 100.0)
+        self.tick = tick or float(self.base_rtt.min())
+
+        # Estado comum
+        self.cwnd = np.full(n, INIT_CWND)
+        self.ssthresh = np.full(n, np.inf)
+        self.acc_q = np.zeros(n)
+        self.srv_q = 0.0
+        self.rtt = self.base_rtt.copy()
+        self.last_reduction = np.full(n, -np.inf)
+
+        # CUBIC
+        self.w_max = np.zeros(n)
+        self.epoch = np.full(n, np.nan)
+        self.k = np.zeros(n)
+        self.origin = np.zeros(n)
+
+        # BBR: filtro de máximo da banda entregue nos últimos BBR_BW_ROUNDS ticks
+        self.bw_ring = np.zeros((BBR_BW_ROUNDS, n))
+        self.btl_bw = np.zeros(n)
+        self.min_rtt = self.base_rtt.copy()
+        self.min_rtt_stamp = np.zeros(n)
+        self.mode = np.full(n, STARTUP)
+        self.pacing_gain = np.full(n, BBR_HIGH_GAIN)
+        self.cwnd_gain = np.full(n, BBR_HIGH_GAIN)
+        self.full_bw = np.zeros(n)
+        self.full_bw_count = np.zeros(n, dtype=int)
+        # Cada fluxo começa o ciclo do PROBE_BW numa fase diferente (menos a de 0.75)
+        self.cycle_index = self.rng.choice([0, 2, 3, 4, 5, 6, 7], size=n)
+        self.cycle_stamp = np.zeros(n)
+        self.probe_rtt_until = np.zeros(n)
+        self.prior_cwnd = np.zeros(n)
+
+        self.steps = 0
+
+    def step(self, t):
+        """Avança todos os fluxos um tick; devolve (entregues, perdidos) em pacotes."""
+        dt = self.tick
+        n = self.n
+        bbr = self.is_bbr
+
+        # RTT visto por cada fluxo: base + filas do acesso e do gargalo
+        self.rtt = self.base_rtt + self.acc_q / self.acc_rate + self.srv_q / self.srv_rate
+        rate = self.cwnd / self.rtt
+        if bbr.any():
+            pacing = np.where(self.btl_bw > 0, self.pacing_gain * self.btl_bw,
+                              BBR_HIGH_GAIN * INIT_CWND / self.base_rtt)
+            rate = np.where(bbr, np.minimum(pacing, rate), rate)
+        sent = rate * dt
+
+        # Fila do link de acesso (uma por emissor)
+        backlog = self.acc_q + sent
+        out = np.minimum(backlog, self.acc_rate * dt)
+        self.acc_q = backlog - out
+        acc_drop = np.maximum(self.acc_q - self.acc_limit, 0)
+        self.acc_q -= acc_drop
+
+        # Fila compartilhada do gargalo
+        arrived = out.sum()
+        share = out / arrived if arrived > 0 else np.zeros(n)
+        backlog = self.srv_q + arrived
+        served = min(backlog, self.srv_rate * dt)
+        self.srv_q = backlog - served
+        srv_drop = max(self.srv_q - self.srv_limit, 0.0)
+        self.srv_q -= srv_drop
+
+        # Perda aleatória sorteada por pacote enviado
+        rand_loss = self.rng.binomial(np.floor(sent).astype(np.int64), self.loss_p)
+        lost = acc_drop + srv_drop * share + rand_loss
+        delivered = np.maximum(served * share - rand_loss, 0)
+
+        # No máximo uma redução por RTT, como na recuperação rápida
+        loss_event = self.rng.random(n) < -np.expm1(-lost)
+        loss_event &= (t - self.last_reduction) > self.rtt
+        self.last_reduction = np.where(loss_event, t, self.last_reduction)
+
+        self._update_reno_cubic(t, delivered, loss_event)
+        if bbr.any():
+            self._update_bbr(t, delivered, dt)
+        self.steps += 1
+        return delivered, lost
+
+    def _update_reno_cubic(self, t, delivered, loss_event):
+        cwnd = self.cwnd
+        aimd = ~self.is_bbr
+        slow = aimd & (cwnd < self.ssthresh) & ~loss_event
+        avoid = aimd & (cwnd >= self.ssthresh) & ~loss_event
+
+        # Partida lenta: +1 pacote por pacote confirmado
+        cwnd[slow] += delivered[slow]
+
+        # Reno: +1 pacote por RTT
+        reno = avoid & self.is_reno
+        cwnd[reno] += delivered[reno] / cwnd[reno]
+
+        # CUBIC: janela alvo W(t) = C (t - K)^3 + W_max, com a região amigável ao TCP
+        cubic = avoid & self.is_cubic
+        if cubic.any():
+            new_epoch = cubic & np.isnan(self.epoch)
+            if new_epoch.any():
+                self.epoch[new_epoch] = t
+                below = new_epoch & (cwnd < self.w_max)
+                self.k[new_epoch] = np.where(
+                    below[new_epoch],
+                    np.cbrt(np.maximum(self.w_max[new_epoch] - cwnd[new_epoch], 0) / CUBIC_C), 0)
+                self.origin[new_epoch] = np.maximum(self.w_max[new_epoch], cwnd[new_epoch])
+            te = t - self.epoch[cubic] + self.min_rtt[cubic]
+            target = self.origin[cubic] + CUBIC_C * (te - self.k[cubic]) ** 3
+            friendly = (self.w_max[cubic] * CUBIC_BETA +
+                        3 * (1 - CUBIC_BETA) / (1 + CUBIC_BETA) * te / self.rtt[cubic])
+            target = np.maximum(target, friendly)
+            w = cwnd[cubic]
+            grow = np.where(target > w, (target - w) / w, 0.01 / w)
+            cwnd[cubic] = w + delivered[cubic] * grow
+
+        # Perda: Reno divide por 2, CUBIC multiplica por beta
+        cut = aimd & loss_event
+        if cut.any():
+            cubic_cut = cut & self.is_cubic
+            fast_conv = cubic_cut & (cwnd < self.w_max)
+            self.w_max[cubic_cut] = np.where(fast_conv[cubic_cut],
+                                             cwnd[cubic_cut] * (1 + CUBIC_BETA) / 2,
+                                             cwnd[cubic_cut])
+            self.epoch[cubic_cut] = np.nan
+            beta = np.where(self.is_cubic, CUBIC_BETA, 0.5)
+            self.ssthresh[cut] = np.maximum(cwnd[cut] * beta[cut], 2.0)
+            cwnd[cut] = self.ssthresh[cut]
+
+    def _update_bbr(self, t, delivered, dt):
+        bbr = self.is_bbr
+        cwnd = self.cwnd
+
+        # Filtro de máximo da taxa de entrega e de mínimo do RTT
+        self.bw_ring[self.steps % BBR_BW_ROUNDS] = delivered / dt
+        self.btl_bw = self.bw_ring.max(axis=0)
+        # O vencimento do filtro é decidido antes da nova amostra renovar
+        # min_rtt_stamp: ele também leva a PROBE_RTT (bbr_update_min_rtt)
+        expired = t - self.min_rtt_stamp > BBR_RTPROP_SEC
+        fresh = ((self.rtt < self.min_rtt) | expired) & (self.mode != PROBE_RTT)
+        self.min_rtt = np.where(fresh, self.rtt, self.min_rtt)
+        self.min_rtt_stamp = np.where(fresh, t, self.min_rtt_stamp)
+        bdp = self.btl_bw * self.min_rtt
+
+        # STARTUP -> DRAIN quando a banda para de crescer 25% por 3 rodadas
+        startup = bbr & (self.mode == STARTUP)
+        grew = self.btl_bw >= self.full_bw * 1.25
+        self.full_bw = np.where(startup & grew, self.btl_bw, self.full_bw)
+        self.full_bw_count = np.where(startup & grew, 0, self.full_bw_count + startup)
+        to_drain = startup & (self.full_bw_count >= 3)
+        self.mode[to_drain] = DRAIN
+        self.pacing_gain[to_drain] = 1 / BBR_HIGH_GAIN
+
+        # DRAIN -> PROBE_BW quando o que está em trânsito cabe no BDP
+        inflight = np.minimum(cwnd, self.btl_bw * self.rtt)
+        to_probe = bbr & (self.mode == DRAIN) & (inflight <= bdp)
+        self._enter_probe_bw(to_probe, t)
+
+        # PROBE_BW: troca de fase do ciclo de ganhos a cada min_rtt
+        cycling = bbr & (self.mode == PROBE_BW) & (t - self.cycle_stamp >= self.min_rtt)
+        self.cycle_index[cycling] = (self.cycle_index[cycling] + 1) % len(BBR_CYCLE)
+        self.cycle_stamp[cycling] = t
+        probing = bbr & (self.mode == PROBE_BW)
+        self.pacing_gain[probing] = BBR_CYCLE[self.cycle_index[probing]]
+
+        # PROBE_RTT: min_rtt sem atualização há 10 s
+        to_probe_rtt = bbr & (self.mode != PROBE_RTT) & expired
+        self.prior_cwnd[to_probe_rtt] = cwnd[to_probe_rtt]
+        self.mode[to_probe_rtt] = PROBE_RTT
+        self.pacing_gain[to_probe_rtt] = 1.0
+        self.probe_rtt_until[to_probe_rtt] = t + BBR_PROBE_RTT_SEC + self.rtt[to_probe_rtt]
+        done = bbr & (self.mode == PROBE_RTT) & (t >= self.probe_rtt_until)
+        self.min_rtt_stamp[done] = t
+        cwnd[done] = np.maximum(cwnd[done], self.prior_cwnd[done])
+        self._enter_probe_bw(done & (self.full_bw_count >= 3), t)
+        restart = done & (self.full_bw_count < 3)
+        self.mode[restart] = STARTUP
+        self.pacing_gain[restart] = self.cwnd_gain[restart] = BBR_HIGH_GAIN
+
+        # cwnd = ganho * BDP (+3 pacotes de folga); na partida cresce com as confirmações
+        target = self.cwnd_gain * bdp + 3
+        growing = bbr & (self.mode == STARTUP) & (cwnd < target)
+        cwnd[growing] += delivered[growing]
+        steady = bbr & ~growing & (self.btl_bw > 0)
+        cwnd[steady] = np.minimum(cwnd[steady] + delivered[steady], target[steady])
+        in_probe_rtt = bbr & (self.mode == PROBE_RTT)
+        cwnd[in_probe_rtt] = BBR_MIN_CWND
+        cwnd[bbr] = np.maximum(cwnd[bbr], BBR_MIN_CWND)
+
+    def _enter_probe_bw(self, mask, t):
+        self.mode[mask] = PROBE_BW
+        self.cwnd_gain[mask] = 2.0
+        self.cycle_stamp[mask] = t
+        self.pacing_gain[mask] = BBR_CYCLE[self.cycle_index[mask]]
+
+
+def run(senders, server_link, duration, tick=None, seed=None, interval=1.0):
+    """
+    Simula `duration` segundos e devolve (sim, resultados): o FluidSim no
+    estado final e os intervalos de cada fluxo no formato de
+    results_sink.parse_iperf_json, uma lista de
+    {'intervals': [...], 'sent': {...}, 'received': {...}}.
+    """
+    sim = FluidSim(senders, server_link, tick, seed)
+    # Ajusta o passo para dividir o intervalo de relatório exatamente
+    per_interval = max(int(math.ceil(interval / sim.tick - 1e-9)), 1)
+    sim.tick = interval / per_interval
+    n = sim.n
+    nticks = int(round(duration / sim.tick))
+
+    acc_bytes = np.zeros(n)
+    acc_lost = np.zeros(n)
+    total_bytes = np.zeros(n)
+    total_lost = np.zeros(n)
+    intervals = [[] for _ in range(n)]
+    start = 0.0
+    for i in range(1, nticks + 1):
+        t = i * sim.tick
+        delivered, lost = sim.step(t)
+        acc_bytes += delivered * MSS
+        acc_lost += lost
+        if i % per_interval == 0 or i == nticks:
+            length = t - start
+            retrans = np.floor(total_lost + acc_lost) - np.floor(total_lost)
+            for f in range(n):
+                intervals[f].append({
+                    'start': start, 'end': t, 'bytes': int(acc_bytes[f]),
+                    'bits_per_second': acc_bytes[f] * 8 / length,
+                    'retransmits': int(retrans[f]),
+                    'snd_cwnd': int(sim.cwnd[f] * MSS)})
+            total_bytes += acc_bytes
+            total_lost += acc_lost
+            acc_bytes[:] = 0
+            acc_lost[:] = 0
+            start = t
+
+    results = []
+    for f in range(n):
+        sent = {'seconds': duration, 'bytes': int(total_bytes[f]),
+                'bits_per_second': total_bytes[f] * 8 / duration,
+                'retransmits': int(total_lost[f])}
+        received = {'seconds': duration + sim.base_rtt[f] / 2, 'bytes': int(total_bytes[f]),
+                    'bits_per_second': total_bytes[f] * 8 / (duration + sim.base_rtt[f] / 2)}
+        results.append({'intervals': intervals[f], 'sent': sent, 'received': received})
+    return sim, results
+
+
+def format_value(value):
+    # Três algarismos significativos, como o iperf3
+    if value < 9.995:
+        return '%.2f' % value
+    if value < 99.95:
+        return '%.1f' % value
+    return '%.0f' % value
+
+
+def format_bytes(n):
+    for unit, size in (('GBytes', 1 << 30), ('MBytes', 1 << 20), ('KBytes', 1 << 10)):
+        if n >= size:
+            return '%s %s' % (format_value(n / size), unit)
+    return '%d Bytes' % n
+
+
+def format_bitrate(bps):
+    for unit, size in (('Gbits/sec', 1e9), ('Mbits/sec', 1e6), ('Kbits/sec', 1e3)):
+        if bps >= size:
+            return '%s %s' % (format_value(bps / size), unit)
+    return '%s bits/sec' % format_value(bps)
+
+
+def format_iperf(result, client_ip, server_ip, port=5001, stream=5):
+    """Texto de um teste iperf3 (cliente), com o mesmo layout da ferramenta."""
+    sid = '[%3d]' % stream
+    lines = ['Connecting to host %s, port %d' % (server_ip, port),
+             '%s local %s port %d connected to %s port %d' % (sid, client_ip, 40000 + stream,
+                                                              server_ip, port),
+             '[ ID] Interval           Transfer     Bitrate         Retr  Cwnd']
+    for iv in result['intervals']:
+        lines.append('%s %6.2f-%-6.2f sec  %s  %s  %3d   %s       ' % (
+            sid, iv['start'], iv['end'], format_bytes(iv['bytes']),
+            format_bitrate(iv['bits_per_second']), iv['retransmits'],
+            format_bytes(iv['snd_cwnd'])))
+    sent, received = result['sent'], result['received']
+    lines += ['- - - - - - - - - - - - - - - - - - - - - - - - -',
+              '[ ID] Interval           Transfer     Bitrate         Retr',
+              '%s %6.2f-%-6.2f sec  %s  %s  %3d             sender' % (
+                  sid, 0, sent['seconds'], format_bytes(sent['bytes']),
+                  format_bitrate(sent['bits_per_second']), sent['retransmits']),
+              '%s %6.2f-%-6.2f sec  %s  %s                  receiver' % (
+                  sid, 0, received['seconds'], format_bytes(received['bytes']),
+                  format_bitrate(received['bits_per_second'])),
+              '', 'iperf Done.']
+    return '\n'.join(lines)
+
+
+def format_rtt(rtt_ms):
+    return 'rtt min/avg/max/mdev = %.3f/%.3f/%.3f/%.3f ms' % (rtt_ms, rtt_ms, rtt_ms, 0.0)
+
+
+def main(argv=None):
+    """Função principal do script"""
+
+    parser = argparse.ArgumentParser(description="Simulação fluida da competição TCP (sem Mininet)")
+    parser.add_argument('scenario', nargs='?', default=DEFAULT_SCENARIO,
+                        help="Arquivo de cenário (.json, .toml ou .yaml)")
+    parser.add_argument('--time', type=float, default=None,
+                        help="Duração em segundos (padrão: a da fase iperf do cenário, ou 30)")
+    parser.add_argument('--tick', type=float, default=None,
+                        help="Passo da simulação em ms (padrão: o menor RTT base)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Semente das perdas aleatórias")
+    parser.add_argument('--out', default=None,
+                        help="Relatório em texto (padrão: /tmp/tcp_fluid_<data>.txt)")
+    parser.add_argument('--jsonl', default=None,
+                        help="Grava também os registros JSON lines neste arquivo")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario)
+    senders = expand_senders(scenario)
+    server_link = scenario.get('server_link', DEFAULT_SERVER_LINK)
+    duration = args.time
+    if duration is None:
+        iperf = [p for p in scenario.get('phases', []) if p['type'] == 'iperf']
+        duration = iperf[0].get('duration', 30) if iperf else 30
+    tick = args.tick / 1000.0 if args.tick else None
+    title = scenario.get('title', 'TCP')
+    output_file = args.out or f"/tmp/tcp_fluid_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+
+    print(f"=== SIMULAÇÃO FLUIDA {title} ({len(senders)} fluxos) ===")
+    started = datetime.now()
+    sim, results = run(senders, server_link, duration, tick, args.seed)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"{len(senders)} fluxos, {duration:g} s simulados em {elapsed:.2f} s "
+          f"({sim.steps} ticks de {sim.tick * 1000:.1f} ms)")
+
+    server_ip = f'10.0.0.{len(senders) + 1}'
+    sink = JsonlSink(args.jsonl) if args.jsonl else None
+    with open(output_file, 'w') as f:
+        f.write(f"=== RELATÓRIO DE COMPARAÇÃO {title} (SIMULAÇÃO FLUIDA) ===\n")
+        f.write(f"Data/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write("=" * 50 + "\n\n")
+        for sender in senders:
+            f.write(f"{sender['name']} TCP Config: net.ipv4.tcp_congestion_control = {sender['cc']}\n")
+            if sink is not None:
+                sink.write('config', host=sender['name'], cc=sender['cc'])
+        f.write("\n")
+        # Latência com as filas vazias (antes e depois da competição)
+        for stage in ('', '_Final'):
+            for sender, rtt in zip(senders, sim.base_rtt):
+                f.write(f"=== LATÊNCIA {sender['label']}{stage} ===\n{format_rtt(rtt * 1000)}\n")
+                if sink is not None:
+                    sink.write('latency', test=sender['label'] + stage, min=rtt * 1000,
+                               avg=rtt * 1000, max=rtt * 1000, mdev=0.0, loss=0.0)
+        for i, (sender, result) in enumerate(zip(senders, results)):
+            name = f"{sender['label']}_Throughput"
+            f.write(f"=== IPERF3 {name} ===\n")
+            f.write(format_iperf(result, f'10.0.0.{i + 1}', server_ip) + "\n\n")
+            if sink is not None:
+                sink.write('iperf', test=name, **result)
+        f.write("\n=== FIM DO RELATÓRIO ===\n")
+    if sink is not None:
+        sink.close()
+
+    # Resumo: vazão média por algoritmo e índice de justiça de Jain
+    rates = np.array([r['sent']['bits_per_second'] for r in results]) / 1e6
+    for cc in sorted(set(s['cc'] for s in senders)):
+        mask = np.array([s['cc'] == cc for s in senders])
+        print(f"{cc}: {mask.sum()} fluxos, média {rates[mask].mean():.3f} Mbits/s, "
+              f"total {rates[mask].sum():.2f} Mbits/s")
+    jain = rates.sum() ** 2 / (len(rates) * (rates ** 2).sum()) if rates.any() else 0
+    print(f"Índice de justiça de Jain: {jain:.3f}")
+    print(f"Resultados salvos em: {output_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,14 @@
-import re
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+from report_parser import load_report, iperf_series, summary_stats, latency_avg
+from cache import ResultCache, cached_load, cached_render
+
 # Define um estilo visual para os gráficos
 plt.style.use('seaborn-v0_8-whitegrid')
 
-def normalize_to_mbits(value_str, unit_str):
-    """Converte um valor de Kbits ou bits para Mbits."""
-    value = float(value_str)
-    unit = unit_str.upper()
-    if unit == 'K':
-        return value / 1000.0
-    elif unit == '': # bits/sec
-        return value / 1000000.0
-    return value # Mbits/sec
-
-def parse_iperf_data(content, protocol_id):
-    """
-    Extrai dados de vazão e retransmissão, agora mais robusto para diferentes unidades.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {protocol_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-
-    if not section_match:
-        print(f"Aviso: Seção iperf para {protocol_id} não encontrada.")
-        return {'times': [], 'bitrates': [], 'retrs': []}
-
-    section_content = section_match.group(1)
-
-    # Regex aprimorada para capturar Mbits, Kbits ou bits/sec
-    line_pattern = re.compile(r"\[\s*\d+\]\s+[\d\.]+-([\d\.]+)\s+sec.*\s+([\d\.]+)\s+([KM]?)bits/sec\s+(\d+)")
-
-    times, bitrates, retrs = [], [], []
-    for line in section_content.splitlines():
-        match = line_pattern.search(line)
-        if match:
-            times.append(float(match.group(1)))
-            # Normaliza a vazão para Mbits/sec
-            bitrate = normalize_to_mbits(match.group(2), match.group(3))
-            bitrates.append(bitrate)
-            retrs.append(int(match.group(4)))
-
-    return {'times': times, 'bitrates': bitrates, 'retrs': retrs}
-
-def parse_summary_stats(content, protocol_id):
-    """
-    Extrai a vazão média final e o total de retransmissões com regex mais flexível.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {protocol_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-    if not section_match:
-        return None
-
-    summary_pattern = re.compile(r"\[\s+\d+\]\s+0\.00-[\d\.]+\s+sec.*?([\d\.]+)\s+Mbits/sec\s+(\d+)\s+sender")
-    match = summary_pattern.search(section_match.group(1))
-
-    if match:
-        avg_bitrate = float(match.group(1))
-        total_retr = int(match.group(2))
-        return {'avg_bitrate': avg_bitrate, 'total_retr': total_retr}
-    
-    print(f"Aviso: Estatísticas de resumo para {protocol_id} não encontradas.")
-    return {'avg_bitrate': 0, 'total_retr': 0}
-
-def parse_latency(content, protocol_id, stage):
-    """
-    Extrai a latência média (RTT) com regex que ignora textos extras como (Reno).
-    """
-    # Regex flexível para o título da seção
-    pattern_str = f"=== LATÊNCIA {protocol_id}.*{stage}.*===\s+rtt min/avg/max/mdev = .*?/([\d\.]+)/.*/.*ms"
-    pattern = re.compile(pattern_str)
-    match = pattern.search(content)
-
-    if match:
-        return float(match.group(1))
-    
-    print(f"Aviso: Latência para {protocol_id} ({stage}) não encontrada.")
-    return 0
-
-def plot_throughput_over_time(reno_data, bbr_data):
+def plot_throughput_over_time(out, reno_data, bbr_data):
     """Gera o gráfico de vazão ao longo do tempo."""
     plt.figure(figsize=(12, 7))
     plt.plot(reno_data['times'], reno_data['bitrates'], marker='x', linestyle='--', label='TCP Reno (H1)', color='red')
@@ -89,10 +19,10 @@ def plot_throughput_over_time(reno_data, bbr_data):
     plt.legend()
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
-    plt.savefig('grafico_vazao_tempo.png')
-    print("Gráfico 'grafico_vazao_tempo.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_retransmissions_over_time(reno_data, bbr_data):
+def plot_retransmissions_over_time(out, reno_data, bbr_data):
     """
     Gera o gráfico de retransmissões, com proteção contra listas de tamanhos diferentes.
     """
@@ -126,10 +56,10 @@ def plot_retransmissions_over_time(reno_data, bbr_data):
     plt.xticks([r + bar_width/2 for r in range(max_len)], [int(t) for t in xtick_labels], rotation=45)
     plt.legend()
     plt.tight_layout()
-    plt.savefig('grafico_retransmissoes_tempo.png')
-    print("Gráfico 'grafico_retransmissoes_tempo.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_summary_metrics(reno_summary, bbr_summary):
+def plot_summary_metrics(out, reno_summary, bbr_summary):
     """Gera gráficos de barra com as métricas de resumo."""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
     fig.suptitle('Resumo do Desempenho: Vazão Média e Retransmissões Totais', fontsize=16)
@@ -154,10 +84,10 @@ def plot_summary_metrics(reno_summary, bbr_summary):
         ax2.text(i, v + 1, str(v), ha='center', va='bottom')
 
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig('grafico_resumo_desempenho.png')
-    print("Gráfico 'grafico_resumo_desempenho.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_latency_comparison(latencies):
+def plot_latency_comparison(out, latencies):
     """Gera o gráfico comparativo de latência."""
     labels = ['Reno (Inicial)', 'BBR (Inicial)', 'Reno (Final)', 'BBR (Final)']
     values = [latencies['reno_initial'], latencies['bbr_initial'], latencies['reno_final'], latencies['bbr_final']]
@@ -173,47 +103,51 @@ def plot_latency_comparison(latencies):
         plt.text(bar.get_x() + bar.get_width()/2.0, yval + 0.1, f'{yval:.2f}', ha='center', va='bottom')
         
     plt.tight_layout()
-    plt.savefig('grafico_comparativo_latencia.png')
-    print("Gráfico 'grafico_comparativo_latencia.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
 
 if __name__ == '__main__':
+    # Relatório em texto (padrão) ou JSON lines gerado com --jsonl
+    # --no-cache desenha todos os gráficos de novo (ver cache.py)
+    args = [a for a in sys.argv[1:] if a != '--no-cache']
+    report_file = args[0] if args else 'c1_resultados.txt'
+    cache = None if '--no-cache' in sys.argv else ResultCache()
     try:
-        with open('c2_resultados.txt', 'r') as f:
-            content = f.read()
+        # Lê o relatório uma única vez
+        report = cached_load(cache, load_report, report_file)
 
-        # Parsear todos os dados com as funções corrigidas
-        reno_iperf_data = parse_iperf_data(content, 'H1')
-        bbr_iperf_data = parse_iperf_data(content, 'H2')
+        reno_iperf_data = iperf_series(report, 'H1')
+        bbr_iperf_data = iperf_series(report, 'H2')
 
-        reno_summary = parse_summary_stats(content, 'H1')
-        bbr_summary = parse_summary_stats(content, 'H2')
+        reno_summary = summary_stats(report, 'H1')
+        bbr_summary = summary_stats(report, 'H2')
         
         latencies = {
-            'reno_initial': parse_latency(content, 'H1', ''),
-            'bbr_initial': parse_latency(content, 'H2', ''),
-            'reno_final': parse_latency(content, 'H1', 'Final'),
-            'bbr_final': parse_latency(content, 'H2', 'Final')
+            'reno_initial': latency_avg(report, 'H1', ''),
+            'bbr_initial': latency_avg(report, 'H2', ''),
+            'reno_final': latency_avg(report, 'H1', 'Final'),
+            'bbr_final': latency_avg(report, 'H2', 'Final')
         }
 
         # Gerar os gráficos
         if reno_iperf_data['times'] and bbr_iperf_data['times']:
-            plot_throughput_over_time(reno_iperf_data, bbr_iperf_data)
-            plot_retransmissions_over_time(reno_iperf_data, bbr_iperf_data)
+            cached_render(cache, 'grafico_vazao_tempo.png', plot_throughput_over_time, reno_iperf_data, bbr_iperf_data)
+            cached_render(cache, 'grafico_retransmissoes_tempo.png', plot_retransmissions_over_time, reno_iperf_data, bbr_iperf_data)
         else:
             print("Não foi possível gerar gráficos ao longo do tempo por falta de dados.")
 
         if reno_summary and bbr_summary:
-            plot_summary_metrics(reno_summary, bbr_summary)
+            cached_render(cache, 'grafico_resumo_desempenho.png', plot_summary_metrics, reno_summary, bbr_summary)
         else:
             print("Não foi possível gerar gráfico de resumo por falta de dados.")
             
         if all(latencies.values()):
-            plot_latency_comparison(latencies)
+            cached_render(cache, 'grafico_comparativo_latencia.png', plot_latency_comparison, latencies)
         else:
             print("Não foi possível gerar gráfico de latência por falta de dados.")
 
     except FileNotFoundError:
-        print("Erro: O arquivo 'c1_resultados.txt' não foi encontrado.")
+        print(f"Erro: O arquivo '{report_file}' não foi encontrado.")
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}")
\ No newline at end of file
@@ -1,86 +1,13 @@
-import re
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+from report_parser import load_report, iperf_series, summary_stats, latency_avg
+from cache import ResultCache, cached_load, cached_render
+
 # Define um estilo visual para os gráficos
 plt.style.use('seaborn-v0_8-whitegrid')
 
-def normalize_to_mbits(value_str, unit_str):
-    """Converte um valor de Kbits ou bits para Mbits."""
-    value = float(value_str)
-    unit = unit_str.upper()
-    if unit == 'K':
-        return value / 1000.0
-    elif unit == '': # bits/sec
-        return value / 1000000.0
-    return value # Mbits/sec
-
-def parse_iperf_data(content, host_id):
-    """
-    Extrai dados de vazão e retransmissão para um host específico.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {host_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-
-    if not section_match:
-        print(f"Aviso: Seção iperf para {host_id} não encontrada.")
-        return {'times': [], 'bitrates': [], 'retrs': []}
-
-    section_content = section_match.group(1)
-
-    # Regex aprimorada para capturar Mbits, Kbits ou bits/sec
-    line_pattern = re.compile(r"\[\s*\d+\]\s+[\d\.]+-([\d\.]+)\s+sec.*\s+([\d\.]+)\s+([KM]?)bits/sec\s+(\d+)")
-
-    times, bitrates, retrs = [], [], []
-    for line in section_content.splitlines():
-        match = line_pattern.search(line)
-        if match:
-            times.append(float(match.group(1)))
-            # Normaliza a vazão para Mbits/sec
-            bitrate = normalize_to_mbits(match.group(2), match.group(3))
-            bitrates.append(bitrate)
-            retrs.append(int(match.group(4)))
-
-    return {'times': times, 'bitrates': bitrates, 'retrs': retrs}
-
-def parse_summary_stats(content, host_id):
-    """
-    Extrai a vazão média final e o total de retransmissões para um host específico.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {host_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-    if not section_match:
-        return None
-
-    summary_pattern = re.compile(r"\[\s+\d+\]\s+0\.00-[\d\.]+\s+sec.*?([\d\.]+)\s+Mbits/sec\s+(\d+)\s+sender")
-    match = summary_pattern.search(section_match.group(1))
-
-    if match:
-        avg_bitrate = float(match.group(1))
-        total_retr = int(match.group(2))
-        return {'avg_bitrate': avg_bitrate, 'total_retr': total_retr}
-    
-    print(f"Aviso: Estatísticas de resumo para {host_id} não encontradas.")
-    return {'avg_bitrate': 0, 'total_retr': 0}
-
-def parse_latency(content, host_id, stage):
-    """
-    Extrai a latência média (RTT) para um host específico.
-    """
-    if stage == 'Final':
-        pattern_str = f"=== LATÊNCIA {host_id}_Final ===\s+rtt min/avg/max/mdev = .*?/([\d\.]+)/.*/.*ms"
-    else:
-        pattern_str = f"=== LATÊNCIA {host_id} ===\s+rtt min/avg/max/mdev = .*?/([\d\.]+)/.*/.*ms"
-    
-    pattern = re.compile(pattern_str)
-    match = pattern.search(content)
-
-    if match:
-        return float(match.group(1))
-    
-    print(f"Aviso: Latência para {host_id} ({stage}) não encontrada.")
-    return 0
-
 def combine_protocol_data(data_list):
     """
     Combina dados de múltiplos hosts do mesmo protocolo.
@@ -115,7 +42,7 @@ def combine_protocol_data(data_list):
     
     return {'times': combined_times, 'bitrates': combined_bitrates, 'retrs': combined_retrs}
 
-def plot_throughput_over_time(reno_data, bbr_data):
+def plot_throughput_over_time(out, reno_data, bbr_data):
     """Gera o gráfico de vazão ao longo do tempo."""
     plt.figure(figsize=(12, 7))
     plt.plot(reno_data['times'], reno_data['bitrates'], marker='x', linestyle='--', label='TCP Reno (média)', color='red')
@@ -126,10 +53,10 @@ def plot_throughput_over_time(reno_data, bbr_data):
     plt.legend()
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
-    plt.savefig('grafico_vazao_tempo_cen2.png')
-    print("Gráfico 'grafico_vazao_tempo_cen2.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_retransmissions_over_time(reno_data, bbr_data):
+def plot_retransmissions_over_time(out, reno_data, bbr_data):
     """
     Gera o gráfico de retransmissões ao longo do tempo.
     """
@@ -159,10 +86,10 @@ def plot_retransmissions_over_time(reno_data, bbr_data):
     plt.xticks([r + bar_width/2 for r in range(max_len)], [int(t) for t in xtick_labels], rotation=45)
     plt.legend()
     plt.tight_layout()
-    plt.savefig('grafico_retransmissoes_tempo_cen2.png')
-    print("Gráfico 'grafico_retransmissoes_tempo_cen2.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_summary_metrics(reno_summaries, bbr_summaries):
+def plot_summary_metrics(out, reno_summaries, bbr_summaries):
     """Gera gráficos de barra com as métricas de resumo agregadas."""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
     fig.suptitle('Resumo do Desempenho: Vazão Média e Retransmissões Totais (Cenário 2x2)', fontsize=16)
@@ -194,10 +121,10 @@ def plot_summary_metrics(reno_summaries, bbr_summaries):
         ax2.text(i, v + 1, str(v), ha='center', va='bottom')
 
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig('grafico_resumo_desempenho_cen2.png')
-    print("Gráfico 'grafico_resumo_desempenho_cen2.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_latency_comparison(latencies):
+def plot_latency_comparison(out, latencies):
     """Gera o gráfico comparativo de latência."""
     labels = ['Reno1 (Inicial)', 'Reno2 (Inicial)', 'BBR1 (Inicial)', 'BBR2 (Inicial)',
               'Reno1 (Final)', 'Reno2 (Final)', 'BBR1 (Final)', 'BBR2 (Final)']
@@ -222,10 +149,10 @@ def plot_latency_comparison(latencies):
                 ha='center', va='bottom', fontsize=10)
         
     plt.tight_layout()
-    plt.savefig('grafico_comparativo_latencia_cen2.png')
-    print("Gráfico 'grafico_comparativo_latencia_cen2.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_individual_host_throughput(reno_data_list, bbr_data_list):
+def plot_individual_host_throughput(out, reno_data_list, bbr_data_list):
     """Gera gráfico comparativo da vazão individual de cada host."""
     plt.figure(figsize=(14, 8))
     
@@ -247,23 +174,28 @@ def plot_individual_host_throughput(reno_data_list, bbr_data_list):
     plt.legend()
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
-    plt.savefig('grafico_vazao_individual_cen2.png')
-    print("Gráfico 'grafico_vazao_individual_cen2.png' salvo.")
+    plt.savefig(out)
+    print(f"Gráfico '{out}' salvo.")
 
 if __name__ == '__main__':
+    # Relatório em texto (padrão) ou JSON lines gerado com --jsonl
+    # --no-cache desenha todos os gráficos de novo (ver cache.py)
+    args = [a for a in sys.argv[1:] if a != '--no-cache']
+    report_file = args[0] if args else 'c2_resultados.txt'
+    cache = None if '--no-cache' in sys.argv else ResultCache()
     try:
-        with open('c2_resultados.txt', 'r') as f:
-            content = f.read()
+        # Lê o relatório uma única vez
+        report = cached_load(cache, load_report, report_file)
 
         # Parsear dados de cada host individualmente
         reno_data_list = [
-            parse_iperf_data(content, 'H_Reno1'),
-            parse_iperf_data(content, 'H_Reno2')
+            iperf_series(report, 'H_Reno1'),
+            iperf_series(report, 'H_Reno2')
         ]
         
         bbr_data_list = [
-            parse_iperf_data(content, 'H_BBR1'),
-            parse_iperf_data(content, 'H_BBR2')
+            iperf_series(report, 'H_BBR1'),
+            iperf_series(report, 'H_BBR2')
         ]
 
         # Combinar dados por protocolo
@@ -272,46 +204,46 @@ if __name__ == '__main__':
 
         # Parsear estatísticas de resumo
         reno_summaries = [
-            parse_summary_stats(content, 'H_Reno1'),
-            parse_summary_stats(content, 'H_Reno2')
+            summary_stats(report, 'H_Reno1'),
+            summary_stats(report, 'H_Reno2')
         ]
         
         bbr_summaries = [
-            parse_summary_stats(content, 'H_BBR1'),
-            parse_summary_stats(content, 'H_BBR2')
+            summary_stats(report, 'H_BBR1'),
+            summary_stats(report, 'H_BBR2')
         ]
         
         # Parsear latências
         latencies = {
-            'reno1_initial': parse_latency(content, 'H_Reno1', ''),
-            'reno2_initial': parse_latency(content, 'H_Reno2', ''),
-            'bbr1_initial': parse_latency(content, 'H_BBR1', ''),
-            'bbr2_initial': parse_latency(content, 'H_BBR2', ''),
-            'reno1_final': parse_latency(content, 'H_Reno1', 'Final'),
-            'reno2_final': parse_latency(content, 'H_Reno2', 'Final'),
-            'bbr1_final': parse_latency(content, 'H_BBR1', 'Final'),
-            'bbr2_final': parse_latency(content, 'H_BBR2', 'Final')
+            'reno1_initial': latency_avg(report, 'H_Reno1', ''),
+            'reno2_initial': latency_avg(report, 'H_Reno2', ''),
+            'bbr1_initial': latency_avg(report, 'H_BBR1', ''),
+            'bbr2_initial': latency_avg(report, 'H_BBR2', ''),
+            'reno1_final': latency_avg(report, 'H_Reno1', 'Final'),
+            'reno2_final': latency_avg(report, 'H_Reno2', 'Final'),
+            'bbr1_final': latency_avg(report, 'H_BBR1', 'Final'),
+            'bbr2_final': latency_avg(report, 'H_BBR2', 'Final')
         }
 
         # Gerar os gráficos
         if reno_combined['times'] and bbr_combined['times']:
-            plot_throughput_over_time(reno_combined, bbr_combined)
-            plot_retransmissions_over_time(reno_combined, bbr_combined)
-            plot_individual_host_throughput(reno_data_list, bbr_data_list)
+            cached_render(cache, 'grafico_vazao_tempo_cen2.png', plot_throughput_over_time, reno_combined, bbr_combined)
+            cached_render(cache, 'grafico_retransmissoes_tempo_cen2.png', plot_retransmissions_over_time, reno_combined, bbr_combined)
+            cached_render(cache, 'grafico_vazao_individual_cen2.png', plot_individual_host_throughput, reno_data_list, bbr_data_list)
         else:
             print("Não foi possível gerar gráficos ao longo do tempo por falta de dados.")
 
         if all(reno_summaries) and all(bbr_summaries):
-            plot_summary_metrics(reno_summaries, bbr_summaries)
+            cached_render(cache, 'grafico_resumo_desempenho_cen2.png', plot_summary_metrics, reno_summaries, bbr_summaries)
         else:
             print("Não foi possível gerar gráfico de resumo por falta de dados.")
             
         if all(latencies.values()):
-            plot_latency_comparison(latencies)
+            cached_render(cache, 'grafico_comparativo_latencia_cen2.png', plot_latency_comparison, latencies)
         else:
             print("Não foi possível gerar gráfico de latência por falta de dados.")
 
     except FileNotFoundError:
-        print("Erro: O arquivo 'c2_resultados.txt' não foi encontrado.")
+        print(f"Erro: O arquivo '{report_file}' não foi encontrado.")
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}")
\ No newline at end of file
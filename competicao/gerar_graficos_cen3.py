@@ -1,86 +1,13 @@
-import re
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+from report_parser import load_report, iperf_series, summary_stats, latency_avg, group_http_metrics
+from cache import ResultCache, cached_load, cached_render
+
 # Define um estilo visual para os gráficos
 plt.style.use('seaborn-v0_8-whitegrid')
 
-def normalize_to_mbits(value_str, unit_str):
-    """Converte um valor de Kbits ou bits para Mbits."""
-    value = float(value_str)
-    unit = unit_str.upper()
-    if unit == 'K':
-        return value / 1000.0
-    elif unit == '': # bits/sec
-        return value / 1000000.0
-    return value # Mbits/sec
-
-def parse_iperf_data(content, host_id):
-    """
-    Extrai dados de vazão e retransmissão para um host específico.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {host_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-
-    if not section_match:
-        print(f"Aviso: Seção iperf para {host_id} não encontrada.")
-        return {'times': [], 'bitrates': [], 'retrs': []}
-
-    section_content = section_match.group(1)
-
-    # Regex aprimorada para capturar Mbits, Kbits ou bits/sec
-    line_pattern = re.compile(r"\[\s*\d+\]\s+[\d\.]+-([\d\.]+)\s+sec.*\s+([\d\.]+)\s+([KM]?)bits/sec\s+(\d+)")
-
-    times, bitrates, retrs = [], [], []
-    for line in section_content.splitlines():
-        match = line_pattern.search(line)
-        if match:
-            times.append(float(match.group(1)))
-            # Normaliza a vazão para Mbits/sec
-            bitrate = normalize_to_mbits(match.group(2), match.group(3))
-            bitrates.append(bitrate)
-            retrs.append(int(match.group(4)))
-
-    return {'times': times, 'bitrates': bitrates, 'retrs': retrs}
-
-def parse_summary_stats(content, host_id):
-    """
-    Extrai a vazão média final e o total de retransmissões para um host específico.
-    """
-    section_pattern = re.compile(f"=== IPERF3 {host_id}_Throughput ===(.*?)iperf Done.", re.DOTALL)
-    section_match = section_pattern.search(content)
-    if not section_match:
-        return None
-
-    summary_pattern = re.compile(r"\[\s+\d+\]\s+0\.00-[\d\.]+\s+sec.*?([\d\.]+)\s+Mbits/sec\s+(\d+)\s+sender")
-    match = summary_pattern.search(section_match.group(1))
-
-    if match:
-        avg_bitrate = float(match.group(1))
-        total_retr = int(match.group(2))
-        return {'avg_bitrate': avg_bitrate, 'total_retr': total_retr}
-    
-    print(f"Aviso: Estatísticas de resumo para {host_id} não encontradas.")
-    return {'avg_bitrate': 0, 'total_retr': 0}
-
-def parse_latency(content, host_id, stage):
-    """
-    Extrai a latência média (RTT) para um host específico.
-    """
-    if stage == 'Final':
-        pattern_str = f"=== LATÊNCIA {host_id}_Final ===\s+rtt min/avg/max/mdev = .*?/([\d\.]+)/.*/.*ms"
-    else:
-        pattern_str = f"=== LATÊNCIA {host_id} ===\s+rtt min/avg/max/mdev = .*?/([\d\.]+)/.*/.*ms"
-    
-    pattern = re.compile(pattern_str)
-    match = pattern.search(content)
-
-    if match:
-        return float(match.group(1))
-    
-    print(f"Aviso: Latência para {host_id} ({stage}) não encontrada.")
-    return 0
-
 def combine_protocol_data(data_list):
     """
     Combina dados de múltiplos hosts do mesmo protocolo.
@@ -115,7 +42,7 @@ def combine_protocol_data(data_list):
     
     return {'times': combined_times, 'bitrates': combined_bitrates, 'retrs': combined_retrs}
 
-def plot_throughput_over_time(reno_data, bbr_data):
+def plot_throughput_over_time(out, reno_data, bbr_data):
     """Gera o gráfico de vazão ao longo do tempo para cenário 3."""
     plt.figure(figsize=(12, 7))
     plt.plot(reno_data['times'], reno_data['bitrates'], marker='x', linestyle='--', 
@@ -128,10 +55,10 @@ def plot_throughput_over_time(reno_data, bbr_data):
     plt.legend()
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
-    plt.savefig('grafico_vazao_tempo_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_vazao_tempo_cen3.png' salvo.")
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_retransmissions_over_time(reno_data, bbr_data):
+def plot_retransmissions_over_time(out, reno_data, bbr_data):
     """
     Gera o gráfico de retransmissões ao longo do tempo para cenário 3.
     """
@@ -163,10 +90,10 @@ def plot_retransmissions_over_time(reno_data, bbr_data):
     plt.xticks([r + bar_width/2 for r in range(max_len)], [int(t) for t in xtick_labels], rotation=45)
     plt.legend()
     plt.tight_layout()
-    plt.savefig('grafico_retransmissoes_tempo_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_retransmissoes_tempo_cen3.png' salvo.")
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_summary_metrics(reno_summaries, bbr_summaries):
+def plot_summary_metrics(out, reno_summaries, bbr_summaries):
     """Gera gráficos de barra com as métricas de resumo agregadas para cenário 3."""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
     fig.suptitle('Resumo do Desempenho: Cenário 3 (2 Reno vs 1 BBR)', fontsize=16)
@@ -198,10 +125,10 @@ def plot_summary_metrics(reno_summaries, bbr_summaries):
         ax2.text(i, v + 2, str(v), ha='center', va='bottom', fontweight='bold')
 
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig('grafico_resumo_desempenho_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_resumo_desempenho_cen3.png' salvo.")
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_latency_comparison(latencies):
+def plot_latency_comparison(out, latencies):
     """Gera o gráfico comparativo de latência para cenário 3."""
     labels = ['Reno1\n(Inicial)', 'Reno2\n(Inicial)', 'BBR1\n(Inicial)',
               'Reno1\n(Final)', 'Reno2\n(Final)', 'BBR1\n(Final)']
@@ -225,10 +152,10 @@ def plot_latency_comparison(latencies):
                 ha='center', va='bottom', fontsize=10, fontweight='bold')
         
     plt.tight_layout()
-    plt.savefig('grafico_comparativo_latencia_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_comparativo_latencia_cen3.png' salvo.")
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_individual_host_throughput(reno_data_list, bbr_data_list):
+def plot_individual_host_throughput(out, reno_data_list, bbr_data_list):
     """Gera gráfico comparativo da vazão individual de cada host para cenário 3."""
     plt.figure(figsize=(14, 8))
     
@@ -251,50 +178,10 @@ def plot_individual_host_throughput(reno_data_list, bbr_data_list):
     plt.legend()
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
-    plt.savefig('grafico_vazao_individual_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_vazao_individual_cen3.png' salvo.")
-
-def parse_http_metrics(content):
-    """Extrai métricas de desempenho HTTP das requisições simultâneas."""
-    metrics = {
-        'reno1': [], 'reno2': [], 'bbr1': []
-    }
-    
-    # Padrão para extrair métricas HTTP
-    pattern = re.compile(r"=== MÉTRICAS (H_\w+)_Simultaneous_\d+ ===\s+Tempo total: ([\d\.]+)s\s+Tempo de conexão: ([\d\.]+)s\s+Tempo de transferência: ([\d\.]+)s\s+Velocidade de download: ([\d\.]+) bytes/s")
-    
-    for match in pattern.finditer(content):
-        host = match.group(1).lower()
-        total_time = float(match.group(2))
-        connection_time = float(match.group(3))
-        transfer_time = float(match.group(4))
-        download_speed = float(match.group(5))
-        
-        if 'reno1' in host:
-            metrics['reno1'].append({
-                'total_time': total_time,
-                'connection_time': connection_time,
-                'transfer_time': transfer_time,
-                'download_speed': download_speed / 1000  # Convert to KB/s
-            })
-        elif 'reno2' in host:
-            metrics['reno2'].append({
-                'total_time': total_time,
-                'connection_time': connection_time,
-                'transfer_time': transfer_time,
-                'download_speed': download_speed / 1000
-            })
-        elif 'bbr1' in host:
-            metrics['bbr1'].append({
-                'total_time': total_time,
-                'connection_time': connection_time,
-                'transfer_time': transfer_time,
-                'download_speed': download_speed / 1000
-            })
-    
-    return metrics
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
-def plot_http_performance(http_metrics):
+def plot_http_performance(out, http_metrics):
     """Gera gráfico de desempenho HTTP para cenário 3."""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
     fig.suptitle('Desempenho HTTP - Cenário 3 (Requisições Simultâneas)', fontsize=16)
@@ -349,22 +236,27 @@ def plot_http_performance(http_metrics):
         ax4.text(i, v + 5, f"{v:.1f}", ha='center', va='bottom', fontweight='bold')
     
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig('grafico_desempenho_http_cen3.png', dpi=300, bbox_inches='tight')
-    print("Gráfico 'grafico_desempenho_http_cen3.png' salvo.")
+    plt.savefig(out, dpi=300, bbox_inches='tight')
+    print(f"Gráfico '{out}' salvo.")
 
 if __name__ == '__main__':
+    # Relatório em texto (padrão) ou JSON lines gerado com --jsonl
+    # --no-cache desenha todos os gráficos de novo (ver cache.py)
+    args = [a for a in sys.argv[1:] if a != '--no-cache']
+    report_file = args[0] if args else 'c3_resultados.txt'
+    cache = None if '--no-cache' in sys.argv else ResultCache()
     try:
-        with open('c3_resultados.txt', 'r') as f:
-            content = f.read()
+        # Lê o relatório uma única vez
+        report = cached_load(cache, load_report, report_file)
 
         # Parsear dados de cada host individualmente
         reno_data_list = [
-            parse_iperf_data(content, 'H_Reno1'),
-            parse_iperf_data(content, 'H_Reno2')
+            iperf_series(report, 'H_Reno1'),
+            iperf_series(report, 'H_Reno2')
         ]
         
         bbr_data_list = [
-            parse_iperf_data(content, 'H_BBR1')
+            iperf_series(report, 'H_BBR1')
         ]
 
         # Combinar dados por protocolo
@@ -373,49 +265,49 @@ if __name__ == '__main__':
 
         # Parsear estatísticas de resumo
         reno_summaries = [
-            parse_summary_stats(content, 'H_Reno1'),
-            parse_summary_stats(content, 'H_Reno2')
+            summary_stats(report, 'H_Reno1'),
+            summary_stats(report, 'H_Reno2')
         ]
         
         bbr_summaries = [
-            parse_summary_stats(content, 'H_BBR1')
+            summary_stats(report, 'H_BBR1')
         ]
         
         # Parsear latências
         latencies = {
-            'reno1_initial': parse_latency(content, 'H_Reno1', ''),
-            'reno2_initial': parse_latency(content, 'H_Reno2', ''),
-            'bbr1_initial': parse_latency(content, 'H_BBR1', ''),
-            'reno1_final': parse_latency(content, 'H_Reno1', 'Final'),
-            'reno2_final': parse_latency(content, 'H_Reno2', 'Final'),
-            'bbr1_final': parse_latency(content, 'H_BBR1', 'Final')
+            'reno1_initial': latency_avg(report, 'H_Reno1', ''),
+            'reno2_initial': latency_avg(report, 'H_Reno2', ''),
+            'bbr1_initial': latency_avg(report, 'H_BBR1', ''),
+            'reno1_final': latency_avg(report, 'H_Reno1', 'Final'),
+            'reno2_final': latency_avg(report, 'H_Reno2', 'Final'),
+            'bbr1_final': latency_avg(report, 'H_BBR1', 'Final')
         }
 
         # Parsear métricas HTTP
-        http_metrics = parse_http_metrics(content)
+        http_metrics = group_http_metrics(report, ['reno1', 'reno2', 'bbr1'])
 
         # Gerar os gráficos
         print("Gerando gráficos para o Cenário 3...")
         
         if reno_combined['times'] and bbr_combined['times']:
-            plot_throughput_over_time(reno_combined, bbr_combined)
-            plot_retransmissions_over_time(reno_combined, bbr_combined)
-            plot_individual_host_throughput(reno_data_list, bbr_data_list)
+            cached_render(cache, 'grafico_vazao_tempo_cen3.png', plot_throughput_over_time, reno_combined, bbr_combined)
+            cached_render(cache, 'grafico_retransmissoes_tempo_cen3.png', plot_retransmissions_over_time, reno_combined, bbr_combined)
+            cached_render(cache, 'grafico_vazao_individual_cen3.png', plot_individual_host_throughput, reno_data_list, bbr_data_list)
         else:
             print("Não foi possível gerar gráficos ao longo do tempo por falta de dados.")
 
         if all(reno_summaries) and all(bbr_summaries):
-            plot_summary_metrics(reno_summaries, bbr_summaries)
+            cached_render(cache, 'grafico_resumo_desempenho_cen3.png', plot_summary_metrics, reno_summaries, bbr_summaries)
         else:
             print("Não foi possível gerar gráfico de resumo por falta de dados.")
             
         if all(latencies.values()):
-            plot_latency_comparison(latencies)
+            cached_render(cache, 'grafico_comparativo_latencia_cen3.png', plot_latency_comparison, latencies)
         else:
             print("Não foi possível gerar gráfico de latência por falta de dados.")
 
         if any(http_metrics.values()):
-            plot_http_performance(http_metrics)
+            cached_render(cache, 'grafico_desempenho_http_cen3.png', plot_http_performance, http_metrics)
         else:
             print("Não foi possível gerar gráfico de desempenho HTTP por falta de dados.")
 
@@ -429,7 +321,7 @@ if __name__ == '__main__':
         print("- grafico_desempenho_http_cen3.png")
 
     except FileNotFoundError:
-        print("Erro: O arquivo 'c3_resultados.txt' não foi encontrado.")
+        print(f"Erro: O arquivo '{report_file}' não foi encontrado.")
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}")
         import traceback
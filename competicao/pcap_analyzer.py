@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Análise por fluxo TCP de capturas pcap (tcpdump -s com só os cabeçalhos).
+
+O arquivo é lido por mmap, um pacote de cada vez, sem carregá-lo
+inteiro: cada sentido de cada fluxo guarda só o maior número de
+sequência visto, o último ACK, os segmentos ainda não confirmados (uma
+janela) e os contadores do intervalo corrente.  Os resultados saem em
+fluxo, à medida que o tempo da captura avança, em
+
+    <saida>_rtt.csv     time,flow,rtt_ms
+    <saida>_events.csv  time,flow,event,seq       (retrans ou ooo)
+    <saida>_bins.csv    time,flow,bytes,mbps,inflight_max,retrans
+    <saida>_flows.json  resumo por fluxo
+
+O RTT é o do ponto de captura: do segmento de dados passando pela
+interface até o ACK que o confirma voltar por ela (algoritmo de Karn:
+segmentos retransmitidos não geram amostra).  Um segmento abaixo do
+maior número de sequência já visto é retransmissão, a menos que preencha
+um buraco aberto há menos de --ooo segundos: aí chegou fora de ordem
+(ooo), como no Wireshark.  Bytes em trânsito são o maior número de
+sequência enviado menos o maior ACK recebido.
+
+Os arquivos de um ring buffer (tcpdump -C/-W: saida.pcap0, saida.pcap1,
+...) são lidos na ordem do primeiro pacote de cada um.
+
+Uso: python3 pcap_analyzer.py /tmp/..._pcap/iperf/s1-eth5.pcap* --out /tmp/s1-eth5
+"""
+
+import os
+import json
+import mmap
+import socket
+import struct
+import argparse
+from collections import deque
+
+# Cabeçalho global e de registro (libpcap); o formato "nsec" usa nanossegundos
+PCAP_MAGIC = {b'\xd4\xc3\xb2\xa1': ('<', 1e-6), b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+              b'\x4d\x3c\xb2\xa1': ('<', 1e-9), b'\xa1\xb2\x3c\x4d': ('>', 1e-9)}
+PCAP_HEADER_SIZE = 24
+
+# Tipos de enlace suportados (linktype do cabeçalho global)
+DLT_EN10MB = 1
+DLT_RAW = (12, 14, 101)
+DLT_LINUX_SLL = 113
+DLT_LINUX_SLL2 = 276
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+SEQ_MOD = 1 << 32
+# Segmentos não confirmados guardados por sentido (para as amostras de RTT)
+# e buracos na sequência ainda não preenchidos
+MAX_PENDING = 4096
+MAX_HOLES = 64
+# Páginas já lidas do mmap são devolvidas a cada janela deste tamanho, para
+# que a memória residente não cresça com o arquivo
+RELEASE_BYTES = 16 << 20
+
+
+def _unwrap(ref, seq32):
+    """Número de sequência de 32 bits -> posição absoluta mais próxima de ref"""
+    delta = (seq32 - ref) % SEQ_MOD
+    if delta >= SEQ_MOD // 2:
+        delta -= SEQ_MOD
+    return ref + delta
+
+
+class HalfFlow(object):
+    """Estado de um sentido de um fluxo TCP"""
+
+    __slots__ = ('name', 'base', 'max_end', 'una', 'pending', 'holes', 'last_t', 'first_t',
+                 'packets', 'bytes', 'retrans', 'ooo', 'rtt_n', 'rtt_sum', 'rtt_min',
+                 'rtt_max', 'inflight_max', 'bin', 'bin_bytes', 'bin_inflight',
+                 'bin_retrans')
+
+    def __init__(self, name):
+        self.name = name
+        self.base = None        # primeiro número de sequência (32 bits)
+        self.max_end = 0        # maior fim de segmento visto, relativo a base
+        self.una = 0            # maior ACK recebido do outro sentido
+        self.pending = deque()  # (fim, instante) dos segmentos não confirmados
+        self.holes = deque()    # [início, fim, instante] dos buracos na sequência
+        self.last_t = None
+        self.first_t = None
+        self.packets = self.bytes = self.retrans = self.ooo = 0
+        self.rtt_n = 0
+        self.rtt_sum = 0.0
+        self.rtt_min = self.rtt_max = None
+        self.inflight_max = 0
+        self.bin = None
+        self.bin_bytes = self.bin_inflight = self.bin_retrans = 0
+
+    def rel(self, seq32):
+        # Relativo a base, desdobrando a volta dos 32 bits pelo maior visto
+        return _unwrap(self.max_end, (seq32 - self.base) % SEQ_MOD)
+
+    def summary(self):
+        duration = (self.last_t - self.first_t) if self.packets > 1 else 0.0
+        return {'flow': self.name, 'packets': self.packets, 'bytes': self.bytes,
+                'duration': duration,
+                'mbps': self.bytes * 8 / duration / 1e6 if duration > 0 else 0.0,
+                'retrans': self.retrans, 'ooo': self.ooo,
+                'rtt_samples': self.rtt_n,
+                'rtt_min_ms': self.rtt_min * 1000 if self.rtt_n else None,
+                'rtt_avg_ms': self.rtt_sum / self.rtt_n * 1000 if self.rtt_n else None,
+                'rtt_max_ms': self.rtt_max * 1000 if self.rtt_n else None,
+                'inflight_max': self.inflight_max}
+
+
+def _endpoint(addr, port):
+    family = socket.AF_INET if len(addr) == 4 else socket.AF_INET6
+    return f"{socket.inet_ntop(family, addr)}:{port}"
+
+
+def read_packets(fname):
+    """
+    Gera (instante, buffer, início do cabeçalho IP, fim do pacote) de cada
+    pacote do pcap, lido por mmap.  Um registro final truncado (tcpdump
+    interrompido) é ignorado.
+    """
+    if os.path.getsize(fname) < PCAP_HEADER_SIZE:
+        return
+    with open(fname, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:4] not in PCAP_MAGIC:
+            raise ValueError(f"{fname}: não é um pcap (pcapng não é suportado)")
+        endian, unit = PCAP_MAGIC[mm[:4]]
+        linktype = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0fffffff
+        record = struct.Struct(endian + 'IIII')
+        size = len(mm)
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+        released = 0
+        off = PCAP_HEADER_SIZE
+        while off + record.size <= size:
+            if off - released >= RELEASE_BYTES:
+                mm.madvise(mmap.MADV_DONTNEED, released, RELEASE_BYTES)
+                released += RELEASE_BYTES
+            sec, frac, incl, _ = record.unpack_from(mm, off)
+            off += record.size
+            if off + incl > size:
+                break
+            ip = _ip_offset(mm, off, incl, linktype)
+            if ip is not None:
+                yield sec + frac * unit, mm, ip, off + incl
+            off += incl
+
+
+def _ip_offset(buf, off, incl, linktype):
+    if linktype == DLT_EN10MB:
+        if incl < 14:
+            return None
+        ethertype = struct.unpack_from('!H', buf, off + 12)[0]
+        start = off + 14
+        if ethertype == ETH_P_8021Q and incl >= 18:
+            ethertype = struct.unpack_from('!H', buf, off + 16)[0]
+            start += 4
+    elif linktype == DLT_LINUX_SLL:
+        if incl < 16:
+            return None
+        ethertype = struct.unpack_from('!H', buf, off + 14)[0]
+        start = off + 16
+    elif linktype == DLT_LINUX_SLL2:
+        if incl < 20:
+            return None
+        ethertype = struct.unpack_from('!H', buf, off)[0]
+        start = off + 20
+    elif linktype in DLT_RAW:
+        return off
+    else:
+        raise ValueError(f"tipo de enlace {linktype} não suportado")
+    return start if ethertype in (ETH_P_IP, ETH_P_IPV6) else None
+
+
+def parse_tcp(buf, off, end):
+    """(src, sport, dst, dport, seq, ack, flags, payload) do pacote IP em
+    buf[off:end], ou None se não for TCP"""
+    if end - off < 20:
+        return None
+    version = buf[off] >> 4
+    if version == 4:
+        ihl = (buf[off] & 0x0f) * 4
+        total, frag, proto = struct.unpack_from('!H2xHxB', buf, off + 2)
+        if proto != 6 or frag & 0x1fff:
+            return None
+        src, dst = buf[off + 12:off + 16], buf[off + 16:off + 20]
+        ip_len, ip_total = ihl, total
+    elif version == 6 and end - off >= 40:
+        plen, proto = struct.unpack_from('!HB', buf, off + 4)
+        if proto != 6:
+            return None
+        src, dst = buf[off + 8:off + 24], buf[off + 24:off + 40]
+        ip_len, ip_total = 40, 40 + plen
+    else:
+        return None
+    if end - off < ip_len + 14:
+        return None
+    sport, dport, seq, ack, off_flags = struct.unpack_from('!HHIIH', buf, off + ip_len)
+    tcp_len = (off_flags >> 12) * 4
+    # O tamanho dos dados vem do cabeçalho IP: a captura guarda só os cabeçalhos
+    payload = max(ip_total - ip_len - tcp_len, 0)
+    return src, sport, dst, dport, seq, ack, off_flags & 0xff, payload
+
+
+class Analyzer(object):
+    """
+    Reconstrói os fluxos de uma sequência de pacotes.  As saídas são
+    funções chamadas à medida que os resultados ficam prontos:
+    on_rtt(t, flow, rtt_ms), on_event(t, flow, event, seq) e
+    on_bin(t, flow, bytes, mbps, inflight_max, retrans).
+    """
+
+    def __init__(self, bin_sec=0.1, ooo_sec=0.003, on_rtt=None, on_event=None, on_bin=None):
+        self.bin_sec = bin_sec
+        self.ooo_sec = ooo_sec
+        self.on_rtt = on_rtt or (lambda *a: None)
+        self.on_event = on_event or (lambda *a: None)
+        self.on_bin = on_bin or (lambda *a: None)
+        self.flows = {}
+        self.t0 = None
+        self.packets = 0
+
+    def _half(self, src, sport, dst, dport):
+        key = (src, sport, dst, dport)
+        half = self.flows.get(key)
+        if half is None:
+            half = self.flows[key] = HalfFlow(f"{_endpoint(src, sport)}>{_endpoint(dst, dport)}")
+        return half
+
+    def _flush_bin(self, half):
+        if half.bin is not None and (half.bin_bytes or half.bin_inflight or half.bin_retrans):
+            self.on_bin(self.t0 + half.bin * self.bin_sec, half.name, half.bin_bytes,
+                        half.bin_bytes * 8 / self.bin_sec / 1e6, half.bin_inflight,
+                        half.bin_retrans)
+        half.bin_bytes = half.bin_inflight = half.bin_retrans = 0
+
+    def add(self, t, buf, off, end):
+        tcp = parse_tcp(buf, off, end)
+        if tcp is None:
+            return
+        src, sport, dst, dport, seq, ack, flags, payload = tcp
+        self.packets += 1
+        if self.t0 is None:
+            self.t0 = t
+        half = self._half(src, sport, dst, dport)
+        rev = self.flows.get((dst, dport, src, sport))
+
+        b = int((t - self.t0) / self.bin_sec)
+        if b != half.bin:
+            self._flush_bin(half)
+            half.bin = b
+        if half.first_t is None:
+            half.first_t = t
+        half.packets += 1
+
+        length = payload + (1 if flags & (TCP_SYN | TCP_FIN) else 0)
+        if length:
+            if half.base is None:
+                half.base = seq
+            start = half.rel(seq)
+            end = start + length
+            if start >= half.max_end:
+                if start > half.max_end:
+                    # Faltam segmentos: perdidos antes da captura ou atrasados
+                    if len(half.holes) == MAX_HOLES:
+                        half.holes.popleft()
+                    half.holes.append([half.max_end, start, t])
+                half.max_end = end
+                if len(half.pending) < MAX_PENDING:
+                    half.pending.append((end, t))
+            else:
+                event = 'retrans'
+                for hole in half.holes:
+                    if hole[0] <= start < hole[1]:
+                        if t - hole[2] < self.ooo_sec:
+                            event = 'ooo'
+                        # O buraco diminui pela frente; some quando preenchido
+                        hole[0] = max(hole[0], min(end, hole[1]))
+                        if hole[0] >= hole[1]:
+                            half.holes.remove(hole)
+                        break
+                if event == 'ooo':
+                    half.ooo += 1
+                else:
+                    half.retrans += 1
+                    half.bin_retrans += 1
+                self.on_event(t, half.name, event, start)
+                # Karn: os segmentos a partir deste ficam ambíguos
+                while half.pending and half.pending[-1][0] > start:
+                    half.pending.pop()
+                half.max_end = max(half.max_end, end)
+            half.bytes += payload
+            half.bin_bytes += payload
+            half.last_t = t
+
+        if flags & TCP_ACK and rev is not None and rev.base is not None:
+            acked = rev.rel(ack)
+            if acked > rev.una:
+                rev.una = acked
+                sent = None
+                while rev.pending and rev.pending[0][0] <= acked:
+                    sent = rev.pending.popleft()[1]
+                if sent is not None:
+                    rtt = t - sent
+                    rev.rtt_n += 1
+                    rev.rtt_sum += rtt
+                    rev.rtt_min = rtt if rev.rtt_min is None else min(rev.rtt_min, rtt)
+                    rev.rtt_max = rtt if rev.rtt_max is None else max(rev.rtt_max, rtt)
+                    self.on_rtt(t, rev.name, rtt * 1000)
+
+        if half.base is not None:
+            inflight = half.max_end - half.una
+            half.inflight_max = max(half.inflight_max, inflight)
+            half.bin_inflight = max(half.bin_inflight, inflight)
+
+    def finish(self):
+        """Grava os intervalos em aberto e devolve o resumo dos sentidos com dados"""
+        for half in self.flows.values():
+            self._flush_bin(half)
+        return [half.summary() for half in self.flows.values() if half.bytes]
+
+
+def _first_time(fname):
+    for t, _, _, _ in read_packets(fname):
+        return t
+    return float('inf')
+
+
+def analyze(files, out, bin_sec=0.1, ooo_sec=0.003):
+    """Analisa os arquivos (um ring buffer, em qualquer ordem) e grava <out>_*.csv/json"""
+    files = sorted(files, key=_first_time)
+    with open(out + '_rtt.csv', 'w', buffering=1 << 16) as rtt_f, \
+            open(out + '_events.csv', 'w', buffering=1 << 16) as ev_f, \
+            open(out + '_bins.csv', 'w', buffering=1 << 16) as bin_f:
+        rtt_f.write('time,flow,rtt_ms\n')
+        ev_f.write('time,flow,event,seq\n')
+        bin_f.write('time,flow,bytes,mbps,inflight_max,retrans\n')
+        analyzer = Analyzer(
+            bin_sec, ooo_sec,
+            on_rtt=lambda t, flow, rtt: rtt_f.write(f"{t:.6f},{flow},{rtt:.3f}\n"),
+            on_event=lambda t, flow, ev, seq: ev_f.write(f"{t:.6f},{flow},{ev},{seq}\n"),
+            on_bin=lambda t, flow, nbytes, mbps, inflight, retrans: bin_f.write(
+                f"{t:.3f},{flow},{nbytes},{mbps:.3f},{inflight},{retrans}\n"))
+        for fname in files:
+            for packet in read_packets(fname):
+                analyzer.add(*packet)
+        flows = analyzer.finish()
+    summary = {'files': files, 'packets': analyzer.packets, 'bin': bin_sec, 'flows': flows}
+    with open(out + '_flows.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def format_flows(summary):
+    lines = [f"{'fluxo':<44} {'MB':>8} {'Mb/s':>7} {'retrans':>7} {'ooo':>5} "
+             f"{'rtt min/avg/max (ms)':>22}"]
+    for flow in summary['flows']:
+        rtt = '-'
+        if flow['rtt_samples']:
+            rtt = f"{flow['rtt_min_ms']:.1f}/{flow['rtt_avg_ms']:.1f}/{flow['rtt_max_ms']:.1f}"
+        lines.append(f"{flow['flow']:<44} {flow['bytes'] / 1e6:>8.2f} {flow['mbps']:>7.2f} "
+                     f"{flow['retrans']:>7} {flow['ooo']:>5} {rtt:>22}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análise por fluxo TCP de capturas pcap")
+    parser.add_argument('pcap', nargs='+', help="Arquivos pcap (os de um ring buffer juntos)")
+    parser.add_argument('--out', '-o', default=None,
+                        help="Prefixo dos arquivos de saída (padrão: o do primeiro pcap)")
+    parser.add_argument('--bin', type=float, default=0.1,
+                        help="Intervalo da vazão e dos bytes em trânsito (s)")
+    parser.add_argument('--ooo', type=float, default=0.003,
+                        help="Atraso máximo (s) para um buraco preenchido contar como fora de ordem")
+    args = parser.parse_args(argv)
+
+    out = args.out or os.path.splitext(args.pcap[0])[0]
+    summary = analyze(args.pcap, out, args.bin, args.ooo)
+    print(f"{summary['packets']} pacotes TCP em {len(summary['files'])} arquivo(s)")
+    print(format_flows(summary))
+    print(f"Resultados em {out}_*.csv e {out}_flows.json")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Sondas de prontidão para tcp_simulation.py, no lugar dos time.sleep fixos.
+
+Tudo é verificado dentro do namespace de rede de cada host (via
+host.cmd): os sockets TCP vêm de /proc/net/tcp e /proc/net/tcp6, onde o
+estado 0A é LISTEN, e a conexão de teste é feita com o /dev/tcp do bash
+do próprio host.  As consultas são repetidas com espera exponencial até
+um limite de tempo, quando levantam TimeoutError.
+
+Servidores iperf3 são dados como prontos pelo socket em LISTEN, sem
+conectar: uma conexão de teste contaria como o único teste de um
+servidor iniciado com -1.
+
+A leitura de /proc/net/tcp e a espera exponencial são as de
+bufferbloat/readiness.py, carregado daqui; este módulo só acrescenta as
+sondas usadas apenas na competição e as mensagens em português.
+"""
+
+import importlib.util
+import os
+
+# Pelo caminho do arquivo, como em cache.py: um "import readiness" daqui
+# encontraria este mesmo módulo
+_spec = importlib.util.spec_from_file_location(
+    'bufferbloat_readiness',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bufferbloat', 'readiness.py'))
+_impl = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_impl)
+_impl.TIMEOUT_MESSAGE = "%(what)s: não ficou pronto em %(timeout).1f s"
+
+PROC_NET_TCP = _impl.PROC_NET_TCP
+tcp_sockets = _impl.tcp_sockets
+listening_ports = _impl.listening_ports
+wait_until = _impl.wait_until
+
+
+def _port_set(ports):
+    return set([ports] if isinstance(ports, int) else ports)
+
+
+def wait_listening(host, ports, timeout=10.0, proc=None):
+    """Espera todas as portas estarem em LISTEN no host (uma leitura por tentativa)"""
+    ports = _port_set(ports)
+    _impl.wait_listening(host, ports, timeout, proc, f"portas {sorted(ports)} em {host.name}")
+
+
+def wait_closed(host, ports, timeout=10.0):
+    """Espera nenhuma das portas estar mais em LISTEN (servidor encerrado)"""
+    ports = _port_set(ports)
+    wait_until(lambda: not ports & listening_ports(host.cmd(PROC_NET_TCP)),
+               timeout, f"fechamento das portas {sorted(ports)} em {host.name}")
+
+
+def wait_connectable(client, server_ip, port, timeout=10.0):
+    """Espera o cliente conseguir abrir uma conexão TCP com server_ip:port"""
+    probe = f"timeout 1 bash -c '</dev/tcp/{server_ip}/{port}' 2>/dev/null && echo ok"
+    wait_until(lambda: 'ok' in client.cmd(probe),
+               timeout, f"conexão de {client.name} a {server_ip}:{port}")
+
+
+def wait_idle(host, port, timeout=30.0):
+    """
+    Espera o host não ter mais conexões ativas na porta local (só LISTEN
+    e TIME_WAIT, que já não trocam dados), isto é, o teste anterior acabou
+    de verdade antes do próximo começar.
+    """
+    def idle():
+        return all(state in ('LISTEN', 'TIME_WAIT')
+                   for local, _, state in tcp_sockets(host.cmd(PROC_NET_TCP))
+                   if local == port)
+    wait_until(idle, timeout, f"conexões na porta {port} de {host.name}")
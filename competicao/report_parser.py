@@ -0,0 +1,293 @@
+"""
+Parser incremental dos relatórios gerados por tcp_simulation_cen_*.py.
+
+O arquivo é lido uma única vez, linha a linha, como uma sequência de
+eventos de seção (LATÊNCIA, IPERF3, MÉTRICAS e Stats).  Cada evento vira
+um registro tipado indexado pelo nome do teste, de modo que o custo do
+parse é linear no tamanho do arquivo, independente do número de hosts.
+
+As funções de consulta (iperf_series, summary_stats, latency_avg e
+group_http_metrics) devolvem exatamente o que os antigos parse_* de cada
+gerar_graficos_cen*.py extraíam com expressões regulares.
+
+Relatórios gravados com --jsonl (ver results_sink.py) são carregados por
+parse_jsonl no mesmo Report, sem expressões regulares; load_report
+escolhe o parser pela extensão do arquivo.
+"""
+
+import json
+import re
+
+SECTION_RE = re.compile(r'^=== (LATÊNCIA|IPERF3|MÉTRICAS) (.+?) ===\s*$')
+STATS_RE = re.compile(r'^--- (.+) Stats at (\S+) ---\s*$')
+OTHER_HEADER_RE = re.compile(r'^=== .* ===\s*$')
+
+RTT_RE = re.compile(r'rtt min/avg/max/mdev = ([\d\.]+)/([\d\.]+)/([\d\.]+)/([\d\.]+) ms')
+# Mesmas expressões usadas antes nos scripts de gráficos.  A linha de
+# resumo "sender" também casa com IPERF_LINE_RE e continua entrando na
+# série, como antes.
+IPERF_LINE_RE = re.compile(r"\[\s*\d+\]\s+[\d\.]+-([\d\.]+)\s+sec.*\s+([\d\.]+)\s+([KM]?)bits/sec\s+(\d+)")
+IPERF_SUMMARY_RE = re.compile(r"\[\s+\d+\]\s+0\.00-[\d\.]+\s+sec.*?([\d\.]+)\s+Mbits/sec\s+(\d+)\s+sender")
+METRIC_FIELDS = [
+    ('Tempo total', 'total_time', r'([\d\.]+)s'),
+    ('Tempo de conexão', 'connection_time', r'([\d\.]+)s'),
+    ('Tempo de transferência', 'transfer_time', r'([\d\.]+)s'),
+    ('Velocidade de download', 'download_speed', r'([\d\.]+) bytes/s'),
+    ('Tamanho baixado', 'size_download', r'([\d\.]+) bytes'),
+    ('Código HTTP', 'http_code', r'(\d+)'),
+]
+METRIC_RES = [(key, re.compile(r'^%s: %s' % (label, pat))) for label, key, pat in METRIC_FIELDS]
+HTTP_NAME_RE = re.compile(r'(H_\w+)_Simultaneous_\d+')
+
+
+def normalize_to_mbits(value_str, unit_str):
+    """Converte um valor de Kbits ou bits para Mbits."""
+    value = float(value_str)
+    unit = unit_str.upper()
+    if unit == 'K':
+        return value / 1000.0
+    elif unit == '': # bits/sec
+        return value / 1000000.0
+    return value # Mbits/sec
+
+
+def iter_events(lines):
+    """
+    Percorre as linhas do relatório e gera um evento (tipo, nome, linhas)
+    por seção.  Seções IPERF3 só são emitidas se terminarem em "iperf Done."
+    """
+    kind, name, body = None, None, []
+    for line in lines:
+        line = line.rstrip('\n')
+        m = SECTION_RE.match(line)
+        s = None if m else STATS_RE.match(line)
+        if m or s or OTHER_HEADER_RE.match(line):
+            if kind and kind != 'IPERF3':
+                yield kind, name, body
+            kind, name, body = None, None, []
+            if m:
+                kind, name = m.group(1), m.group(2)
+            elif s:
+                kind, name = 'Stats', (s.group(1), s.group(2))
+            continue
+        if kind is None:
+            continue
+        if kind == 'IPERF3' and 'iperf Done.' in line:
+            yield kind, name, body
+            kind, name, body = None, None, []
+            continue
+        body.append(line)
+    if kind and kind != 'IPERF3':
+        yield kind, name, body
+
+
+def _parse_latency(body):
+    for line in body:
+        if not line.strip():
+            continue
+        m = RTT_RE.search(line)
+        if m:
+            return dict(zip(('min', 'avg', 'max', 'mdev'), map(float, m.groups())))
+        return None
+    return None
+
+
+def _parse_iperf(body):
+    times, bitrates, retrs = [], [], []
+    summary = None
+    for line in body:
+        match = IPERF_LINE_RE.search(line)
+        if match:
+            times.append(float(match.group(1)))
+            bitrates.append(normalize_to_mbits(match.group(2), match.group(3)))
+            retrs.append(int(match.group(4)))
+        if summary is None:
+            match = IPERF_SUMMARY_RE.search(line)
+            if match:
+                summary = {'avg_bitrate': float(match.group(1)),
+                           'total_retr': int(match.group(2))}
+    return {'times': times, 'bitrates': bitrates, 'retrs': retrs, 'summary': summary}
+
+
+def _parse_metrics(body):
+    ret = {}
+    for line in body:
+        for key, pattern in METRIC_RES:
+            m = pattern.match(line)
+            if m:
+                ret.setdefault(key, float(m.group(1)))
+                break
+    if all(key in ret for key, _ in METRIC_RES[:4]):
+        return ret
+    return None
+
+
+def _parse_stats(body):
+    rows = []
+    iface = None
+    for line in body:
+        if 'Tcp:' in line:
+            rows.append(line[line.index('Tcp:') + 4:].split())
+        elif line.startswith('Interface Stats:'):
+            iface = line[len('Interface Stats:'):].split()
+    tcp = {}
+    if len(rows) >= 2 and all(v.lstrip('-').isdigit() for v in rows[1]):
+        tcp = dict(zip(rows[0], [int(v) for v in rows[1]]))
+    return {'tcp': tcp, 'iface': iface}
+
+
+class Report(object):
+    """Registros extraídos de um relatório, indexados pelo nome do teste."""
+
+    def __init__(self):
+        self.latency = {}   # 'H_Reno1' / 'H_Reno1_Final' -> {min, avg, max, mdev}
+        self.iperf = {}     # 'H_Reno1_Throughput' -> {times, bitrates, retrs, summary}
+        self.metrics = {}   # 'H_Reno1_Simultaneous_1' -> {total_time, ...}
+        self.stats = []     # [{name, time, tcp, iface}]
+
+    def add_event(self, kind, name, body):
+        if kind == 'LATÊNCIA':
+            rec = _parse_latency(body)
+            if rec:
+                self.latency.setdefault(name, rec)
+        elif kind == 'IPERF3':
+            self.iperf.setdefault(name, _parse_iperf(body))
+        elif kind == 'MÉTRICAS':
+            rec = _parse_metrics(body)
+            if rec:
+                self.metrics.setdefault(name, rec)
+        elif kind == 'Stats':
+            rec = _parse_stats(body)
+            rec['name'], rec['time'] = name
+            self.stats.append(rec)
+
+
+def parse_report(fname):
+    """Lê o relatório em uma única passada e devolve um Report."""
+    report = Report()
+    with open(fname, encoding='utf-8') as f:
+        for kind, name, body in iter_events(f):
+            report.add_event(kind, name, body)
+    return report
+
+
+def parse_jsonl(fname):
+    """
+    Monta um Report a partir dos registros JSON lines de results_sink.
+    As séries iperf têm só os intervalos (sem o ponto extra da linha
+    "sender" que o parser de texto inclui).
+    """
+    report = Report()
+    with open(fname, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            kind, name = rec.get('type'), rec.get('test')
+            if 'error' in rec:
+                continue
+            if kind == 'latency':
+                report.latency.setdefault(name, dict((k, rec[k]) for k in ('min', 'avg', 'max', 'mdev')))
+            elif kind == 'iperf':
+                intervals = rec['intervals']
+                sent = rec.get('sent') or {}
+                summary = None
+                if sent.get('bits_per_second') is not None:
+                    summary = {'avg_bitrate': sent['bits_per_second'] / 1000000.0,
+                               'total_retr': int(sent.get('retransmits') or 0)}
+                report.iperf.setdefault(name, {
+                    'times': [i['end'] for i in intervals],
+                    'bitrates': [i['bits_per_second'] / 1000000.0 for i in intervals],
+                    'retrs': [int(i['retransmits'] or 0) for i in intervals],
+                    'summary': summary})
+            elif kind == 'http':
+                report.metrics.setdefault(name, {
+                    'total_time': float(rec['time_total']),
+                    'connection_time': float(rec['time_connect']),
+                    'transfer_time': float(rec['time_starttransfer']),
+                    'download_speed': float(rec['speed_download']),
+                    'size_download': float(rec['size_download']),
+                    'http_code': float(rec['http_code'])})
+            elif kind == 'stats':
+                report.stats.append({'name': name, 'time': rec.get('time'),
+                                     'tcp': rec.get('tcp') or {},
+                                     'iface': rec.get('iface')})
+    return report
+
+
+def load_report(fname):
+    """Lê um relatório em texto ou JSON lines (.jsonl)."""
+    if fname.endswith('.jsonl'):
+        return parse_jsonl(fname)
+    return parse_report(fname)
+
+
+def iperf_series(report, host_id):
+    """Vazão (Mbits/s) e retransmissões por intervalo do teste iperf3 do host."""
+    rec = report.iperf.get(f"{host_id}_Throughput")
+    if rec is None:
+        print(f"Aviso: Seção iperf para {host_id} não encontrada.")
+        return {'times': [], 'bitrates': [], 'retrs': []}
+    return {'times': list(rec['times']), 'bitrates': list(rec['bitrates']),
+            'retrs': list(rec['retrs'])}
+
+
+def summary_stats(report, host_id):
+    """Vazão média final e total de retransmissões (linha 'sender')."""
+    rec = report.iperf.get(f"{host_id}_Throughput")
+    if rec is None:
+        return None
+    if rec['summary']:
+        return dict(rec['summary'])
+    print(f"Aviso: Estatísticas de resumo para {host_id} não encontradas.")
+    return {'avg_bitrate': 0, 'total_retr': 0}
+
+
+def latency_avg(report, host_id, stage):
+    """
+    RTT médio do host na fase indicada ('' para a medição inicial ou
+    'Final').  Aceita tanto nomes exatos (H_Reno1, H_Reno1_Final) quanto
+    nomes com texto extra, como "H1 (Reno)".
+    """
+    suffix = f"_{stage}" if stage else ''
+    rec = report.latency.get(host_id + suffix)
+    if rec is None:
+        for other, r in report.latency.items():
+            # O texto extra vem depois de um espaço ou parêntese: 'H1' não
+            # casa com 'H10', e a medição inicial não pega a '_Final'
+            if stage:
+                if not other.endswith(suffix):
+                    continue
+                other = other[:-len(suffix)]
+            elif other.endswith('_Final'):
+                continue
+            if other.startswith(host_id) and other[len(host_id):len(host_id) + 1] in (' ', '('):
+                rec = r
+                break
+    if rec:
+        return rec['avg']
+    print(f"Aviso: Latência para {host_id} ({stage}) não encontrada.")
+    return 0
+
+
+def group_http_metrics(report, keys):
+    """
+    Métricas das requisições HTTP simultâneas agrupadas por host.  Cada
+    chave (ex.: 'reno1') recebe os testes cujo nome de host a contém.
+    """
+    metrics = dict((key, []) for key in keys)
+    for name, rec in report.metrics.items():
+        m = HTTP_NAME_RE.fullmatch(name)
+        if not m:
+            continue
+        host = m.group(1).lower()
+        for key in keys:
+            if key in host:
+                metrics[key].append({
+                    'total_time': rec['total_time'],
+                    'connection_time': rec['connection_time'],
+                    'transfer_time': rec['transfer_time'],
+                    'download_speed': rec['download_speed'] / 1000  # Convert to KB/s
+                })
+                break
+    return metrics
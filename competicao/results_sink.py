@@ -0,0 +1,150 @@
+"""
+Saída estruturada (JSON lines) para os scripts tcp_simulation_cen_*.py.
+
+Cada medição vira um registro JSON em uma linha, gravado por um único
+escritor bufferizado e compartilhado entre as threads.  Os dados vêm
+direto das saídas estruturadas das ferramentas (iperf3 -J e curl
+-w '%{json}'), o que dispensa raspar o relatório em texto depois.
+
+Tipos de registro (campo 'type'):
+    config       host, cc
+    latency      test, min, avg, max, mdev, loss
+    http         test, time_total, time_connect, time_starttransfer,
+                 speed_download, size_download, http_code
+    iperf        test, intervals[{start, end, bytes, bits_per_second,
+                 retransmits, snd_cwnd}], sent{...}, received{...}
+                 (fase paralela: também port e start, o instante de início)
+    stats        test, tcp{...}, iface{...}
+                 (com "server_qdisc": também qdisc[...], ver parse_tc_qdisc)
+    final_stats  host, tcp{...}
+    qdisc        test, qdisc[...] (contadores finais do gargalo)
+    pcap         iface, flow, packets, bytes, mbps, retrans, ooo, rtt_*_ms,
+                 inflight_max (fases com "pcap", ver pcap_analyzer.py)
+"""
+
+import json
+import re
+import threading
+import time
+
+CURL_JSON_FORMAT = "%{json}"
+CURL_FIELDS = ['time_total', 'time_connect', 'time_starttransfer',
+               'speed_download', 'size_download', 'http_code']
+PROC_NET_DEV_FIELDS = ['rx_bytes', 'rx_packets', 'rx_errs', 'rx_drop',
+                       'rx_fifo', 'rx_frame', 'rx_compressed', 'rx_multicast',
+                       'tx_bytes', 'tx_packets', 'tx_errs', 'tx_drop',
+                       'tx_fifo', 'tx_colls', 'tx_carrier', 'tx_compressed']
+RTT_RE = re.compile(r'(?:rtt|round-trip) min/avg/max/(?:mdev|stddev) = '
+                    r'([\d\.]+)/([\d\.]+)/([\d\.]+)/([\d\.]+) ms')
+LOSS_RE = re.compile(r'([\d\.]+)% packet loss')
+
+
+class JsonlSink(object):
+    """Grava um registro JSON por linha em um único arquivo bufferizado."""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.f = open(fname, 'w', buffering=1 << 16, encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, kind, **fields):
+        record = {'type': kind, 'ts': time.time()}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.f.write(line)
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+def _json_object(output):
+    """Extrai o objeto JSON da saída de host.cmd (que pode trazer lixo do shell)."""
+    start = output.find('{')
+    end = output.rfind('}')
+    if start < 0 or end < start:
+        return None
+    try:
+        return json.loads(output[start:end + 1])
+    except ValueError:
+        return None
+
+
+def parse_tc_qdisc(output):
+    """
+    Converte `tc -s -j qdisc show dev X` em uma lista de qdiscs (kind,
+    handle, parent, options, drops, backlog, qlen...) com os contadores
+    próprios de cada AQM no mesmo nível: ecn_mark e drop_overlimit do
+    fq_codel, ldelay do codel, delay e prob do pie, marked e early do
+    red, tins[...] do cake.
+    """
+    start = output.find('[')
+    end = output.rfind(']')
+    if start < 0 or end < start:
+        return []
+    try:
+        return json.loads(output[start:end + 1])
+    except ValueError:
+        return []
+
+
+def parse_curl_json(output):
+    data = _json_object(output)
+    if data is None:
+        return None
+    return dict((key, data.get(key)) for key in CURL_FIELDS)
+
+
+def parse_iperf_json(output):
+    data = _json_object(output)
+    if data is None or 'error' in data:
+        return None
+    intervals = []
+    for interval in data.get('intervals', []):
+        s = interval['sum']
+        streams = interval.get('streams') or [{}]
+        intervals.append({'start': s['start'], 'end': s['end'],
+                          'bytes': s['bytes'],
+                          'bits_per_second': s['bits_per_second'],
+                          'retransmits': s.get('retransmits', 0),
+                          'snd_cwnd': streams[0].get('snd_cwnd')})
+    end = data.get('end', {})
+    keys = ('seconds', 'bytes', 'bits_per_second', 'retransmits')
+    sent = dict((k, end.get('sum_sent', {}).get(k)) for k in keys)
+    received = dict((k, end.get('sum_received', {}).get(k)) for k in keys[:3])
+    return {'intervals': intervals, 'sent': sent, 'received': received}
+
+
+def parse_ping_summary(output):
+    m = RTT_RE.search(output)
+    if not m:
+        return None
+    ret = dict(zip(('min', 'avg', 'max', 'mdev'), map(float, m.groups())))
+    loss = LOSS_RE.search(output)
+    ret['loss'] = float(loss.group(1)) if loss else None
+    return ret
+
+
+def parse_snmp_tcp(output):
+    """Converte as linhas 'Tcp:' de /proc/net/snmp em um dicionário."""
+    rows = [line[line.index('Tcp:') + 4:].split()
+            for line in output.splitlines() if 'Tcp:' in line]
+    for names, values in zip(rows, rows[1:]):
+        if all(v.lstrip('-').isdigit() for v in values):
+            return dict(zip(names, [int(v) for v in values]))
+    return {}
+
+
+def parse_proc_net_dev(output):
+    """Converte uma linha de /proc/net/dev ('iface: n n n ...') em um dicionário."""
+    for line in output.splitlines():
+        if ':' not in line:
+            continue
+        name, values = line.split(':', 1)
+        values = values.split()
+        if len(values) >= len(PROC_NET_DEV_FIELDS) and all(v.isdigit() for v in values):
+            ret = dict(zip(PROC_NET_DEV_FIELDS, [int(v) for v in values]))
+            ret['iface'] = name.strip()
+            return ret
+    return None
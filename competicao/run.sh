@@ -10,5 +10,13 @@ sudo nano setup_dependencies.sh
 sudo chmod +x setup_dependencies.sh
 sudo ./setup_dependencies.sh
 
-# 4. Executar simulação
+# 4. Executar simulação (cenário padrão: cenarios/cen_1.json)
 sudo python3 tcp_simulation.py
+# Outros cenários: sudo python3 tcp_simulation.py cenarios/cen_2.json
+
+# 5. Muitos fluxos sem Mininet (simulação fluida, não precisa de root)
+python3 fluid_simulation.py cenarios/cen_escala.json --jsonl /tmp/escala.jsonl
+
+# 6. Fases com "pcap" (ex.: cen_2) capturam os cabeçalhos no gargalo e nos
+# emissores; o gargalo é analisado ao fim da fase, os demais sob demanda
+python3 pcap_analyzer.py /tmp/tcp_comparison_2x2_*_pcap/fase2_iperf/s1-eth1.pcap*
@@ -0,0 +1,58 @@
+"""
+Leitura dos arquivos de cenário usados por tcp_simulation.py (Mininet) e
+fluid_simulation.py (simulação fluida, sem Mininet).
+
+Um cenário lista os emissores (nome, rótulo, algoritmo de controle de
+congestionamento e, opcionalmente, "count" e "link"), os links dos
+emissores e do servidor e as fases de medição.  Exemplos em cenarios/.
+
+"server_qdisc" (opcional, só no Mininet) põe um AQM na fila do gargalo,
+com os parâmetros do tc: "fq_codel", "cake besteffort", "pie target 15ms".
+"""
+
+import os
+import sys
+import json
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cenarios')
+DEFAULT_SCENARIO = os.path.join(SCENARIO_DIR, 'cen_1.json')
+
+# Valores usados quando o cenário não define os links
+DEFAULT_SENDER_LINK = {'bw': 10, 'delay': '5ms', 'loss': 0.1}
+DEFAULT_SERVER_LINK = {'bw': 20, 'delay': '10ms', 'loss': 0.2}
+
+def load_scenario(fname):
+    """Lê o arquivo de cenário (.json, .toml ou .yaml/.yml)"""
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == '.toml':
+        import tomllib
+        with open(fname, 'rb') as f:
+            return tomllib.load(f)
+    if ext in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("Cenários YAML precisam do PyYAML (pip install pyyaml)")
+        with open(fname) as f:
+            return yaml.safe_load(f)
+    with open(fname) as f:
+        return json.load(f)
+
+def expand_senders(scenario):
+    """
+    Expande a lista de emissores do cenário.  Uma entrada com "count": N
+    vira N hosts numerados (h_reno -> h_reno1, h_reno2, ...); o rótulo usado
+    nos nomes dos testes é numerado da mesma forma.
+    """
+    senders = []
+    for entry in scenario['senders']:
+        count = entry.get('count')
+        names = [(entry['name'], entry.get('label', entry['name']))]
+        if count is not None:
+            names = [(f"{entry['name']}{i}", f"{entry.get('label', entry['name'])}{i}")
+                     for i in range(1, count + 1)]
+        for name, label in names:
+            link = dict(scenario.get('sender_link', DEFAULT_SENDER_LINK))
+            link.update(entry.get('link', {}))
+            senders.append({'name': name, 'label': label, 'cc': entry['cc'], 'link': link})
+    return senders
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Motor de cenários para simular competição entre algoritmos de controle de
+congestionamento TCP no Mininet.
+
+Um cenário (JSON, TOML ou YAML) descreve os hosts emissores, o algoritmo de
+cada um, os links e a sequência de fases de medição; a topologia e as
+threads de teste são montadas a partir dele.  Exemplos em cenarios/.
+
+Uso: sudo python3 tcp_simulation.py [cenarios/cen_1.json] [--jsonl saida.jsonl]
+"""
+
+import os
+import glob
+import time
+import argparse
+import threading
+from datetime import datetime
+from mininet.net import Mininet
+from mininet.node import Controller, OVSKernelSwitch, Host
+from mininet.link import TCLink
+from mininet.log import setLogLevel, info
+from mininet.cli import CLI
+from mininet.util import dumpNodeConnections
+
+from scenario import (SCENARIO_DIR, DEFAULT_SCENARIO, DEFAULT_SERVER_LINK,
+                      load_scenario, expand_senders)
+from readiness import wait_listening, wait_closed, wait_connectable, wait_idle
+from pcap_analyzer import analyze, format_flows
+from results_sink import (JsonlSink, CURL_JSON_FORMAT, parse_curl_json, parse_iperf_json,
+                          parse_ping_summary, parse_snmp_tcp, parse_proc_net_dev,
+                          parse_tc_qdisc)
+
+
+# Primeira porta dos servidores iperf3 da fase paralela (uma porta por fluxo)
+IPERF_BASE_PORT = 5201
+
+# Captura de pacotes de uma fase ("pcap": true ou com estes campos): só os
+# cabeçalhos, em anel de "files" arquivos de "ring_mb" MB por interface
+DEFAULT_PCAP = {'snaplen': 128, 'ring_mb': 50, 'files': 4}
+
+# Amostrador de tcp_info por fluxo (cwnd, srtt, taxas, BBR), do bufferbloat
+TCPINFO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', 'bufferbloat', 'tcpinfo.py')
+
+
+class CustomHost(Host):
+    """Host customizado para permitir configuração de TCP congestion control"""
+    
+    def __init__(self, name, **kwargs):
+        super().__init__(name, **kwargs)
+    
+    def config(self, cc=None, **kwargs):
+        super().config(**kwargs)
+        # Configurar TCP congestion control passado em addHost(..., cc=...)
+        if cc:
+            self.cmd(f'sysctl -w net.ipv4.tcp_congestion_control={cc}')
+            info(f'{self.name}: TCP {cc} configurado\n')
+
+def create_test_html():
+    """Cria uma página HTML de teste com conteúdo significativo"""
+    html_content = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Teste TCP Reno vs BBR</title>
+    </head>
+    <body>
+        <h1>Página de Teste para Análise TCP</h1>
+        <p>Este arquivo é usado para testar o desempenho entre TCP Reno e TCP BBR.</p>
+        <!-- Adicionar conteúdo para aumentar o tamanho do arquivo -->
+    """ + "        <p>Linha de padding para aumentar o tamanho do arquivo.</p>\n" * 1000 + """
+    </body>
+    </html>
+    """
+    
+    with open('/tmp/test_page.html', 'w') as f:
+        f.write(html_content)
+    
+    info("Página HTML de teste criada\n")
+
+def start_http_server(host):
+    """Inicia o servidor HTTP no host especificado"""
+    # Copiar o arquivo HTML para o diretório do servidor
+    host.cmd('cp /tmp/test_page.html /tmp/server_files/')
+    
+    # Iniciar servidor HTTP
+    info(f"Iniciando servidor HTTP em {host.name}\n")
+    host.cmd('cd /tmp/server_files && python3 -m http.server 8080 &')
+    wait_listening(host, 8080)  # Aguardar o servidor aceitar conexões
+
+def run_performance_test(client_host, server_ip, test_name, output_file, sink=None):
+    """Executa teste de desempenho com curl e coleta métricas"""
+    
+    info(f"Iniciando teste para {test_name}\n")
+    
+    if sink is not None:
+        # Saída estruturada: o curl devolve todas as métricas em JSON
+        curl_cmd = f"curl -w '{CURL_JSON_FORMAT}' -o /tmp/{test_name}_download.html -s http://{server_ip}:8080/test_page.html"
+        result = client_host.cmd(curl_cmd)
+        metrics = parse_curl_json(result)
+        if metrics is None:
+            metrics = {'error': result.strip()}
+        sink.write('http', test=test_name, **metrics)
+        print(f"{test_name}: {metrics}")
+        return result
+    
+    # Executar curl com métricas de tempo
+    curl_cmd = f"""curl -w "
+=== MÉTRICAS {test_name} ===
+Tempo total: %{{time_total}}s
+Tempo de conexão: %{{time_connect}}s
+Tempo de transferência: %{{time_starttransfer}}s
+Velocidade de download: %{{speed_download}} bytes/s
+Tamanho baixado: %{{size_download}} bytes
+Código HTTP: %{{http_code}}
+" -o /tmp/{test_name}_download.html -s http://{server_ip}:8080/test_page.html"""
+    
+    # Executar comando e capturar saída
+    result = client_host.cmd(curl_cmd)
+    
+    # Salvar resultados no arquivo
+    with open(output_file, 'a') as f:
+        f.write(f"\n{result}\n")
+    
+    print(result)
+    
+    return result
+
+def measure_latency(client_host, server_ip, test_name, output_file, sink=None):
+    """Mede latência com ping"""
+    
+    info(f"Medindo latência para {test_name}\n")
+    
+    ping_cmd = f"ping -c 10 {server_ip}"
+    result = client_host.cmd(ping_cmd)
+    
+    if sink is not None:
+        summary = parse_ping_summary(result)
+        if summary is None:
+            summary = {'error': result.strip()}
+        sink.write('latency', test=test_name, **summary)
+        print(f"{test_name}: {summary}")
+        return
+    
+    # Extrair estatísticas do ping
+    lines = result.split('\n')
+    for line in lines:
+        if 'rtt' in line or 'round-trip' in line:
+            latency_info = f"=== LATÊNCIA {test_name} ===\n{line}\n"
+            
+            with open(output_file, 'a') as f:
+                f.write(latency_info)
+            
+            print(latency_info)
+            break
+
+def record_iperf(result, test_name, output_file, sink=None, **fields):
+    """Grava a saída de um cliente iperf3 (JSON com sink, texto sem)"""
+    
+    if sink is not None:
+        data = parse_iperf_json(result)
+        if data is None:
+            data = {'error': result.strip()}
+        sink.write('iperf', test=test_name, **fields, **data)
+        print(f"{test_name}: {data.get('sent', data)}")
+    else:
+        iperf_info = f"=== IPERF3 {test_name} ===\n{result}\n"
+        
+        with open(output_file, 'a') as f:
+            f.write(iperf_info)
+        
+        print(iperf_info)
+
+def run_iperf_test(client_host, server_host, test_name, output_file, sink=None, duration=30):
+    """Executa teste de throughput com iperf3"""
+    
+    info(f"Iniciando teste iperf3 para {test_name}\n")
+    
+    # Iniciar servidor iperf3 no servidor
+    server_host.cmd('iperf3 -s -p 5001 -D')  # -D para daemon
+    wait_listening(server_host, 5001)
+    
+    # Executar cliente iperf3
+    iperf_cmd = f"iperf3 -c {server_host.IP()} -p 5001 -t {duration}"
+    result = client_host.cmd(iperf_cmd + (" -J" if sink is not None else ""))
+    record_iperf(result, test_name, output_file, sink)
+    
+    # Parar servidor iperf3 (e esperar a porta ficar livre para o próximo)
+    server_host.cmd('pkill iperf3')
+    wait_closed(server_host, 5001)
+
+def start_tcpinfo(hosts, labels, outdir, interval, ports):
+    """Inicia um amostrador de tcp_info em cada host (outdir/<rótulo>/<fluxo>.bin)"""
+    
+    port_args = [arg for port in ports for arg in ('--port', str(port))]
+    return [host.popen(['python3', TCPINFO_SCRIPT, '--dir', os.path.join(outdir, label),
+                        '--interval', str(interval)] + port_args)
+            for host, label in zip(hosts, labels)]
+
+def run_parallel_iperf(hosts, test_names, server_host, output_file, sink=None, duration=30,
+                       base_port=IPERF_BASE_PORT, tcpinfo=None, labels=None):
+    """
+    Executa um fluxo iperf3 por host, todos ao mesmo tempo: um servidor
+    iperf3 por porta (cada servidor só atende um teste por vez) e uma
+    barreira para que os clientes partam juntos.  Com sink, cada fluxo
+    grava os seus intervalos (iperf3 -J), a porta e o instante de início.
+    Com tcpinfo (período em segundos), o estado TCP de cada fluxo é
+    amostrado no emissor durante o teste, em <relatório>_tcpinfo/.
+    """
+    
+    info(f"Iniciando {len(hosts)} fluxos iperf3 simultâneos\n")
+    
+    ports = [base_port + i for i in range(len(hosts))]
+    for port in ports:
+        server_host.cmd(f'iperf3 -s -p {port} -D -1')  # -1: sai depois de um teste
+    wait_listening(server_host, ports)
+    
+    samplers = []
+    if tcpinfo:
+        tcpinfo_dir = os.path.splitext(output_file)[0] + '_tcpinfo'
+        samplers = start_tcpinfo(hosts, labels or [h.name for h in hosts], tcpinfo_dir,
+                                 tcpinfo, ports)
+    
+    barrier = threading.Barrier(len(hosts))
+    results = [None] * len(hosts)
+    starts = [None] * len(hosts)
+    
+    def flow(i, host, port):
+        iperf_cmd = f"iperf3 -c {server_host.IP()} -p {port} -t {duration}"
+        barrier.wait()
+        starts[i] = time.time()
+        results[i] = host.cmd(iperf_cmd + (" -J" if sink is not None else ""))
+    
+    threads = [threading.Thread(target=flow, args=(i, host, port))
+               for i, (host, port) in enumerate(zip(hosts, ports))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for proc in samplers:
+        proc.terminate()
+        proc.wait()
+    if samplers:
+        print(f"tcp_info por fluxo salvo em: {tcpinfo_dir}")
+    
+    # Grava na ordem dos hosts, depois que todos terminaram
+    for test_name, result, port, start in zip(test_names, results, ports, starts):
+        record_iperf(result, test_name, output_file, sink, port=port, start=start)
+    
+    server_host.cmd('pkill iperf3')
+    wait_closed(server_host, ports)
+
+def qdisc_stats(intf, json=False):
+    """Saída de `tc -s qdisc show` da interface (no nó dono dela)"""
+    return intf.node.cmd(f"tc -s {'-j ' if json else ''}qdisc show dev {intf.name}")
+
+def install_qdisc(intf, spec):
+    """
+    Instala o AQM descrito por spec ("fq_codel", "pie target 15ms", ...)
+    na fila de intf.  O TCLink monta htb (5:) e, com delay ou perda, netem
+    (10:) abaixo dele; o AQM entra como filho do netem, que lhe repassa
+    cada pacote quando o atraso termina, e é nele que a fila se forma.
+    """
+    current = qdisc_stats(intf)
+    parent = '10:1' if 'netem 10:' in current else '5:1' if 'htb 5:' in current else None
+    where = f'parent {parent} handle 20:' if parent else 'root handle 20:'
+    cmd = f'tc qdisc {"add" if parent else "replace"} dev {intf.name} {where} {spec}'
+    out = intf.node.cmd(cmd)
+    if out.strip():
+        raise RuntimeError(f"{cmd}: {out.strip()}")
+    info(f"{intf.name}: {spec}\n")
+
+def start_capture(intfs, outdir, snaplen=128, ring_mb=50, files=4):
+    """
+    Inicia um tcpdump por interface em outdir/<interface>.pcap0, .pcap1, ...
+    (anel: o mais antigo é sobrescrito) e só volta quando todos já capturam.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    procs = []
+    for intf in intfs:
+        proc = intf.node.popen(['tcpdump', '-i', intf.name, '-n', '-s', str(snaplen),
+                                '-C', str(ring_mb), '-W', str(files), '-Z', 'root',
+                                '-w', os.path.join(outdir, f'{intf.name}.pcap')])
+        procs.append(proc)
+        # O tcpdump avisa "listening on <interface>" quando a captura começa
+        line = proc.stderr.readline().decode(errors='replace')
+        if 'listening' not in line:
+            stop_capture(procs)
+            raise RuntimeError(f"tcpdump em {intf.name}: {line.strip() or 'terminou'}")
+    return procs
+
+def stop_capture(procs):
+    for proc in procs:
+        proc.terminate()  # SIGTERM: o tcpdump grava o que ainda está no buffer
+        proc.wait()
+
+def analyze_capture(intf, outdir, output_file, sink=None):
+    """Fluxos da captura de intf (pcap_analyzer.py) no relatório e no sink"""
+    files = glob.glob(os.path.join(outdir, f'{intf.name}.pcap*'))
+    summary = analyze(files, os.path.join(outdir, intf.name))
+    table = f"\n--- Fluxos capturados em {intf.name} ---\n{format_flows(summary)}\n"
+    print(table)
+    if sink is not None:
+        for flow in summary['flows']:
+            sink.write('pcap', iface=intf.name, **flow)
+    else:
+        with open(output_file, 'a') as f:
+            f.write(table)
+
+def monitor_network_stats(host, test_name, output_file, duration=30, sink=None, interval=5,
+                          bottleneck=None):
+    """Monitora estatísticas de rede durante o teste (e do AQM no gargalo, se houver)"""
+    
+    start_time = time.time()
+    
+    while time.time() - start_time < duration:
+        # Coletar estatísticas TCP
+        tcp_stats = host.cmd('cat /proc/net/snmp | grep Tcp:')
+        
+        # Coletar estatísticas de interface
+        interface_stats = host.cmd('cat /proc/net/dev | grep eth0')
+        
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        
+        if sink is not None:
+            fields = {}
+            if bottleneck is not None:
+                fields['qdisc'] = parse_tc_qdisc(qdisc_stats(bottleneck, json=True))
+            sink.write('stats', test=test_name, time=timestamp,
+                       tcp=parse_snmp_tcp(tcp_stats),
+                       iface=parse_proc_net_dev(interface_stats), **fields)
+        else:
+            with open(output_file, 'a') as f:
+                f.write(f"\n--- {test_name} Stats at {timestamp} ---\n")
+                f.write(f"TCP Stats: {tcp_stats}")
+                f.write(f"Interface Stats: {interface_stats}\n")
+                if bottleneck is not None:
+                    f.write(f"Qdisc Stats ({bottleneck.name}):\n{qdisc_stats(bottleneck)}")
+        
+        time.sleep(interval)
+
+def create_topology(scenario, senders):
+    """Cria e configura a topologia de rede descrita pelo cenário"""
+    
+    info("Criando topologia de rede\n")
+    
+    # Criar rede Mininet com links customizados
+    net = Mininet(
+        host=CustomHost,
+        switch=OVSKernelSwitch,
+        link=TCLink,
+        controller=Controller
+    )
+    
+    # Adicionar controller
+    net.addController('c0')
+    
+    # Adicionar hosts emissores (10.0.0.1, 10.0.0.2, ...) e o servidor por último
+    hosts = []
+    for i, sender in enumerate(senders):
+        hosts.append(net.addHost(sender['name'], ip=f'10.0.0.{i + 1}/24', cc=sender['cc']))
+    servidor = net.addHost('servidor', ip=f'10.0.0.{len(senders) + 1}/24')
+    
+    # Adicionar switch
+    s1 = net.addSwitch('s1')
+    
+    # Links dos emissores para o switch; intfs guarda a ponta do switch de
+    # cada link (a fila de saída para o host e o ponto de captura)
+    intfs = {}
+    for host, sender in zip(hosts, senders):
+        intfs[host.name] = net.addLink(host, s1, **sender['link']).intf2
+    
+    # Link do servidor para o switch (gargalo)
+    intfs[servidor.name] = net.addLink(servidor, s1,
+                                       **scenario.get('server_link', DEFAULT_SERVER_LINK)).intf2
+    
+    # Iniciar rede
+    net.start()
+    
+    # AQM opcional na fila do switch para o servidor, onde os fluxos competem
+    if scenario.get('server_qdisc'):
+        install_qdisc(intfs[servidor.name], scenario['server_qdisc'])
+    
+    # Verificar conectividade
+    info("Testando conectividade\n")
+    net.pingAll()
+    
+    return net, hosts, servidor, intfs
+
+def run_phase(phase, hosts, labels, servidor, output_file, sink, bottleneck=None):
+    """Executa uma fase de medição do cenário para todos os emissores"""
+    
+    kind = phase['type']
+    server_ip = servidor.IP()
+    
+    if phase.get('title'):
+        print(f"\n=== {phase['title']} ===")
+    
+    if kind == 'latency':
+        for host, label in zip(hosts, labels):
+            measure_latency(host, server_ip, phase.get('test', '{label}').format(label=label),
+                            output_file, sink)
+    
+    elif kind == 'http':
+        for host, label in zip(hosts, labels):
+            run_performance_test(host, server_ip, phase.get('test', '{label}_Individual').format(label=label),
+                                 output_file, sink)
+            # O próximo teste só começa quando esta conexão terminou
+            wait_idle(servidor, 8080)
+    
+    elif kind == 'iperf' and phase.get('parallel'):
+        # Fluxos de longa duração competindo entre si, todos juntos
+        test_names = [phase.get('test', '{label}_Throughput').format(label=label) for label in labels]
+        run_parallel_iperf(hosts, test_names, servidor, output_file, sink,
+                           phase.get('duration', 30), phase.get('base_port', IPERF_BASE_PORT),
+                           phase.get('tcpinfo'), labels)
+    
+    elif kind == 'iperf':
+        for host, label in zip(hosts, labels):
+            run_iperf_test(host, servidor, phase.get('test', '{label}_Throughput').format(label=label),
+                           output_file, sink, phase.get('duration', 30))
+    
+    elif kind == 'competition':
+        # Usar threads para execução simultânea
+        def simultaneous_test(client_host, label):
+            for i in range(phase.get('requests', 3)):  # Múltiplas requisições por host
+                test_name = phase.get('test', '{label}_Simultaneous_{i}').format(label=label, i=i + 1)
+                run_performance_test(client_host, server_ip, test_name, output_file, sink)
+                time.sleep(phase.get('interval', 1))
+        
+        # Iniciar monitoramento de estatísticas
+        monitor_thread = threading.Thread(
+            target=monitor_network_stats,
+            args=(servidor, "SERVER_MONITORING", output_file, phase.get('monitor', 15), sink),
+            kwargs={'bottleneck': bottleneck}
+        )
+        monitor_thread.start()
+        
+        # Executar testes simultâneos para todos os hosts
+        threads = [threading.Thread(target=simultaneous_test, args=(host, label))
+                   for host, label in zip(hosts, labels)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        monitor_thread.join()
+    
+    elif kind == 'final_stats':
+        # Estatísticas TCP de cada host
+        final_stats_content = "\n=== ESTATÍSTICAS FINAIS TCP ===\n"
+        for host in hosts:
+            stats = host.cmd('cat /proc/net/snmp | grep Tcp:')
+            final_stats_content += f"{host.name}: {stats}"
+            if sink is not None:
+                sink.write('final_stats', host=host.name, tcp=parse_snmp_tcp(stats))
+        
+        # Contadores acumulados do AQM no gargalo (drops, marcas ECN, atraso)
+        if bottleneck is not None:
+            if sink is not None:
+                sink.write('qdisc', test='SERVER_QDISC',
+                           qdisc=parse_tc_qdisc(qdisc_stats(bottleneck, json=True)))
+            final_stats_content += f"\n=== AQM ({bottleneck.name}) ===\n{qdisc_stats(bottleneck)}"
+        
+        print(final_stats_content)
+        
+        with open(output_file, 'a') as f:
+            f.write(final_stats_content)
+    
+    else:
+        raise ValueError(f"Fase desconhecida no cenário: {kind}")
+
+def run_scenario(scenario, jsonl=None, ask_cli=True):
+    """Monta a rede do cenário, executa as fases e grava o relatório"""
+    
+    senders = expand_senders(scenario)
+    labels = [sender['label'] for sender in senders]
+    title = scenario.get('title', 'TCP')
+    
+    print(f"=== SIMULAÇÃO {title} ===")
+    print("Iniciando simulação...")
+    
+    # Criar arquivo de saída
+    output_file = scenario.get('output', '/tmp/tcp_comparison_{timestamp}.txt').format(
+        timestamp=datetime.now().strftime('%Y%m%d_%H%M%S'))
+    
+    # Criar diretório para servidor
+    os.makedirs('/tmp/server_files', exist_ok=True)
+    
+    # Criar página HTML de teste
+    create_test_html()
+    
+    # Inicializar cabeçalho do arquivo de resultados
+    with open(output_file, 'w') as f:
+        f.write(f"=== RELATÓRIO DE COMPARAÇÃO {title} ===\n")
+        f.write(f"Data/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write("=" * 50 + "\n\n")
+    
+    # Saída estruturada opcional: um registro JSON por medição
+    sink = JsonlSink(jsonl) if jsonl else None
+    
+    try:
+        # Criar topologia
+        net, hosts, servidor, intfs = create_topology(scenario, senders)
+        bottleneck = intfs[servidor.name] if scenario.get('server_qdisc') else None
+        
+        # Mostrar informações da rede
+        info("Dump das conexões:\n")
+        dumpNodeConnections(net.hosts)
+        
+        # Verificar configurações TCP
+        info("Verificando configurações TCP:\n")
+        for host in hosts:
+            tcp_config = host.cmd('sysctl net.ipv4.tcp_congestion_control')
+            print(f"{host.name} TCP: {tcp_config.strip()}")
+            with open(output_file, 'a') as f:
+                f.write(f"{host.name} TCP Config: {tcp_config}")
+            if sink is not None:
+                sink.write('config', host=host.name, cc=tcp_config.split('=')[-1].strip())
+        
+        with open(output_file, 'a') as f:
+            f.write("\n")
+        
+        # Iniciar servidor HTTP
+        start_http_server(servidor)
+        print(f"Servidor HTTP iniciado em: {servidor.IP()}:8080")
+        
+        # Aguardar cada emissor alcançar o servidor HTTP
+        for host in hosts:
+            wait_connectable(host, servidor.IP(), 8080)
+        
+        pcap_root = os.path.splitext(output_file)[0] + '_pcap'
+        for n, phase in enumerate(scenario['phases'], 1):
+            if not phase.get('pcap'):
+                run_phase(phase, hosts, labels, servidor, output_file, sink, bottleneck)
+                continue
+            # Captura no gargalo e nos emissores durante a fase
+            pcap = dict(DEFAULT_PCAP, **(phase['pcap'] if isinstance(phase['pcap'], dict) else {}))
+            pcap_dir = os.path.join(pcap_root, f"fase{n}_{phase['type']}")
+            captures = start_capture(list(intfs.values()), pcap_dir, **pcap)
+            try:
+                run_phase(phase, hosts, labels, servidor, output_file, sink, bottleneck)
+            finally:
+                stop_capture(captures)
+            # Os emissores ficam para o pcap_analyzer.py, se preciso
+            analyze_capture(intfs[servidor.name], pcap_dir, output_file, sink)
+            print(f"Capturas salvas em: {pcap_dir}")
+        
+        with open(output_file, 'a') as f:
+            f.write("\n=== FIM DO RELATÓRIO ===\n")
+        
+        print(f"\nResultados salvos em: {output_file}")
+        
+        # Opcional: abrir CLI para inspeção manual
+        if ask_cli:
+            print("\nTeste concluído! Pressione Ctrl+C para sair ou digite 'CLI' para inspeção manual.")
+            
+            response = input("Deseja abrir o CLI do Mininet? (s/n): ").lower()
+            if response == 's':
+                CLI(net)
+        
+    except KeyboardInterrupt:
+        print("\nInterrompido pelo usuário")
+    
+    except Exception as e:
+        print(f"Erro durante a execução: {e}")
+        
+    finally:
+        # Limpeza
+        if 'net' in locals():
+            info("Parando rede\n")
+            net.stop()
+        
+        # Limpar processos
+        os.system('pkill -f "python3 -m http.server"')
+        os.system('pkill -f "iperf3"')
+        
+        if sink is not None:
+            sink.close()
+            print(f"Registros JSON salvos em: {jsonl}")
+        
+        print("Simulação finalizada!")
+    
+    return output_file
+
+def main(argv=None):
+    """Função principal do script"""
+    
+    parser = argparse.ArgumentParser(description="Simulação de competição TCP no Mininet")
+    parser.add_argument('scenario', nargs='?', default=DEFAULT_SCENARIO,
+                        help="Arquivo de cenário (.json, .toml ou .yaml)")
+    parser.add_argument('--jsonl', default=None,
+                        help="Grava as medições como JSON lines neste arquivo "
+                             "(o relatório em texto fica só com cabeçalho e configuração)")
+    parser.add_argument('--no-cli', action='store_true',
+                        help="Não pergunta se deve abrir o CLI do Mininet ao final")
+    parser.add_argument('--qdisc', default=None,
+                        help="AQM no gargalo, com parâmetros do tc (ex.: 'fq_codel', "
+                             "'pie target 15ms'); substitui o server_qdisc do cenário")
+    args = parser.parse_args(argv)
+    
+    # Configurar nível de log
+    setLogLevel('info')
+    
+    scenario = load_scenario(args.scenario)
+    if args.qdisc:
+        scenario['server_qdisc'] = args.qdisc
+    run_scenario(scenario, jsonl=args.jsonl, ask_cli=not args.no_cli)
+
+if __name__ == '__main__':
+    main()